@@ -0,0 +1,114 @@
+"""
+Benchmark: throughput and latency of `posts`, `search`, `popular` and the live comment stream
+against the local mock server, at increasing concurrency.
+
+python -m benchmarks.bench_client
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from reddit.scraper import AsyncScraper, Scraper
+from .server import MockReddit
+
+
+def _result(items: int, seconds: float, scraper: Scraper, op: str = None) -> dict:
+    res = {'items': items, 'seconds': seconds, 'rate': items / seconds}
+    if op and (h := scraper.metrics.latency.get(op)):
+        res |= {'p50_ms': h.quantile(.5) * 1e3, 'p99_ms': h.quantile(.99) * 1e3}
+    if op and (h := scraper.metrics.parse_time.get(op)):
+        res['parse_ms'] = h.sum / h.count * 1e3
+    return res
+
+
+def _scraper(server: MockReddit) -> Scraper:
+    return Scraper(session=server.client(), metrics=True, rate_limit=False)
+
+
+def _async_scraper(server: MockReddit) -> AsyncScraper:
+    return AsyncScraper(session=server.async_client(), metrics=True, rate_limit=False)
+
+
+def _mapping(n: int) -> dict:
+    return {'pics': [f'p{i:06d}' for i in range(n)]}
+
+
+def posts_sync(server: MockReddit, n: int, concurrency: int) -> dict:
+    reddit = _scraper(server)
+    start = time.perf_counter()
+    res = reddit.posts(_mapping(n), concurrency=concurrency)
+    return _result(len(res), time.perf_counter() - start, reddit, 'post')
+
+
+async def posts_async(server: MockReddit, n: int, concurrency: int) -> dict:
+    async with _async_scraper(server) as reddit:
+        start = time.perf_counter()
+        res = await reddit.posts(_mapping(n), concurrency=concurrency)
+        return _result(len(res), time.perf_counter() - start, reddit, 'post')
+
+
+def gql_sync(server: MockReddit, n: int, concurrency: int, endpoint: str) -> dict:
+    reddit = _scraper(server)
+    call = (lambda i: reddit.search(f'query {i}')) if endpoint == 'search' else (lambda i: reddit.popular())
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        res = list(pool.map(call, range(n)))
+    op = 'GeneralSearch' if endpoint == 'search' else 'PopularFeedElements'
+    return _result(len(res), time.perf_counter() - start, reddit, op)
+
+
+async def gql_async(server: MockReddit, n: int, concurrency: int, endpoint: str) -> dict:
+    async with _async_scraper(server) as reddit:
+        sem = asyncio.Semaphore(concurrency)
+
+        async def call(i: int):
+            async with sem:
+                return await (reddit.search(f'query {i}') if endpoint == 'search' else reddit.popular())
+
+        start = time.perf_counter()
+        res = await asyncio.gather(*(call(i) for i in range(n)))
+        op = 'GeneralSearch' if endpoint == 'search' else 'PopularFeedElements'
+        return _result(len(res), time.perf_counter() - start, reddit, op)
+
+
+def iter_search(server: MockReddit, pages: int) -> dict:
+    reddit = _scraper(server)
+    start = time.perf_counter()
+    n = sum(1 for _ in reddit.iter_search('query', pages=pages))
+    return _result(n, time.perf_counter() - start, reddit, 'GeneralSearch')
+
+
+async def live(server: MockReddit, sockets: int) -> dict:
+    async with _async_scraper(server) as reddit:
+        start = time.perf_counter()
+        n = 0
+        async for _ in reddit.stream_comments(_mapping(sockets), max_reconnects=0):
+            n += 1
+        seconds = time.perf_counter() - start
+        lags = [s.lag for s in reddit.live_stats.values() if s.lag is not None]
+        return {'items': n, 'seconds': seconds, 'rate': n / seconds,
+                'lag_ms': sum(lags) / len(lags) * 1e3 if lags else None}
+
+
+def main(delay: float = .005, n: int = 200, levels: tuple[int, ...] = (1, 8, 32), frames: int = 2000) -> dict:
+    results = {}
+
+    def record(name: str, res: dict):
+        results[name] = res
+        extra = ''.join(f'  {k} {res[k]:8.2f}' for k in ('p50_ms', 'p99_ms', 'parse_ms', 'lag_ms') if res.get(k))
+        print(f'{name:>28}: {res["rate"]:9.1f} items/s{extra}')
+
+    with MockReddit(delay=delay, frames=frames) as server:
+        for c in levels:
+            record(f'posts/sync/c={c}', posts_sync(server, n, c))
+            record(f'posts/async/c={c}', asyncio.run(posts_async(server, n, c)))
+            for endpoint in ('search', 'popular'):
+                record(f'{endpoint}/sync/c={c}', gql_sync(server, n, c, endpoint))
+                record(f'{endpoint}/async/c={c}', asyncio.run(gql_async(server, n, c, endpoint)))
+            record(f'live/sockets={c}', asyncio.run(live(server, c)))
+        record('iter_search/pages=20', iter_search(server, 20))
+    return results
+
+
+if __name__ == '__main__':
+    main()
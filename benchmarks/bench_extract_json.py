@@ -0,0 +1,45 @@
+"""
+Micro-benchmark: `util.extract_json` against the original per-character implementation.
+
+python -m benchmarks.bench_extract_json
+"""
+import timeit
+
+import orjson
+from selectolax.lexbor import LexborHTMLParser
+
+from reddit.util import extract_json
+from .fixtures import pages
+
+
+def extract_json_legacy(text: str) -> dict | None:
+    count = 0
+    chars = []
+    for c in text:
+        if c == "{":
+            count += 1
+        if count > 0:
+            chars.append(c)
+        if c == "}":
+            count -= 1
+            if count == 0:
+                try:
+                    return orjson.loads("".join(chars))
+                except orjson.JSONDecodeError:
+                    ...
+
+
+def main(number: int = 5) -> dict:
+    results = {}
+    for name, html in pages().items():
+        text = LexborHTMLParser(html).css_first('script#data').text()
+        assert extract_json(text) == extract_json_legacy(text)
+        old = min(timeit.repeat(lambda: extract_json_legacy(text), number=number, repeat=3)) / number
+        new = min(timeit.repeat(lambda: extract_json(text), number=number, repeat=3)) / number
+        results[name] = {'bytes': len(text), 'legacy_ms': old * 1e3, 'new_ms': new * 1e3, 'speedup': old / new}
+        print(f'{name:>20} {len(text) / 1e6:8.2f} MB  legacy {old * 1e3:9.2f} ms  new {new * 1e3:7.2f} ms  {old / new:6.1f}x')
+    return results
+
+
+if __name__ == '__main__':
+    main()
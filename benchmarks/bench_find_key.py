@@ -0,0 +1,62 @@
+"""
+Benchmark: iterative `util.find_key` / `util.iter_keys` against the original recursive implementation.
+
+python -m benchmarks.bench_find_key
+"""
+import timeit
+import tracemalloc
+
+from reddit.util import find_key, iter_keys
+from .fixtures import post_data
+
+
+def find_key_legacy(obj: any, key: str) -> list:
+    def helper(obj: any, key: str, L: list) -> list:
+        if not obj:
+            return L
+
+        if isinstance(obj, list):
+            for e in obj:
+                L.extend(helper(e, key, []))
+            return L
+
+        if isinstance(obj, dict) and obj.get(key):
+            L.append(obj[key])
+
+        if isinstance(obj, dict) and obj:
+            for k in obj:
+                L.extend(helper(obj[k], key, []))
+        return L
+
+    return helper(obj, key, [])
+
+
+def peak(f: callable) -> int:
+    tracemalloc.start()
+    f()
+    _, p = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return p
+
+
+def main(n_comments: int = 10000, number: int = 5) -> dict:
+    data = post_data(n_comments)
+    cases = {
+        'legacy find_key': lambda: find_key_legacy(data, 't'),
+        'find_key': lambda: find_key(data, 't'),
+        'iter_keys': lambda: sum(1 for _ in iter_keys(data, 't')),
+        'iter_keys paths': lambda: sum(1 for _ in iter_keys(data, 't', paths=True)),
+        'legacy x3 keys': lambda: [find_key_legacy(data, k) for k in ('t', 'author', 'score')],
+        'iter_keys 3 keys': lambda: sum(1 for _ in iter_keys(data, ('t', 'author', 'score'))),
+    }
+    assert find_key(data, 't') == find_key_legacy(data, 't')
+    results = {}
+    for name, f in cases.items():
+        t = min(timeit.repeat(f, number=number, repeat=3)) / number
+        results[name] = {'ms': t * 1e3, 'peak_kb': peak(f) / 1e3}
+        print(f'{name:>18}: {t * 1e3:8.2f} ms  peak {results[name]["peak_kb"]:9.1f} KB')
+    return results
+
+
+if __name__ == '__main__':
+    main()
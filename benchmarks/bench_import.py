@@ -0,0 +1,77 @@
+"""
+Benchmark: cold import time of the package, checked against a budget.
+
+Each module is imported in a fresh interpreter. Besides timing, this checks that importing
+`reddit.scraper` leaves optional dependencies unloaded and the event loop policy untouched,
+since those are deterministic and catch regressions that timings on noisy machines miss.
+
+python -m benchmarks.bench_import
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+# cumulative import time in ms, generous enough for slow CI machines. Most of `reddit.scraper` is httpx
+BUDGET_MS = {
+    'reddit.constants': 5,
+    'reddit.util': 60,
+    'reddit.models': 80,
+    'reddit.scraper': 250,
+}
+
+# must only be imported when the feature using them is
+DEFERRED = (
+    'selectolax', 'tqdm', 'websockets', 'uvloop', 'nest_asyncio', 'sqlite3', 'logging.config',
+    'dataclasses', 'reddit.live', 'reddit.sink', 'reddit.metrics', 'reddit.cache', 'reddit.tokens', 'reddit.models',
+    'reddit.watch', 'reddit.registry',
+)
+
+_CHECK = '''
+import asyncio, sys
+policy = type(asyncio.get_event_loop_policy())
+import reddit.scraper
+assert type(asyncio.get_event_loop_policy()) is policy, 'event loop policy changed on import'
+print(' '.join(m for m in {deferred!r} if m in sys.modules))
+'''
+
+
+def import_ms(module: str, runs: int = 5) -> float:
+    """
+    @return: best cumulative import time of `module` over `runs` fresh interpreters, in ms
+    """
+    best = None
+    for _ in range(runs):
+        err = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT,
+                             capture_output=True, text=True, check=True).stderr
+        for line in err.splitlines():
+            if line.rstrip().endswith(f'| {module}'):
+                us = int(line.split('|')[1])
+                best = us if best is None else min(best, us)
+    return best / 1e3
+
+
+def violations() -> list[str]:
+    out = subprocess.run([sys.executable, '-c', _CHECK.format(deferred=DEFERRED)], cwd=ROOT,
+                         capture_output=True, text=True)
+    if out.returncode:
+        return [out.stderr.strip().splitlines()[-1]]
+    return [f'{m} imported by reddit.scraper' for m in out.stdout.split()]
+
+
+def main(runs: int = 5) -> dict:
+    results = {}
+    for module, budget in BUDGET_MS.items():
+        ms = import_ms(module, runs)
+        results[module] = {'ms': ms, 'budget_ms': budget, 'over': ms > budget}
+        print(f'{module:>18}: {ms:7.1f} ms  budget {budget:4d} ms{"  OVER BUDGET" if ms > budget else ""}')
+    results['violations'] = violations()
+    for v in results['violations']:
+        print(f'  {v}')
+    return results
+
+
+if __name__ == '__main__':
+    res = main()
+    sys.exit(1 if res['violations'] or any(r['over'] for r in res.values() if isinstance(r, dict)) else 0)
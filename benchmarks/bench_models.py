@@ -0,0 +1,48 @@
+"""
+Benchmark: memory per record of the typed models against the raw decoded dicts.
+
+python -m benchmarks.bench_models
+"""
+import sys
+import timeit
+
+from reddit.models import Comment, Post, parse_page
+from .fixtures import post_data
+
+
+def deep_size(o: any, seen: set = None) -> int:
+    """
+    Size in bytes of an object and everything it references.
+    """
+    seen = set() if seen is None else seen
+    if id(o) in seen:
+        return 0
+    seen.add(id(o))
+    size = sys.getsizeof(o)
+    if isinstance(o, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in o.items())
+    elif isinstance(o, (list, tuple, set)):
+        size += sum(deep_size(e, seen) for e in o)
+    elif hasattr(o, '__slots__'):
+        size += sum(deep_size(getattr(o, s), seen) for c in type(o).__mro__ for s in getattr(c, '__slots__', ()))
+    return size
+
+
+def main(n: int = 10000) -> dict:
+    data = post_data(n)
+    raw = list(data['comments']['models'].values())
+    results = {}
+    for name, fields in (('all fields', None), ('id, parent_id, body', {'id', 'parent_id', 'body'})):
+        _, comments = parse_page(data, {Comment: fields})
+        raw_b, rec_b = deep_size(raw) / n, deep_size(comments) / n
+        t = timeit.timeit(lambda: parse_page(data, {Comment: fields}), number=3) / 3
+        results[name] = {'raw_bytes': raw_b, 'record_bytes': rec_b, 'ratio': raw_b / rec_b, 'parse_ms': t * 1e3}
+        print(f'Comment ({name:>20}): raw {raw_b:7.0f} B/record  model {rec_b:6.0f} B/record  '
+              f'{raw_b / rec_b:4.1f}x smaller  parse {n / t:9.0f} records/s')
+    post = next(iter(data['posts']['models'].values()))
+    print(f'Post: raw {deep_size(post):.0f} B  model {deep_size(Post.parse(post)):.0f} B')
+    return results
+
+
+if __name__ == '__main__':
+    main()
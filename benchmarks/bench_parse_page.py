@@ -0,0 +1,42 @@
+"""
+Benchmark: `script#data` and csrf extraction from raw page bytes against a full DOM parse.
+
+Both paths start from the response bytes, as the scraper gets them, so the DOM path includes
+decoding the page to text.
+
+python -m benchmarks.bench_parse_page
+"""
+import timeit
+
+from selectolax.lexbor import LexborHTMLParser
+
+from reddit.util import extract_json, find_input_value, find_script_data
+from .fixtures import pages, post_page
+
+
+def parse_dom(raw: bytes) -> tuple[dict, str]:
+    tree = LexborHTMLParser(raw.decode())
+    data = extract_json(tree.css_first('script#data').text())
+    return data, tree.css_first('input[name=csrf_token]').attributes['value']
+
+
+def parse_raw(raw: bytes) -> tuple[dict, str]:
+    return find_script_data(raw), find_input_value(raw, 'csrf_token')
+
+
+def main(number: int = 5) -> dict:
+    results = {}
+    # recorded (or synthetic) post pages, plus a page where markup dominates the data script
+    fixtures = pages() | {'markup-heavy': post_page(100, markup=40000)}
+    for name, html in fixtures.items():
+        raw = html.encode()
+        assert parse_raw(raw) == parse_dom(raw)
+        old = min(timeit.repeat(lambda: parse_dom(raw), number=number, repeat=3)) / number
+        new = min(timeit.repeat(lambda: parse_raw(raw), number=number, repeat=3)) / number
+        results[name] = {'bytes': len(raw), 'dom_ms': old * 1e3, 'raw_ms': new * 1e3, 'speedup': old / new}
+        print(f'{name:>20} {len(raw) / 1e6:8.2f} MB  dom {old * 1e3:9.2f} ms  raw {new * 1e3:7.2f} ms  {old / new:6.1f}x')
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: aggregate throughput of `ScraperPool` against a mock server that gives each
+bearer token its own rate budget.
+
+python -m benchmarks.bench_pool
+"""
+import asyncio
+import threading
+import time
+
+import httpx
+
+from reddit.constants import Operation
+from reddit.pool import AsyncScraperPool, ScraperPool
+from reddit.scraper import AsyncScraper, Scraper
+
+
+class Budget:
+    """
+    Per-token fixed window rate limit, answered with Reddit's `x-ratelimit-*` headers.
+    """
+
+    def __init__(self, limit: int = 20, window: float = 1.):
+        self.limit = limit
+        self.window = window
+        self.windows = {}
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, req: httpx.Request) -> httpx.Response:
+        token, now = req.headers.get('authorization'), time.monotonic()
+        with self._lock:
+            start, used = self.windows.get(token, (now, 0))
+            if now - start >= self.window:
+                start, used = now, 0
+            used += 1
+            self.windows[token] = start, used
+            self.throttled += used > self.limit
+        headers = {
+            'x-ratelimit-remaining': str(float(max(self.limit - used, 0))),
+            'x-ratelimit-used': str(used),
+            'x-ratelimit-reset': f'{max(self.window - (now - start), .01):.3f}',
+        }
+        return httpx.Response(429 if used > self.limit else 200, json={'data': {}}, headers=headers)
+
+
+def _auth(i: int) -> dict:
+    return {'cookies': {'USER': 'x', 'csrf_token': 'x'}, 'headers': {'authorization': f'Bearer {i}'}}
+
+
+def sync(size: int, n: int, budget: Budget) -> float:
+    transport = httpx.MockTransport(budget)
+    pool = ScraperPool(scrapers=[Scraper(session=httpx.Client(transport=transport, **_auth(i)), identity=str(i))
+                                 for i in range(size)])
+    start = time.perf_counter()
+    pool.batch([(Operation.SubredditPageExtra, {'subredditName': str(i)}) for i in range(n)], concurrency=4 * size)
+    return n / (time.perf_counter() - start)
+
+
+async def _async(size: int, n: int, budget: Budget) -> float:
+    async def handler(req):
+        return budget(req)
+
+    transport = httpx.MockTransport(handler)
+    scrapers = [AsyncScraper(session=httpx.AsyncClient(transport=transport, **_auth(i)), identity=str(i))
+                for i in range(size)]
+    async with AsyncScraperPool(scrapers=scrapers) as pool:
+        start = time.perf_counter()
+        await pool.batch([(Operation.SubredditPageExtra, {'subredditName': str(i)}) for i in range(n)],
+                         concurrency=4 * size)
+        return n / (time.perf_counter() - start)
+
+
+def main(n: int = 200) -> dict:
+    results = {}
+    for size in (1, 2, 4, 8):
+        budget = Budget()
+        rps = sync(size, n, budget)
+        abudget = Budget()
+        arps = asyncio.run(_async(size, n, abudget))
+        results[size] = {'sync_rps': rps, 'async_rps': arps, 'throttled': budget.throttled + abudget.throttled}
+        print(f'pool size {size}:  sync {rps:7.1f} req/s  async {arps:7.1f} req/s  throttled {results[size]["throttled"]}')
+    return results
+
+
+if __name__ == '__main__':
+    main()
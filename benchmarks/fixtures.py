@@ -0,0 +1,179 @@
+"""
+Recorded and synthetic fixtures for the benchmarks.
+
+Real pages can be recorded with `util.save` and dropped into `benchmarks/fixtures/`,
+every `*.html` file there is picked up by `pages()`. When none are present, synthetic
+pages shaped like Reddit's `script#data` payload are generated instead. Recorded GraphQL
+responses go in `benchmarks/fixtures/gql/{operation name}.json`, see `gql_response`.
+"""
+import random
+import string
+from pathlib import Path
+
+import orjson
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+def _id(rng: random.Random, n: int = 7) -> str:
+    return ''.join(rng.choices(string.ascii_lowercase + string.digits, k=n))
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return ' '.join(''.join(rng.choices(string.ascii_letters, k=rng.randint(2, 9))) for _ in range(words))
+
+
+def post_data(n_comments: int = 2000, seed: int = 0) -> dict:
+    """
+    Synthetic `script#data` payload for a post page.
+
+    @param n_comments: number of comments in the thread
+    @param seed: random seed
+    @return: dict shaped like the decoded `window.___r` object
+    """
+    rng = random.Random(seed)
+    post_id = _id(rng)
+    comments, ids = {}, []
+    for i in range(n_comments):
+        cid = f't1_{_id(rng)}'
+        parent = rng.choice(ids) if ids and rng.random() < .7 else None
+        comments[cid] = {
+            'id': cid,
+            'author': _id(rng, 10),
+            'authorId': f't2_{_id(rng, 8)}',
+            'created': 1686000000 + i,
+            'depth': 0 if parent is None else comments[parent]['depth'] + 1,
+            'parentId': parent,
+            'postId': f't3_{post_id}',
+            'score': rng.randint(-20, 5000),
+            'permalink': f'/r/pics/comments/{post_id}/_/{cid[3:]}/',
+            'media': {'richtextContent': {'document': [{'e': 'par', 'c': [{'e': 'text', 't': _text(rng, 30)}]}]}},
+            'isStickied': False,
+            'isGildable': True,
+            'allAwardings': [],
+            'collapsedReason': None,
+            'distinguishType': None,
+            'editedAt': None,
+            'sendReplies': True,
+        }
+        ids.append(cid)
+    return {
+        'user': {'session': {'accessToken': _id(rng, 40), 'expires': '2030-01-01T00:00:00.000Z'}},
+        'posts': {'models': {f't3_{post_id}': {
+            'id': f't3_{post_id}',
+            'title': _text(rng, 12),
+            'author': _id(rng, 10),
+            'belongsTo': {'id': 't5_2qh0u', 'type': 'subreddit'},
+            'created': 1686000000,
+            'score': rng.randint(0, 100000),
+            'numComments': n_comments,
+            'permalink': f'https://www.reddit.com/r/pics/comments/{post_id}/_/',
+            'liveCommentsWebsocket': f'wss://ws.example/{post_id}',
+            'media': {'type': 'text', 'content': _text(rng, 200)},
+        }}},
+        'comments': {'models': comments},
+        'features': {_id(rng, 12): rng.random() < .5 for _ in range(500)},
+    }
+
+
+def post_page(n_comments: int = 2000, seed: int = 0, markup: int = 4000) -> str:
+    """
+    Synthetic post page: markup surrounding a `script#data` element.
+
+    @param n_comments: number of comments in the thread
+    @param seed: random seed
+    @param markup: number of filler elements around the data script
+    @return: html text
+    """
+    rng = random.Random(seed)
+    filler = ''.join(
+        f'<div class="_{_id(rng, 6)}"><span data-x="{i}">{_text(rng, 8)}</span><a href="/r/{_id(rng)}">{{}}</a></div>'
+        for i in range(markup)
+    )
+    data = orjson.dumps(post_data(n_comments, seed)).decode()
+    return (
+        '<!DOCTYPE html><html><head><title>pics</title></head><body>'
+        f'{filler}'
+        '<form><input type="hidden" name="csrf_token" value="0123456789abcdef"></form>'
+        f'<script id="data">window.___r = {data};</script>'
+        f'{filler}'
+        '</body></html>'
+    )
+
+
+def pages() -> dict[str, str]:
+    """
+    Recorded pages in `benchmarks/fixtures/`, or synthetic pages of increasing size.
+
+    @return: mapping of fixture name to html text
+    """
+    if recorded := sorted(FIXTURES.glob('*.html')):
+        return {p.stem: p.read_text() for p in recorded}
+    return {f'synthetic-{n}': post_page(n) for n in (100, 2000, 10000)}
+
+
+def _node(rng: random.Random, i: int) -> dict:
+    post_id = _id(rng)
+    return {
+        '__typename': 'SubredditPost',
+        'id': f't3_{post_id}',
+        'title': _text(rng, 12),
+        'authorInfo': {'id': f't2_{_id(rng, 8)}', 'name': _id(rng, 10)},
+        'subreddit': {'id': 't5_2qh0u', 'name': 'pics'},
+        'createdAt': '2023-06-10T12:00:00.000000+0000',
+        'score': rng.randint(0, 100000),
+        'commentCount': rng.randint(0, 5000),
+        'permalink': f'/r/pics/comments/{post_id}/_/',
+        'isNsfw': False,
+        'content': {'markdown': _text(rng, 40)},
+        'position': i,
+    }
+
+
+def gql_response(op: str, after: str = None, size: int = 25, n_pages: int = 20) -> dict:
+    """
+    GraphQL response for an operation, recorded if `benchmarks/fixtures/gql/{op}.json` exists.
+
+    Synthetic responses are one page of a paged connection, the cursor is the page number.
+
+    @param op: operation name, e.g. "GeneralSearch"
+    @param after: cursor of the page, None for the first page
+    @param size: nodes per page
+    @param n_pages: number of pages before `hasNextPage` is false
+    @return: decoded response
+    """
+    if (recorded := FIXTURES / 'gql' / f'{op}.json').exists():
+        return orjson.loads(recorded.read_bytes())
+    page = int(after or 0)
+    rng = random.Random(f'{op}-{page}')
+    conn = {
+        'edges': [{'node': _node(rng, page * size + i)} for i in range(size)],
+        'pageInfo': {'hasNextPage': page + 1 < n_pages, 'endCursor': str(page + 1)},
+    }
+    if op == 'GeneralSearch':
+        return {'data': {'search': {'general': {'posts': conn}}}}
+    return {'data': {'feed': {'elements': conn}}}
+
+
+def live_frame(post_id: str, i: int, created: float = None, seed: int = 0) -> bytes:
+    """
+    Live comment websocket message, as parsed by `live.parse_comment`.
+
+    @param post_id: post the socket belongs to
+    @param i: index of the comment
+    @param created: unix time the comment was created, used to measure lag
+    @param seed: random seed
+    """
+    rng = random.Random(f'{seed}-{post_id}-{i}')
+    return orjson.dumps({
+        'type': 'new_comment',
+        'payload': {
+            '_id36': _id(rng),
+            'author': _id(rng, 10),
+            'author_id': f't2_{_id(rng, 8)}',
+            'body': _text(rng, 30),
+            'context': f'/r/pics/comments/{post_id}/_/{_id(rng)}/',
+            'full_date': '2023-06-10T12:00:00+00:00',
+            'created_utc': created,
+        },
+    })
@@ -0,0 +1,151 @@
+"""
+Run the benchmark suites, store the results and compare them against a previous run.
+
+Results are written to `benchmarks/results/{time}-{git revision}.json`. With `--compare`, every
+rate and timing is checked against the latest stored run (or the given file), and the exit status
+is non-zero if any of them regressed by more than `--threshold`.
+
+python -m benchmarks.run
+python -m benchmarks.run --quick --compare
+python -m benchmarks.run --only client --compare benchmarks/results/baseline.json
+"""
+import argparse
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import orjson
+
+from . import (bench_client, bench_extract_json, bench_find_key, bench_import, bench_models, bench_parse_page,
+               bench_pool)
+
+RESULTS = Path(__file__).parent / 'results'
+
+# higher is better for rates, lower is better for timings, anything else is informational
+_HIGHER = ('rate', 'rps', 'speedup')
+_LOWER = ('_ms', 'ms', 'seconds')
+
+
+def suites(quick: bool, delay: float) -> dict:
+    if quick:
+        return {
+            'client': lambda: bench_client.main(delay=delay, n=50, levels=(1, 8), frames=500),
+            'extract_json': lambda: bench_extract_json.main(number=2),
+            'find_key': lambda: bench_find_key.main(n_comments=2000, number=2),
+            'imports': lambda: bench_import.main(runs=2),
+            'models': lambda: bench_models.main(n=1000),
+            'parse_page': lambda: bench_parse_page.main(number=2),
+            'pool': lambda: bench_pool.main(n=40),
+        }
+    return {
+        'client': lambda: bench_client.main(delay=delay),
+        'extract_json': bench_extract_json.main,
+        'find_key': bench_find_key.main,
+        'imports': bench_import.main,
+        'models': bench_models.main,
+        'parse_page': bench_parse_page.main,
+        'pool': bench_pool.main,
+    }
+
+
+def _revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).parent).stdout.strip() or 'unknown'
+    except OSError:
+        return 'unknown'
+
+
+def _flatten(d: dict, prefix: str = '') -> dict[str, float]:
+    out = {}
+    for k, v in d.items():
+        key = f'{prefix}/{k}' if prefix else str(k)
+        if isinstance(v, dict):
+            out |= _flatten(v, key)
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = v
+    return out
+
+
+def compare(new: dict, old: dict, threshold: float) -> list[str]:
+    """
+    @param new: results of this run
+    @param old: results of the run to compare against
+    @param threshold: relative change counted as a regression, e.g. .1 for 10%
+    @return: descriptions of the regressed metrics
+    """
+    a, b = _flatten(old['results']), _flatten(new['results'])
+    regressions = []
+    for k in sorted(a.keys() & b.keys()):
+        leaf = k.rsplit('/', 1)[-1]
+        if leaf.endswith(_HIGHER):
+            better = 1
+        elif leaf.endswith(_LOWER):
+            better = -1
+        else:
+            continue
+        if not a[k]:
+            continue
+        change = (b[k] - a[k]) / abs(a[k])
+        flag = ''
+        if change * better < -threshold:
+            flag = '  REGRESSION'
+            regressions.append(f'{k}: {a[k]:.4g} -> {b[k]:.4g} ({change:+.1%})')
+        print(f'{k:>60} {a[k]:12.4g} -> {b[k]:12.4g}  {change:+7.1%}{flag}')
+    return regressions
+
+
+def main(argv: list[str] = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument('--quick', action='store_true', help='smaller workloads, e.g. for CI')
+    p.add_argument('--delay', type=float, default=.005, help='simulated network latency of the mock server')
+    p.add_argument('--only', nargs='*',
+                   help='suites to run: client, extract_json, find_key, imports, models, parse_page, pool')
+    p.add_argument('--out', type=Path, default=RESULTS, help='directory to store results in')
+    p.add_argument('--compare', nargs='?', const='latest', help='results file to compare against, default latest')
+    p.add_argument('--threshold', type=float, default=.1, help='relative change counted as a regression')
+    args = p.parse_args(argv)
+
+    previous = sorted(args.out.glob('*.json')) if args.out.exists() else []
+    results = {}
+    for name, run in suites(args.quick, args.delay).items():
+        if args.only and name not in args.only:
+            continue
+        print(f'\n[{name}]')
+        results[name] = run()
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'revision': _revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'quick': args.quick,
+            'delay': args.delay,
+        },
+        'results': results,
+    }
+    args.out.mkdir(parents=True, exist_ok=True)
+    path = args.out / f'{time.strftime("%Y%m%dT%H%M%S")}-{report["meta"]["revision"]}.json'
+    path.write_bytes(orjson.dumps(report, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    print(f'\nsaved {path}')
+
+    if args.compare:
+        if args.compare == 'latest':
+            if not previous:
+                print('no previous results to compare against')
+                return 0
+            base = previous[-1]
+        else:
+            base = Path(args.compare)
+        print(f'\ncompared to {base}')
+        if regressions := compare(report, orjson.loads(base.read_bytes()), args.threshold):
+            print(f'\n{len(regressions)} regression(s):\n' + '\n'.join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+Local mock of reddit.com, gql.reddit.com and the live comment websockets, for offline benchmarks.
+
+The server runs in a separate process so it does not compete with the client for the GIL.
+Clients reach it through a transport that rewrites every request to the local port, so
+scrapers run unmodified against their usual urls.
+
+    with MockReddit(delay=.005) as server:
+        reddit = Scraper(session=server.client())
+        reddit.posts({'pics': ['abc', 'def']})
+
+python -m benchmarks.server  # serve until interrupted
+"""
+import asyncio
+import multiprocessing
+import re
+import socket
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import orjson
+
+from reddit.metrics import operation
+from .fixtures import gql_response, live_frame, post_data, post_page
+
+AUTH_COOKIES = {'USER': 'x', 'csrf_token': 'x'}
+_POST_PATH = re.compile(r'/r/[^/]+/comments/([^/?]+)')
+# requests are written as separate header and body segments, without this each POST stalls on delayed ACKs
+_SOCKET_OPTIONS = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    server: _Server
+
+    def log_message(self, *args):
+        ...
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        if (delay := self.server.config['delay']) > 0:
+            time.sleep(delay)
+        self.send_response(status)
+        self.send_header('content-type', content_type)
+        self.send_header('content-length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if m := _POST_PATH.match(self.path):
+            page, template_id = self.server.page
+            return self._send(200, page.replace(template_id, m.group(1).encode()), 'text/html; charset=utf-8')
+        self._send(404, b'not found', 'text/plain')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('content-length') or 0))
+        if not self.headers.get('host', '').startswith('gql.'):
+            return self._send(404, b'not found', 'text/plain')
+        json = orjson.loads(body)
+        res = [self._gql(j) for j in json] if isinstance(json, list) else self._gql(json)
+        self._send(200, orjson.dumps(res), 'application/json')
+
+    def _gql(self, json: dict) -> dict:
+        op = operation(self.server.config['gql'], json)
+        after = next((v for k, v in (json.get('variables') or {}).items() if k.lower().endswith('after')), None)
+        key = op, after
+        if (res := self.server.gql_cache.get(key)) is None:
+            res = self.server.gql_cache[key] = gql_response(op, after, self.server.config['page_size'],
+                                                            self.server.config['n_pages'])
+        return res
+
+
+async def _ws_main(config: dict, ready: asyncio.Future):
+    from websockets.asyncio.server import serve
+
+    async def handler(ws):
+        post_id = ws.request.path.strip('/')
+        for i in range(config['frames']):
+            await ws.send(live_frame(post_id, i, time.time()))
+            if config['frame_interval']:
+                await asyncio.sleep(config['frame_interval'])
+
+    async with serve(handler, '127.0.0.1', 0, max_size=None) as server:
+        ready.set_result(server.sockets[0].getsockname()[1])
+        await asyncio.Future()
+
+
+def _serve(config: dict, conn):
+    import threading
+
+    loop = asyncio.new_event_loop()
+    ws_port = loop.create_future()
+    threading.Thread(target=lambda: loop.run_until_complete(_ws_main(config, ws_port)), daemon=True).start()
+    while not ws_port.done():
+        time.sleep(.01)
+
+    data = post_data(config['n_comments'])
+    template_id = next(iter(data['posts']['models']))[3:]
+    page = post_page(config['n_comments']).replace('wss://ws.example/', f'ws://127.0.0.1:{ws_port.result()}/')
+
+    server = _Server(('127.0.0.1', 0), _Handler)
+    server.config = config
+    server.page = page.encode(), template_id.encode()
+    server.gql_cache = {}
+    conn.send((server.server_address[1], ws_port.result()))
+    server.serve_forever()
+
+
+class _LocalTransport(httpx.HTTPTransport):
+    def __init__(self, port: int, **kwargs):
+        super().__init__(socket_options=_SOCKET_OPTIONS, **kwargs)
+        self.port = port
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        # the Host header still carries the original host, which the server routes on
+        request.url = request.url.copy_with(scheme='http', host='127.0.0.1', port=self.port)
+        return super().handle_request(request)
+
+
+class _AsyncLocalTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, port: int, **kwargs):
+        super().__init__(socket_options=_SOCKET_OPTIONS, **kwargs)
+        self.port = port
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.url = request.url.copy_with(scheme='http', host='127.0.0.1', port=self.port)
+        return await super().handle_async_request(request)
+
+
+class MockReddit:
+    """
+    Mock server serving post pages, paged GraphQL responses and live comment frames.
+    """
+
+    def __init__(self, delay: float = 0., n_comments: int = 500, page_size: int = 25, n_pages: int = 20,
+                 frames: int = 1000, frame_interval: float = 0.):
+        """
+        @param delay: seconds each HTTP response is held for, to simulate network latency
+        @param n_comments: comments per post page
+        @param page_size: nodes per GraphQL page
+        @param n_pages: GraphQL pages before `hasNextPage` is false
+        @param frames: live comment frames sent per websocket before it is closed
+        @param frame_interval: seconds between live comment frames
+        """
+        self.config = {
+            'delay': delay,
+            'n_comments': n_comments,
+            'page_size': page_size,
+            'n_pages': n_pages,
+            'frames': frames,
+            'frame_interval': frame_interval,
+            'gql': 'https://gql.reddit.com',
+        }
+        self.port = self.ws_port = None
+        self._process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        ctx = multiprocessing.get_context('spawn')
+        parent, child = ctx.Pipe()
+        self._process = ctx.Process(target=_serve, args=(self.config, child), daemon=True)
+        self._process.start()
+        self.port, self.ws_port = parent.recv()
+        return self
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def client(self, **kwargs) -> httpx.Client:
+        """
+        @param kwargs: keyword arguments passed to `httpx.Client`
+        @return: authenticated session routed to the mock server
+        """
+        return httpx.Client(transport=_LocalTransport(self.port, limits=kwargs.pop('limits', httpx.Limits())),
+                            cookies=AUTH_COOKIES, **kwargs)
+
+    def async_client(self, **kwargs) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=_AsyncLocalTransport(self.port, limits=kwargs.pop('limits', httpx.Limits())),
+                                 cookies=AUTH_COOKIES, **kwargs)
+
+
+if __name__ == '__main__':
+    with MockReddit() as server:
+        print(f'http://127.0.0.1:{server.port}  ws://127.0.0.1:{server.ws_port}')
+        try:
+            server._process.join()
+        except KeyboardInterrupt:
+            ...
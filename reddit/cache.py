@@ -0,0 +1,146 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import orjson
+
+from .registry import registry
+
+# feeds and search are polled for new items by `iter_*` and `watch`, they are not cached unless given a ttl
+POLLED = frozenset({'Frontpage', 'GeneralSearch', 'PopularFeedElements', 'SubredditPosts'})
+
+
+class Cache:
+    """
+    Response cache for GraphQL operations.
+
+    Entries are keyed on the session identity, the operation id and its canonicalised variables, and stored as
+    raw response bytes in an in-memory LRU tier backed by an optional sqlite tier on disk.
+
+    Only queries are cached: the ones in the registry, except `POLLED`, and any operation given a ttl in
+    `ttls`. Mutations and subscriptions never are.
+    """
+
+    def __init__(self, path: Path | str = None, maxsize: int = 1024, ttl: float = 300, ttls: dict = None):
+        """
+        @param path: sqlite file for the disk tier, None for memory only
+        @param maxsize: maximum number of entries in the memory tier
+        @param ttl: default time-to-live in seconds
+        @param ttls: per-operation time-to-live, e.g. {Operation.SubredditPageExtra: 3600}. 0 disables caching,
+            operations missing from the registry are only cached if listed here
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self.hits = self.misses = self.disk_hits = 0
+        self._mem: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute('pragma journal_mode=wal')
+            self._db.execute('create table if not exists cache (key text primary key, op text, expires real, value blob)')
+
+    @staticmethod
+    def key(json: dict, scope: str = '') -> str:
+        """
+        @param json: GraphQL request body
+        @param scope: identity of the session, responses of one account are never served to another
+        """
+        variables = orjson.dumps(json.get('variables'), option=orjson.OPT_SORT_KEYS)
+        digest = hashlib.blake2b(scope.encode() + b'\0' + variables, digest_size=16).hexdigest()
+        return f"{json['id']}:{digest}"
+
+    def ttl_for(self, op: str) -> float:
+        """
+        @param op: operation id
+        @return: time-to-live of the operation's responses, 0 if they are not cached
+        """
+        if (info := registry.by_id(op)) and info.type != 'query':
+            return 0
+        if op in self.ttls:
+            return self.ttls[op]
+        return self.ttl if info and info.name not in POLLED else 0
+
+    def get(self, json: dict, scope: str = '') -> bytes | None:
+        """
+        @param json: GraphQL request body
+        @param scope: identity of the session
+        @return: cached response bytes, or None on a miss
+        """
+        if not self.ttl_for(json['id']):
+            return
+        key, now = self.key(json, scope), time.time()
+        with self._lock:
+            if (entry := self._mem.get(key)) and entry[0] > now:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if self._db and (row := self._db.execute('select expires, value from cache where key = ?',
+                                                     (key,)).fetchone()):
+                if row[0] > now:
+                    self._put(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[1]
+                self._db.execute('delete from cache where key = ?', (key,))
+            self.misses += 1
+
+    def set(self, json: dict, value: bytes, scope: str = ''):
+        """
+        @param json: GraphQL request body
+        @param value: raw response bytes
+        @param scope: identity of the session
+        """
+        if not (ttl := self.ttl_for(json['id'])):
+            return
+        key, expires = self.key(json, scope), time.time() + ttl
+        with self._lock:
+            self._put(key, expires, value)
+            if self._db:
+                self._db.execute('insert or replace into cache values (?, ?, ?, ?)', (key, json['id'], expires, value))
+
+    def _put(self, key: str, expires: float, value: bytes):
+        self._mem[key] = expires, value
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.maxsize:
+            self._mem.popitem(last=False)
+
+    def purge(self) -> int:
+        """
+        Remove expired entries from both tiers.
+
+        @return: number of entries removed from disk
+        """
+        now = time.time()
+        with self._lock:
+            for k in [k for k, (expires, _) in self._mem.items() if expires <= now]:
+                del self._mem[k]
+            if self._db:
+                return self._db.execute('delete from cache where expires <= ?', (now,)).rowcount
+        return 0
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self._db:
+                self._db.execute('delete from cache')
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'memory_hits': self.hits - self.disk_hits,
+                'disk_hits': self.disk_hits,
+                'size': len(self._mem),
+            }
+
+    def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
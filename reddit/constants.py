@@ -1,7 +1,6 @@
-from dataclasses import dataclass
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36'
 
 
-@dataclass
 class Operation:
     AddApprovedTalkHost = '84b1688a0244'
     AddPredictionDrafts = 'c821ca1db9f1'
@@ -295,7 +294,6 @@ class Operation:
     WikiRevisions = '83e11ebf7cbf'
 
 
-@dataclass
 class Location:
     # United States
     Alaska = 'US_AK'
@@ -389,7 +387,6 @@ class Location:
     UnitedKingdom = 'GB'
 
 
-@dataclass
 class Sort:
     Hot = 'HOT'
     New = 'NEW'
@@ -400,7 +397,6 @@ class Sort:
     Comments = 'COMMENTS'
 
 
-@dataclass
 class Range:
     Day = 'DAY'
     Week = 'WEEK'
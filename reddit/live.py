@@ -0,0 +1,145 @@
+import asyncio
+import time
+from typing import AsyncIterator
+
+import orjson
+import websockets
+
+from .util import backoff, find_key
+
+
+class SocketStats:
+    """
+    Counters for one live comment websocket.
+    """
+    __slots__ = ('post_id', 'uri', 'connected', 'messages', 'comments', 'errors', 'reconnects',
+                 'lag', 'queue_lag', 'started', 'last_at', 'last_error')
+
+    def __init__(self, post_id: str, uri: str):
+        self.post_id = post_id
+        self.uri = uri
+        self.connected = False
+        self.messages = 0
+        self.comments = 0
+        self.errors = 0
+        self.reconnects = 0
+        self.lag = None  # seconds between a comment's creation and its arrival, smoothed
+        self.queue_lag = None  # seconds a comment waited in the queue before being consumed, smoothed
+        self.started = time.time()
+        self.last_at = None
+        self.last_error = None
+
+    @property
+    def rate(self) -> float:
+        """
+        @return: comments per second since the socket was first opened
+        """
+        return self.comments / max(time.time() - self.started, 1e-9)
+
+    @staticmethod
+    def _smooth(old: float | None, new: float, alpha: float = .1) -> float:
+        return new if old is None else old + alpha * (new - old)
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__} | {'rate': self.rate}
+
+
+def parse_comment(msg: str | bytes, post_id: str) -> dict | None:
+    """
+    Parse a live comment websocket message into a flat record.
+
+    @param msg: raw websocket message
+    @param post_id: id of the post the socket belongs to
+    @return: comment record, or None if the message carries no payload
+    """
+    data = orjson.loads(msg)
+    if not (payload := data.get('payload')):
+        return
+    context = payload.get('context')
+    created = payload.get('created_utc') or payload.get('created')
+    return {
+        'post_id': post_id,
+        'type': data.get('type'),
+        'id': payload.get('_id36') or payload.get('id'),
+        'author': payload.get('author'),
+        'author_id': payload.get('author_id'),
+        'body': payload.get('body') or ' '.join(find_key(payload, 't')),
+        'context': context,
+        'link': f'https://reddit.com{context}' if context else None,
+        'full_date': payload.get('full_date'),
+        'created': created if isinstance(created, (int, float)) else None,
+        'received': time.time(),
+    }
+
+
+async def listen(post_id: str, uri: str, queue: asyncio.Queue, stats: SocketStats, max_reconnects: int = None):
+    """
+    Read one websocket into the queue, reconnecting with backoff when the socket drops.
+
+    A full queue blocks the reader, which pushes back on the socket instead of buffering without bound.
+    """
+    attempt = 0
+    while True:
+        try:
+            async with websockets.connect(uri) as ws:
+                stats.connected, attempt = True, 0
+                async for msg in ws:
+                    stats.messages += 1
+                    stats.last_at = time.time()
+                    try:
+                        rec = parse_comment(msg, post_id)
+                    except Exception as e:
+                        stats.errors += 1
+                        stats.last_error = f'{type(e).__name__}: {e}'
+                        continue
+                    if rec is None:
+                        continue
+                    if rec['created']:
+                        stats.lag = stats._smooth(stats.lag, max(rec['received'] - rec['created'], 0.))
+                    await queue.put(rec)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            stats.errors += 1
+            stats.last_error = f'{type(e).__name__}: {e}'
+        stats.connected = False
+        if max_reconnects is not None and stats.reconnects >= max_reconnects:
+            return
+        stats.reconnects += 1
+        await asyncio.sleep(backoff(attempt))
+        attempt += 1
+
+
+async def stream(sockets: list[tuple[str, str]], stats: dict[str, SocketStats], maxsize: int = 1000,
+                 max_reconnects: int = None) -> AsyncIterator[dict]:
+    """
+    Merge many live comment websockets into one stream through a single bounded queue.
+
+    @param sockets: (post_id, websocket uri) pairs
+    @param stats: dict to record per-socket stats in, keyed by post id
+    @param maxsize: maximum number of comments buffered before the sockets are paused
+    @param max_reconnects: give up on a socket after this many reconnects, None to retry forever
+    @return: async iterator over comment records
+    """
+    queue = asyncio.Queue(maxsize)
+    tasks = []
+    for post_id, uri in sockets:
+        stats[post_id] = SocketStats(post_id, uri)
+        tasks.append(asyncio.ensure_future(listen(post_id, uri, queue, stats[post_id], max_reconnects)))
+    done = asyncio.ensure_future(asyncio.gather(*tasks, return_exceptions=True))
+    try:
+        while not (done.done() and queue.empty()):
+            get = asyncio.ensure_future(queue.get())
+            await asyncio.wait({get, done}, return_when=asyncio.FIRST_COMPLETED)
+            if not get.done():
+                get.cancel()
+                continue
+            rec = get.result()
+            s = stats[rec['post_id']]
+            s.comments += 1
+            s.queue_lag = s._smooth(s.queue_lag, time.time() - rec['received'])
+            yield rec
+    finally:
+        for t in tasks:
+            t.cancel()
+        done.cancel()
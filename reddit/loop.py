@@ -0,0 +1,55 @@
+import asyncio
+import platform
+import sys
+from typing import Coroutine
+
+_uvloop = False
+
+
+def configure(uvloop: bool = True, nested: bool = None):
+    """
+    Opt-in event loop configuration. Nothing is changed at import time.
+
+    uvloop only applies to the loops the synchronous `Scraper` runs internally, e.g. in `live_comments`.
+    The global event loop policy is left alone, so loops created by the application are unaffected.
+
+    @param uvloop: run internal loops on uvloop when it is installed
+    @param nested: patch asyncio with nest_asyncio so loops can be re-entered, which the synchronous
+        scraper needs inside Jupyter. None to patch only when running in a Jupyter kernel
+    """
+    global _uvloop
+    _uvloop = uvloop and platform.system() != 'Windows'
+    if nested is None:
+        nested = _in_notebook()
+    if nested:
+        import nest_asyncio
+
+        nest_asyncio.apply()
+
+
+def run(coro: Coroutine) -> any:
+    """
+    Run a coroutine to completion on a new loop, on uvloop if enabled by `configure`.
+    """
+    if _uvloop:
+        try:
+            import uvloop
+        except ImportError:
+            ...
+        else:
+            if sys.version_info >= (3, 11):
+                with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+                    return runner.run(coro)
+            loop = uvloop.new_event_loop()
+            try:
+                return loop.run_until_complete(coro)
+            finally:
+                loop.close()
+    return asyncio.run(coro)
+
+
+def _in_notebook() -> bool:
+    try:
+        return get_ipython().__class__.__name__ == 'ZMQInteractiveShell'
+    except NameError:
+        return False
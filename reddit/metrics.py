@@ -0,0 +1,226 @@
+import threading
+from bisect import bisect_left
+from typing import Callable
+
+from httpx import Response, URL
+
+from .constants import Operation
+
+# log-spaced upper bounds from 1ms to ~56s, fine enough for p99 estimates within 25%
+DEFAULT_BUCKETS = tuple(round(.001 * 1.25 ** i, 6) for i in range(50))
+
+_OPERATIONS = None
+_VERSION = None
+
+
+def operation(url: str | URL, json: dict | list = None) -> str:
+    """
+    Label a request by its GraphQL operation name, or by its endpoint for REST and page requests.
+
+    @param url: request url
+    @param json: request body, if any
+    @return: label, e.g. "SearchPosts", "batch", "post" or "morechildren"
+    """
+    global _OPERATIONS, _VERSION
+    if isinstance(json, dict) and (_id := json.get('id')):
+        # rebuilt when `registry.reload` changed the operation hashes
+        if _OPERATIONS is None or _VERSION != getattr(Operation, '_version', 0):
+            _VERSION = getattr(Operation, '_version', 0)
+            _OPERATIONS = {v: k for k, v in vars(Operation).items() if not k.startswith('_')}
+        return _OPERATIONS.get(_id, _id)
+    if isinstance(json, list):
+        return 'batch'
+    path = URL(url).path
+    if '/comments/' in path:
+        return 'post'
+    return path.rstrip('/').rsplit('/', 1)[-1].removesuffix('.json') or 'page'
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram, cumulative bucket counts are exported in Prometheus format.
+    """
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'min', 'max')
+
+    def __init__(self, bounds: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.
+        self.min = None
+        self.max = None
+
+    def observe(self, v: float):
+        self.counts[bisect_left(self.bounds, v)] += 1
+        self.count += 1
+        self.sum += v
+        if self.min is None or v < self.min: self.min = v
+        if self.max is None or v > self.max: self.max = v
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Estimate a quantile by interpolating linearly within its bucket.
+
+        @param q: quantile in [0, 1], e.g. .99
+        @return: estimated value, None if nothing was observed
+        """
+        if not self.count:
+            return
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                if i == len(self.bounds):
+                    return self.max
+                lo = self.bounds[i - 1] if i else 0.
+                v = lo + (self.bounds[i] - lo) * (rank - seen) / c
+                return min(max(v, self.min), self.max)
+            seen += c
+        return self.max
+
+    def stats(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(.5),
+            'p90': self.quantile(.9),
+            'p99': self.quantile(.99),
+        }
+
+
+class Metrics:
+    """
+    In-memory request metrics, fed by hooks around every request and parse step of a `Scraper`.
+
+    Latency and parse time histograms, status counts, bytes transferred, retries, errors and cache
+    hits are kept per operation. Pass metrics=True (or an instance) to `Scraper` to enable them,
+    when disabled each hook costs a single attribute check.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS, callback: Callable[[dict], None] = None,
+                 prefix: str = 'reddit'):
+        """
+        @param buckets: histogram upper bounds in seconds
+        @param callback: called with a dict for every event, e.g. to forward them to a tracer
+        @param prefix: metric name prefix used by `prometheus`
+        """
+        self.buckets = buckets
+        self.callback = callback
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = {}  # op -> Histogram of network seconds
+            self.parse_time = {}  # op -> Histogram of decode/parse seconds
+            self.statuses = {}  # (op, status) -> count
+            self.bytes_in = {}  # op -> bytes downloaded, as sent on the wire
+            self.bytes_out = {}  # op -> request body bytes
+            self.retries = {}  # op -> count
+            self.errors = {}  # (op, exception type) -> count
+            self.cache = {}  # (op, 'hit' | 'miss') -> count
+
+    def _hist(self, d: dict, op: str) -> Histogram:
+        if (h := d.get(op)) is None:
+            h = d[op] = Histogram(self.buckets)
+        return h
+
+    @staticmethod
+    def _inc(d: dict, k, n: int = 1):
+        d[k] = d.get(k, 0) + n
+
+    def on_request(self, op: str, r: Response, seconds: float):
+        # wire bytes, falling back to the body size for transports that do not stream, e.g. mocks
+        size = r.num_bytes_downloaded or len(r.content)
+        with self._lock:
+            self._hist(self.latency, op).observe(seconds)
+            self._inc(self.statuses, (op, r.status_code))
+            self._inc(self.bytes_in, op, size)
+            self._inc(self.bytes_out, op, len(r.request.content))
+        if self.callback:
+            self.callback({'event': 'request', 'op': op, 'status': r.status_code, 'seconds': seconds,
+                           'bytes': size, 'url': str(r.url)})
+
+    def on_parse(self, op: str, seconds: float):
+        with self._lock:
+            self._hist(self.parse_time, op).observe(seconds)
+        if self.callback:
+            self.callback({'event': 'parse', 'op': op, 'seconds': seconds})
+
+    def on_retry(self, op: str, e: Exception | str):
+        with self._lock:
+            self._inc(self.retries, op)
+        if self.callback:
+            self.callback({'event': 'retry', 'op': op, 'error': e if isinstance(e, str) else f'{type(e).__name__}: {e}'})
+
+    def on_error(self, op: str, e: Exception):
+        with self._lock:
+            self._inc(self.errors, (op, type(e).__name__))
+        if self.callback:
+            self.callback({'event': 'error', 'op': op, 'error': f'{type(e).__name__}: {e}'})
+
+    def on_cache(self, op: str, hit: bool):
+        with self._lock:
+            self._inc(self.cache, (op, 'hit' if hit else 'miss'))
+        if self.callback:
+            self.callback({'event': 'cache', 'op': op, 'hit': hit})
+
+    def snapshot(self) -> dict:
+        """
+        @return: per-operation latency and parse time stats, and the counters
+        """
+        with self._lock:
+            ops = sorted({*self.latency, *self.parse_time, *self.retries, *(op for op, _ in self.errors),
+                          *(op for op, _ in self.cache)})
+            return {op: {
+                'latency': self.latency[op].stats() if op in self.latency else None,
+                'parse': self.parse_time[op].stats() if op in self.parse_time else None,
+                'statuses': {s: n for (o, s), n in self.statuses.items() if o == op},
+                'bytes_in': self.bytes_in.get(op, 0),
+                'bytes_out': self.bytes_out.get(op, 0),
+                'retries': self.retries.get(op, 0),
+                'errors': {t: n for (o, t), n in self.errors.items() if o == op},
+                'cache': {k: n for (o, k), n in self.cache.items() if o == op},
+            } for op in ops}
+
+    def prometheus(self) -> str:
+        """
+        @return: all metrics in the Prometheus text exposition format
+        """
+        p = self.prefix
+        lines = []
+        with self._lock:
+            for name, hists, help_ in ((f'{p}_request_seconds', self.latency, 'Request latency'),
+                                       (f'{p}_parse_seconds', self.parse_time, 'Response decode and parse time')):
+                lines += [f'# HELP {name} {help_}.', f'# TYPE {name} histogram']
+                for op, h in sorted(hists.items()):
+                    lbl = _labels(op=op)
+                    cum = 0
+                    for le, c in zip((*h.bounds, '+Inf'), h.counts):
+                        cum += c
+                        lines.append(f'{name}_bucket{_labels(op=op, le=le)} {cum}')
+                    lines += [f'{name}_sum{lbl} {h.sum}', f'{name}_count{lbl} {h.count}']
+            for name, counter, keys, help_ in (
+                    (f'{p}_requests_total', self.statuses, ('op', 'status'), 'Responses by status code'),
+                    (f'{p}_response_bytes_total', self.bytes_in, ('op',), 'Bytes downloaded'),
+                    (f'{p}_request_bytes_total', self.bytes_out, ('op',), 'Request body bytes sent'),
+                    (f'{p}_retries_total', self.retries, ('op',), 'Retried requests'),
+                    (f'{p}_errors_total', self.errors, ('op', 'type'), 'Failed requests by exception type'),
+                    (f'{p}_cache_total', self.cache, ('op', 'result'), 'GraphQL cache lookups'),
+            ):
+                lines += [f'# HELP {name} {help_}.', f'# TYPE {name} counter']
+                for k, n in sorted(counter.items(), key=lambda x: str(x[0])):
+                    lines.append(f'{name}{_labels(**dict(zip(keys, k if isinstance(k, tuple) else (k,))))} {n}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(v: any) -> str:
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**kw) -> str:
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in kw.items()) + '}'
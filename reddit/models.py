@@ -0,0 +1,202 @@
+from dataclasses import dataclass, fields as dc_fields
+from datetime import datetime
+
+from .util import find_connection, find_key
+
+_MISSING = object()
+
+
+def _get(raw: dict, paths: tuple) -> any:
+    """
+    Get the first value found at any of the paths, a path is a key or a tuple of keys.
+    """
+    for path in paths:
+        o = raw
+        for k in (path if isinstance(path, tuple) else (path,)):
+            if not isinstance(o, dict) or (o := o.get(k, _MISSING)) is _MISSING:
+                break
+        else:
+            if o is not None:
+                return o
+
+
+def _timestamp(v: any) -> float | None:
+    """
+    Normalise epoch seconds, epoch milliseconds and ISO 8601 strings to epoch seconds.
+    """
+    if isinstance(v, (int, float)):
+        return v / 1000 if v > 1e11 else float(v)
+    if isinstance(v, str):
+        try:
+            return datetime.fromisoformat(v.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            ...
+
+
+def _text(v: any) -> str | None:
+    """
+    Plain text of a markdown string or a richtext document.
+    """
+    if v is None or isinstance(v, str):
+        return v
+    return ' '.join(find_key(v, 't')) or None
+
+
+class _Record:
+    """
+    Base for slotted records parsed from `script#data` models or GraphQL nodes.
+
+    `_sources` maps each field to the paths it is read from, `_convert` to an optional conversion.
+    """
+    __slots__ = ()
+    _sources: dict = {}
+    _convert: dict = {}
+
+    @classmethod
+    def parse(cls, raw: dict, fields: set[str] = None):
+        """
+        @param raw: model dict or GraphQL node
+        @param fields: names of the fields to keep, None for all. Other fields are left as None
+        @return: record instance, the raw dict can be discarded afterwards
+        """
+        kw = {}
+        for name, paths in cls._sources.items():
+            if fields is not None and name not in fields:
+                continue
+            v = _get(raw, paths)
+            if v is not None and (f := cls._convert.get(name)):
+                v = f(v)
+            kw[name] = v
+        return cls(**kw)
+
+    def asdict(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in dc_fields(self)}
+
+
+@dataclass(slots=True)
+class Post(_Record):
+    id: str = None
+    title: str = None
+    author: str = None
+    author_id: str = None
+    subreddit: str = None
+    subreddit_id: str = None
+    created: float = None
+    score: int = None
+    num_comments: int = None
+    permalink: str = None
+    url: str = None
+    nsfw: bool = None
+    body: str = None
+
+    _sources = {
+        'id': ('id',),
+        'title': ('title', 'postTitle'),
+        'author': ('author', ('authorInfo', 'name')),
+        'author_id': ('authorId', ('authorInfo', 'id')),
+        'subreddit': (('subreddit', 'name'), ('belongsTo', 'name')),
+        'subreddit_id': (('belongsTo', 'id'), ('subreddit', 'id')),
+        'created': ('created', 'createdAt'),
+        'score': ('score',),
+        'num_comments': ('numComments', 'commentCount'),
+        'permalink': ('permalink',),
+        'url': ('url', ('source', 'url')),
+        'nsfw': ('isNSFW', 'isNsfw'),
+        'body': (('media', 'content'), ('content', 'markdown'), 'selftext'),
+    }
+    _convert = {'created': _timestamp, 'body': _text}
+
+
+@dataclass(slots=True)
+class Comment(_Record):
+    id: str = None
+    post_id: str = None
+    parent_id: str = None
+    depth: int = None
+    author: str = None
+    author_id: str = None
+    created: float = None
+    score: int = None
+    permalink: str = None
+    body: str = None
+
+    _sources = {
+        'id': ('id',),
+        'post_id': ('postId', ('postInfo', 'id'), 'link_id'),
+        'parent_id': ('parentId', ('parent', 'id'), 'parent_id'),
+        'depth': ('depth',),
+        'author': ('author', ('authorInfo', 'name')),
+        'author_id': ('authorId', ('authorInfo', 'id'), 'author_fullname'),
+        'created': ('created', 'createdAt', 'created_utc'),
+        'score': ('score',),
+        'permalink': ('permalink',),
+        'body': ('bodyMD', 'body', ('content', 'markdown'), ('media', 'richtextContent')),
+    }
+    _convert = {'created': _timestamp, 'body': _text}
+
+
+@dataclass(slots=True)
+class Subreddit(_Record):
+    id: str = None
+    name: str = None
+    title: str = None
+    description: str = None
+    subscribers: int = None
+    created: float = None
+    nsfw: bool = None
+
+    _sources = {
+        'id': ('id',),
+        'name': ('name', 'displayText'),
+        'title': ('title', ('styles', 'title')),
+        'description': ('publicDescriptionText', 'publicDescription', 'description'),
+        'subscribers': ('subscribersCount', 'subscribers'),
+        'created': ('createdAt', 'created'),
+        'nsfw': ('isNsfw', 'isNSFW'),
+    }
+    _convert = {'created': _timestamp, 'description': _text}
+
+
+@dataclass(slots=True)
+class Author(_Record):
+    id: str = None
+    name: str = None
+    karma: int = None
+    created: float = None
+
+    _sources = {
+        'id': ('id',),
+        'name': ('name', 'displayName', 'username'),
+        'karma': (('karma', 'total'), 'totalKarma'),
+        'created': ('createdAt', 'created'),
+    }
+    _convert = {'created': _timestamp}
+
+
+def parse_page(data: dict, fields: dict[type, set[str]] = None) -> tuple[list[Post], list[Comment]]:
+    """
+    Parse the posts and comments of a decoded `script#data` page, e.g. a value returned by `Scraper.posts`.
+
+    @param data: decoded `script#data`
+    @param fields: fields to keep per record type, e.g. {Comment: {'id', 'body'}}
+    @return: posts and comments
+    """
+    fields = fields or {}
+    posts = [Post.parse(m, fields.get(Post)) for m in ((data.get('posts') or {}).get('models') or {}).values()]
+    comments = [Comment.parse(m, fields.get(Comment)) for m in
+                ((data.get('comments') or {}).get('models') or {}).values()]
+    return posts, comments
+
+
+def parse_edges(data: dict, model: type[_Record], kind: str = None, fields: set[str] = None) -> list:
+    """
+    Parse the nodes of a GraphQL connection, e.g. the posts of a `Scraper.search` response.
+
+    @param data: GraphQL response
+    @param model: record type, e.g. `Post`
+    @param kind: key the connection is stored under, e.g. "posts". None for the first connection found
+    @param fields: fields to keep
+    @return: list of records
+    """
+    conn = find_connection(data.get('data', data), kind) or {}
+    return [model.parse(e.get('node', e), fields) for e in conn.get('edges') or []]
@@ -0,0 +1,176 @@
+import asyncio
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from httpx import AsyncClient, Client, Response, TransportError, URL
+
+from .scraper import AsyncScraper, Scraper
+from .util import RED, RESET
+
+
+class _Pool:
+    """
+    Scheduling shared by the sync and async pools.
+
+    Each request goes to the member with the most remaining rate budget for the host, minus its
+    requests in flight. Ties are broken round-robin.
+    """
+
+    def _init_pool(self, members: list):
+        self.members = list(members)
+        self.dropped = []
+        self._inflight = {m: 0 for m in self.members}
+        self._rr = 0
+        self._pool_lock = threading.Lock()
+
+    def _score(self, member, host: str) -> float:
+        remaining = member.limiter.bucket(host).remaining if member.limiter else None
+        return (math.inf if remaining is None else remaining) - self._inflight[member]
+
+    def _acquire(self, host: str):
+        with self._pool_lock:
+            if not (n := len(self.members)):
+                raise RuntimeError('no live sessions left in the pool')
+            order = [self.members[(self._rr + k) % n] for k in range(n)]
+            member = max(order, key=lambda m: self._score(m, host))
+            self._rr = (self.members.index(member) + 1) % n
+            self._inflight[member] += 1
+            return member
+
+    def _release(self, member):
+        with self._pool_lock:
+            if member in self._inflight:
+                self._inflight[member] -= 1
+
+    def _drop(self, member, reason: str):
+        self.logger.error(f'[{RED}error{RESET}] dropping session {member._identity} from pool: {reason}')
+        with self._pool_lock:
+            if member in self.members:
+                self.members.remove(member)
+                self._inflight.pop(member, None)
+                self.dropped.append(member)
+
+    @property
+    def _cache_scope(self) -> str:
+        # responses may come from any member, so they are only shared with pools of the same sessions
+        return ','.join(sorted({m._cache_scope for m in self.members + self.dropped}))
+
+    def rate_limits(self) -> dict:
+        """
+        @return: rate limiter state of every member, keyed by identity
+        """
+        return {m._identity: m.rate_limits() for m in self.members}
+
+
+class ScraperPool(_Pool, Scraper):
+    """
+    Pool of guest and logged-in sessions with the same method surface as `Scraper`.
+
+    Aggregate throughput scales with the number of sessions, since each one has its own rate budget.
+    Sessions that expire are re-bootstrapped, and sessions that cannot be recovered are dropped.
+    """
+
+    def __init__(self, accounts: list[tuple[str, str]] = (), guests: int = 0, scrapers: list[Scraper] = (),
+                 **kwargs):
+        """
+        @param accounts: (username, password) pairs to log in with
+        @param guests: number of guest sessions
+        @param scrapers: already initialised scrapers to include
+        @param kwargs: keyword arguments passed to every member, see `Scraper`
+        """
+        # members pace themselves, the cache sits in front of the whole pool
+        self._configure(**kwargs | {'rate_limit': False})
+        self._credentials = None, None, None
+        self.session = None
+        # members record into the pool's metrics
+        kwargs = {k: v for k, v in kwargs.items() if k != 'cache'} | {'metrics': self.metrics}
+        factories = [lambda u=u, p=p: Scraper(u, p, identity=u, **kwargs) for u, p in accounts]
+        factories += [lambda i=i: Scraper(guest=True, identity=f'guest-{i}', **kwargs) for i in range(guests)]
+        with ThreadPoolExecutor(max_workers=max(len(factories), 1)) as pool:
+            # bootstrap concurrently
+            members = list(scrapers) + list(pool.map(lambda f: f(), factories))
+        self._init_pool(members)
+
+    def _fetch(self, method: str, url: str, **kwargs) -> Response:
+        member = self._acquire(URL(url).host)
+        try:
+            r = member._fetch(method, url, **kwargs)
+        except TransportError:
+            raise
+        except Exception as e:
+            # the member failed to re-bootstrap its session
+            self._retire(member, e)
+            raise
+        finally:
+            self._release(member)
+        if r.status_code == 401:
+            self._drop(member, 'unauthorized after refresh')
+        return r
+
+    def _retire(self, member: Scraper, e: Exception):
+        try:
+            if not member._refreshable:
+                raise e
+            member.refresh()
+        except Exception as e:
+            self._drop(member, f'{type(e).__name__}: {e}')
+
+    def refresh(self, stale: Client = None):
+        for m in list(self.members):
+            self._retire(m, RuntimeError('refresh requested'))
+
+
+class AsyncScraperPool(_Pool, AsyncScraper):
+    """
+    Asynchronous `ScraperPool`, members are `AsyncScraper`s bootstrapped concurrently on start.
+    """
+
+    def __init__(self, accounts: list[tuple[str, str]] = (), guests: int = 0, scrapers: list[AsyncScraper] = (),
+                 **kwargs):
+        self._configure(**kwargs | {'rate_limit': False})
+        self._credentials = None, None, None
+        self.session = None
+        self._lock = asyncio.Lock()
+        # members record into the pool's metrics
+        kwargs = {k: v for k, v in kwargs.items() if k != 'cache'} | {'metrics': self.metrics}
+        members = list(scrapers)
+        members += [AsyncScraper(u, p, identity=u, **kwargs) for u, p in accounts]
+        members += [AsyncScraper(guest=True, identity=f'guest-{i}', **kwargs) for i in range(guests)]
+        self._init_pool(members)
+
+    async def start(self):
+        res = await asyncio.gather(*(m.start() for m in self.members), return_exceptions=True)
+        for m, r in zip(list(self.members), res):
+            if isinstance(r, Exception):
+                self._drop(m, f'{type(r).__name__}: {r}')
+        return self
+
+    async def aclose(self):
+        await asyncio.gather(*(m.aclose() for m in self.members + self.dropped))
+
+    async def _fetch(self, method: str, url: str, **kwargs) -> Response:
+        member = self._acquire(URL(url).host)
+        try:
+            r = await member._fetch(method, url, **kwargs)
+        except TransportError:
+            raise
+        except Exception as e:
+            await self._retire(member, e)
+            raise
+        finally:
+            self._release(member)
+        if r.status_code == 401:
+            self._drop(member, 'unauthorized after refresh')
+        return r
+
+    async def _retire(self, member: AsyncScraper, e: Exception):
+        try:
+            if not member._refreshable:
+                raise e
+            await member.refresh()
+        except Exception as e:
+            self._drop(member, f'{type(e).__name__}: {e}')
+
+    async def refresh(self, stale: AsyncClient = None):
+        await asyncio.gather(*(self._retire(m, RuntimeError('refresh requested')) for m in list(self.members)))
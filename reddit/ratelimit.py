@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import time
+
+from httpx import Response
+
+from .util import get_rate_limits
+
+
+class Bucket:
+    """
+    Leaky bucket for one rate limit window, fed by Reddit's `x-ratelimit-*` headers.
+
+    The remaining budget (minus a safety margin) is spread evenly over the time left in the
+    window, so requests are paced rather than sent in a burst that gets throttled.
+    """
+    __slots__ = ('limit', 'remaining', 'used', 'reset_at', 'window', 'next_at', 'margin',
+                 'requests', 'waits', 'waited', 'throttled')
+
+    def __init__(self, margin: float = .1):
+        self.limit = None
+        self.remaining = None
+        self.used = None
+        self.reset_at = None
+        self.window = None  # longest reset interval seen, used to project the next window
+        self.next_at = 0.
+        self.margin = margin
+        self.requests = 0
+        self.waits = 0
+        self.waited = 0.
+        self.throttled = 0
+
+    def reserve(self, now: float) -> float:
+        """
+        Reserve a slot for one request.
+
+        @param now: current monotonic time
+        @return: seconds to wait before sending the request
+        """
+        self.requests += 1
+        if self.reset_at is None:
+            # budget unknown until the first response arrives
+            return 0.
+        if now >= self.reset_at:
+            self._reset(now)
+        if self.remaining is not None and self.remaining - self.margin * (self.limit or 0) < 1:
+            # budget exhausted, queue up in the next window, which opens at the reset
+            self._reset(self.reset_at)
+
+        start = max(now, self.next_at)
+        if self.remaining is None:
+            # size of the window unknown until a response arrives, send one request per second
+            self.next_at = start + 1
+        else:
+            budget = max(self.remaining - self.margin * (self.limit or 0), 1)
+            self.next_at = start + max(self.reset_at - start, 0.) / budget
+            self.remaining -= 1
+
+        delay = max(start - now, 0.)
+        if delay:
+            self.waits += 1
+            self.waited += delay
+        return delay
+
+    def update(self, r: Response, now: float):
+        """
+        Update the bucket from the rate limit headers of a response.
+
+        @param r: response object
+        @param now: current monotonic time
+        """
+        if r.status_code == 429:
+            self.throttled += 1
+            self.remaining = 0.
+        limits = get_rate_limits(r)
+        try:
+            if 'x-ratelimit-remaining' in limits:
+                self.remaining = float(limits['x-ratelimit-remaining'])
+            if 'x-ratelimit-used' in limits:
+                self.used = int(float(limits['x-ratelimit-used']))
+            if 'x-ratelimit-reset' in limits:
+                reset = float(limits['x-ratelimit-reset'])
+                self.reset_at = now + reset
+                self.window = max(self.window or 0, reset)
+        except ValueError:
+            return
+        if self.remaining is not None and self.used is not None:
+            self.limit = max(self.limit or 0, self.remaining + self.used)
+        if self.remaining is not None and self.reset_at is None:
+            # throttled without a reset hint, back off briefly
+            self.reset_at = now + 1
+            self.window = self.window or 1
+
+    def _reset(self, start: float):
+        """
+        Start the next window at `start`, with the full budget if the limit is known.
+        """
+        self.remaining = self.limit
+        self.used = 0 if self.limit else None
+        self.reset_at = start + self.window
+        self.next_at = start
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            'limit': self.limit,
+            'remaining': self.remaining,
+            'used': self.used,
+            'reset_in': None if self.reset_at is None else max(self.reset_at - now, 0.),
+            'requests': self.requests,
+            'waits': self.waits,
+            'waited': self.waited,
+            'throttled': self.throttled,
+        }
+
+
+class RateLimiter:
+    """
+    Paces sync and async requests per bucket (one bucket per host) so throughput
+    stays just under the budget reported by the server.
+    """
+
+    def __init__(self, margin: float = .1):
+        """
+        @param margin: fraction of the window's budget to keep in reserve
+        """
+        self.margin = margin
+        self.buckets: dict[str, Bucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, key: str) -> Bucket:
+        if (b := self.buckets.get(key)) is None:
+            b = self.buckets.setdefault(key, Bucket(self.margin))
+        return b
+
+    def _reserve(self, key: str) -> float:
+        with self._lock:
+            return self.bucket(key).reserve(time.monotonic())
+
+    def acquire(self, key: str):
+        """
+        Block until a request against `key` may be sent.
+
+        @param key: bucket key
+        """
+        if delay := self._reserve(key):
+            time.sleep(delay)
+
+    async def aacquire(self, key: str):
+        """
+        Wait until a request against `key` may be sent.
+
+        @param key: bucket key
+        """
+        if delay := self._reserve(key):
+            await asyncio.sleep(delay)
+
+    def update(self, key: str, r: Response):
+        with self._lock:
+            self.bucket(key).update(r, time.monotonic())
+
+    def stats(self) -> dict:
+        """
+        @return: per-bucket stats
+        """
+        with self._lock:
+            return {k: b.stats() for k, b in self.buckets.items()}
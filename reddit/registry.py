@@ -0,0 +1,179 @@
+import threading
+from pathlib import Path
+from types import MappingProxyType
+from typing import Callable, Iterator, NamedTuple
+
+import orjson
+
+from .constants import Operation
+
+PATH = Path(__file__).parent / 'operations.json'
+
+
+class OperationInfo(NamedTuple):
+    name: str
+    id: str
+    type: str  # 'query', 'mutation' or 'subscription'
+
+
+class Subscription:
+    """
+    Handle returned by `Registry.watch`, `cancel` unsubscribes only this watcher.
+    """
+    __slots__ = ('registry', 'interval', 'callback')
+
+    def __init__(self, registry: 'Registry', interval: float, callback: Callable[[dict[str, list[str]]], None]):
+        self.registry = registry
+        self.interval = interval
+        self.callback = callback
+
+    def cancel(self):
+        self.registry._unsubscribe(self)
+
+
+class Registry:
+    """
+    Operation registry generated by `scripts/codegen.py`, loaded on first use.
+
+    `reload` diffs the file against the loaded registry and applies the changes to `Operation`, so
+    scrapers pick up new operation hashes on their next request. `watch` does that periodically,
+    for long-lived processes that should survive a Reddit deploy without a restart. Every watcher
+    shares one thread, which runs while any of them is subscribed.
+    """
+
+    def __init__(self, path: Path | str = PATH):
+        """
+        @param path: registry file written by `scripts/codegen.py`
+        """
+        self.path = Path(path)
+        self._ops = None
+        self._by_id = None
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._stop = None
+        self._subscribers = []
+
+    def _read(self) -> dict[str, OperationInfo]:
+        data = orjson.loads(self.path.read_bytes())['operations']
+        # entries of older registries also carry an (always empty) variables list
+        return {k: OperationInfo(k, i, t) for k, (i, t, *_) in data.items()}
+
+    def _set(self, ops: dict[str, OperationInfo], mtime: int):
+        self._ops = MappingProxyType(ops)
+        self._by_id = MappingProxyType({o.id: o for o in ops.values()})
+        self._mtime = mtime
+
+    @property
+    def operations(self) -> MappingProxyType:
+        """
+        @return: read-only mapping of operation name to `OperationInfo`
+        """
+        if self._ops is None:
+            with self._lock:
+                if self._ops is None:
+                    mtime = self.path.stat().st_mtime_ns
+                    self._set(self._read(), mtime)
+        return self._ops
+
+    def __getitem__(self, name: str) -> OperationInfo:
+        return self.operations[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.operations
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.operations)
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def get(self, name: str, default: OperationInfo = None) -> OperationInfo | None:
+        return self.operations.get(name, default)
+
+    def by_id(self, op_id: str) -> OperationInfo | None:
+        """
+        @param op_id: operation hash
+        @return: the operation with this hash, or None if unknown
+        """
+        self.operations
+        return self._by_id.get(op_id)
+
+    def reload(self, force: bool = False) -> dict[str, list[str]] | None:
+        """
+        Reload the registry if the file changed, and apply the changes to `Operation`.
+
+        Removed operations keep their last hash on `Operation`, so code still referring to them fails
+        at the server instead of with an AttributeError.
+
+        @param force: reload even if the file's mtime is unchanged
+        @return: names of the 'added', 'removed' and 'changed' operations, or None if the file is unchanged
+        """
+        with self._lock:
+            mtime = self.path.stat().st_mtime_ns
+            if not force and mtime == self._mtime:
+                return
+            new, old = self._read(), dict(self._ops or {})
+            diff = {
+                'added': sorted(new.keys() - old.keys()),
+                'removed': sorted(old.keys() - new.keys()),
+                'changed': sorted(k for k in new.keys() & old.keys() if new[k] != old[k]),
+            }
+            for k in diff['added'] + diff['changed']:
+                setattr(Operation, k, new[k].id)
+            if diff['added'] or diff['changed']:
+                # invalidates caches derived from `Operation`, e.g. the reverse map in `metrics.operation`
+                Operation._version = getattr(Operation, '_version', 0) + 1
+            self._set(new, mtime)
+            return diff
+
+    def watch(self, interval: float = 60, callback: Callable[[dict[str, list[str]]], None] = None) -> Subscription:
+        """
+        Check the file for changes on a daemon thread shared by all watchers, until every watcher is cancelled.
+
+        The thread checks at the shortest interval of its watchers, a shorter one takes effect after the
+        check in progress.
+
+        @param interval: seconds between checks
+        @param callback: called with the diff after each reload that changed the registry
+        @return: handle to unsubscribe this watcher
+        """
+        self.operations
+        sub = Subscription(self, interval, callback)
+        with self._lock:
+            self._subscribers.append(sub)
+            if self._stop is None:
+                self._stop = threading.Event()
+                threading.Thread(target=self._run, args=(self._stop,), name='operation-registry', daemon=True).start()
+        return sub
+
+    def _run(self, stop: threading.Event):
+        while not stop.wait(min((s.interval for s in list(self._subscribers)), default=60)):
+            try:
+                diff = self.reload()
+            except (OSError, ValueError, KeyError):
+                # missing or partially written file, try again on the next check
+                continue
+            if diff and any(diff.values()):
+                for sub in list(self._subscribers):
+                    if sub.callback: sub.callback(diff)
+
+    def _unsubscribe(self, sub: Subscription):
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+            if not self._subscribers and self._stop is not None:
+                self._stop.set()
+                self._stop = None
+
+    def stop(self):
+        """
+        Cancel every watcher and stop the thread.
+        """
+        with self._lock:
+            self._subscribers.clear()
+            if self._stop is not None:
+                self._stop.set()
+                self._stop = None
+
+
+registry = Registry()
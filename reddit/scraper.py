@@ -1,42 +1,90 @@
+from __future__ import annotations
+
 import asyncio
-import logging.config
-import platform
+import logging
+import threading
+import time
+import weakref
+from contextlib import aclosing, asynccontextmanager, contextmanager
+from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Iterator
 from urllib.parse import urlencode
 
-import websockets
-from httpx import Client, Limits, AsyncClient
-from selectolax.lexbor import LexborHTMLParser
-from tqdm.asyncio import tqdm_asyncio
+from httpx import Client, Limits, AsyncClient, Response, URL
 
+from . import loop
 from .constants import *
+from .ratelimit import RateLimiter
 from .util import *
 
-try:
-    if get_ipython().__class__.__name__ == 'ZMQInteractiveShell':
-        import nest_asyncio
-
-        nest_asyncio.apply()
-except:
-    ...
-
-if platform.system() != 'Windows':
-    try:
-        import uvloop
-
-        uvloop.install()
-    except ImportError as e:
-        ...
+# optional features are imported on first use, see `benchmarks/bench_import.py` for the import time budget
+if TYPE_CHECKING:
+    from .models import Comment
+    from .sink import AsyncSink, Sink
 
 
 class Scraper:
     def __init__(self, username: str = None, password: str = None, session: Client = None, **kwargs):
-        self.guest = False
+        self._configure(**kwargs)
+        self._credentials = username, password, session
+        self._refresh_lock = threading.Lock()
+        self.session = self._restore() or self._bootstrap()
+
+    def _configure(self, **kwargs):
+        # pass guest=True for a guest session, the same as passing a session without login cookies
+        self.guest = kwargs.get('guest', False)
         self.logger = self._init_logger(kwargs.get('log_config', False))
-        self.session = self._init_session(username, password, session, **kwargs)
         self.debug = kwargs.get('debug', 0)
         self.out_path = Path('data')
         self.gql = 'https://gql.reddit.com'
         self.api = 'https://www.reddit.com/api'
+        # paces requests from the x-ratelimit-* headers, pass rate_limit=False to disable
+        self.limiter = RateLimiter(kwargs.get('rate_limit_margin', .1)) if kwargs.get('rate_limit', True) else None
+        # opt-in GraphQL response cache, pass cache=True or a configured `Cache`
+        if (cache := kwargs.get('cache')) is True:
+            from .cache import Cache
+
+            cache = Cache(self.out_path / 'cache.sqlite')
+        self.cache = cache or None
+        # opt-in session persistence, pass token_store=True or a configured `TokenStore`
+        if (store := kwargs.get('token_store')) is True:
+            from .tokens import TokenStore
+
+            store = TokenStore(self.out_path / 'tokens.json')
+        self.token_store = store or None
+        self.expires = None
+        # seconds before expiry at which the bearer token is refreshed, as `TokenStore` treats entries as stale
+        self.refresh_skew = kwargs.get('refresh_skew', 60)
+        # key the session is persisted under, defaults to the username or "guest"
+        self.identity = kwargs.get('identity')
+        # requests in flight per session, sessions replaced by a refresh are closed once their count drops to 0
+        self._session_uses = {}
+        self._stale_sessions = set()
+        self._session_lock = threading.Lock()
+        # whether the GraphQL endpoint accepts array-batched bodies, None until probed
+        self._batching = None
+        # post_id -> `live.SocketStats`, for the sockets of the last live comment stream
+        self.live_stats = {}
+        # feed -> `watch.FeedState`, for the feeds of the last watch
+        self.watch_stats = {}
+        # post_id -> error, for posts that could not be fetched by the last posts()/iter_posts() run
+        self.failures = {}
+        # opt-in request metrics, pass metrics=True or a configured `Metrics`
+        if (metrics := kwargs.get('metrics')) is True:
+            from .metrics import Metrics
+
+            metrics = Metrics()
+        self.metrics = metrics or None
+        # opt-in hot reload of operation hashes, pass reload_operations=<seconds between checks of the registry>
+        if interval := kwargs.get('reload_operations'):
+            from .registry import registry
+
+            logger = self.logger
+            sub = registry.watch(interval, lambda diff: logger.info(f'reloaded operations: {diff}'))
+            # the callback holds no reference to the scraper, so it unsubscribes when the scraper is collected
+            weakref.finalize(self, sub.cancel)
 
     def _init_session(self, *args, **kwargs) -> Client:
         """
@@ -49,34 +97,21 @@ class Scraper:
         if session and all(session.cookies.get(c) for c in {'USER', 'csrf_token'}):
             # authenticated session provided
             return session
-        if not session:
+        if not session and not self.guest:
             # no session provided, log-in to authenticate
             return self.login(username, password)
 
         self.guest = True
         # create guest session
-        client = Client(
-            follow_redirects=True,
-            headers={
-                'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36'
-            },
-        )
+        client = self._client()
         # generate bearer token
         r = client.get('https://www.reddit.com')
-        data = extract_json(LexborHTMLParser(r.text).css_first('script#data').text())
-        bearer_token = data['user']['session']['accessToken']
+        bearer_token, self.expires = self._parse_session(r.content)
         # generate csrf token
         r = client.get('https://www.reddit.com/account/sso/one_tap/')
-        csrf = (LexborHTMLParser(r.text).css_first('input[name=csrf_token]').attributes['value'])
+        csrf = self._parse_csrf(r.content)
         client.cookies.set('csrf_token', csrf)
-        client.headers.update({
-            'authority': 'gql.reddit.com',
-            'authorization': f'Bearer {bearer_token}',
-            'accept-language': 'en-GB,en;q=0.9',
-            'x-reddit-compression': '1',
-            'x-reddit-loid': client.cookies.get('loid', ''),
-            'x-reddit-session': client.cookies.get('session', ''),
-        })
+        client.headers.update(self._guest_headers(client, bearer_token))
         return client
 
     def login(self, username: str, password: str) -> Client:
@@ -87,40 +122,22 @@ class Scraper:
         @param password: Reddit password
         @return: authenticated session object
         """
-        client = Client(
-            follow_redirects=True,
-            headers={
-                'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/113.0.0.0 Safari/537.36'
-            },
-        )
+        client = self._client()
         # generate csrf token
         r = client.get('https://www.reddit.com/account/sso/one_tap/')
-        csrf = (LexborHTMLParser(r.text).css_first('input[name=csrf_token]').attributes['value'])
+        csrf = self._parse_csrf(r.content)
         # important: issues with cookies.update(), have to do this crap
         client.cookies.delete('USER')
         client.cookies.delete('csrf_token')
         client.cookies.set('csrf_token', csrf)
         client.cookies = dict(client.cookies) | {'csrf_token': csrf, 'USER': ''}
-        data = {
-            'csrf_token': csrf,
-            'otp': '',
-            'password': password,
-            'dest': 'https://www.reddit.com',
-            'username': username,
-        }
-        client.post('https://www.reddit.com/login', data=urlencode(data))
+        client.post('https://www.reddit.com/login', data=urlencode(self._login_form(username, password, csrf)))
         r = client.get('https://www.reddit.com')
-        data = extract_json(LexborHTMLParser(r.text).css_first('script#data').text())
-        token = data['user']['session']['accessToken']
+        token, self.expires = self._parse_session(r.content)
         # important: issues with headers.update(), have to do this crap
         client.cookies.delete('loid')
         client.cookies.delete('session')
-        client.headers = dict(client.headers) | {
-            'authorization': f'Bearer {token}',
-            'x-reddit-compression': '1',
-            'x-reddit-loid': client.cookies.get('loid', ''),
-            'x-reddit-session': client.cookies.get('session', ''),
-        }
+        client.headers = dict(client.headers) | self._auth_headers(client, token)
         return client
 
     def comment(self, post_id: str, text: str):
@@ -145,9 +162,7 @@ class Scraper:
             "thing_id": f"t3_{post_id}",
             "richtext_json": '{"document":[{"e":"par","c":[{"e":"text","t":"' + text + '"}]}]}',
         }
-        r = self.session.post("https://oauth.reddit.com/api/comment.json", params=params, data=urlencode(data))
-        if self.debug: log(self.logger, self.debug, r)
-        return r.json()
+        return self._json('POST', "https://oauth.reddit.com/api/comment.json", params=params, data=urlencode(data))
 
     def search(self, query: str, **kwargs) -> dict:
         """
@@ -179,9 +194,7 @@ class Scraper:
                 **kwargs,
             },
         }
-        r = self.session.post(self.gql, json=json)
-        if self.debug: log(self.logger, self.debug, r)
-        return r.json()
+        return self._gql(json)
 
     def popular(self, region: str = Location.All, sort: str = Sort.Hot, range: str = Range.All, **kwargs) -> dict:
         """
@@ -229,9 +242,7 @@ class Scraper:
                 **_kwargs,
             },
         }
-        r = self.session.post(self.gql, json=json)
-        if self.debug: log(self.logger, self.debug, r)
-        return r.json()
+        return self._gql(json)
 
     def front_page(self, sort: str = Sort.New, **kwargs) -> dict:
         """
@@ -263,9 +274,7 @@ class Scraper:
                 'recentPostIds': [],
             },
         }
-        r = self.session.post(self.gql, json=payload)
-        if self.debug: log(self.logger, self.debug, r)
-        return r.json()
+        return self._gql(payload)
 
     def trending_searches(self) -> dict:
         """
@@ -279,8 +288,7 @@ class Scraper:
             "raw_json": "1",
             "gilding_detail": "1",
         }
-        r = self.session.get(f"{self.api}/trending_searches_v1.json", params=params)
-        return r.json()
+        return self._json('GET', f"{self.api}/trending_searches_v1.json", params=params)
 
     def subreddit(self, name: str) -> dict:
         """
@@ -294,9 +302,22 @@ class Scraper:
             "variables": {"subredditName": name},
         }
         # headers = dict(self.session.headers) | {"content-type": "application/json"}
-        r = self.session.post(self.gql, json=json)
-        if self.debug: log(self.logger, self.debug, r)
-        return r.json()
+        return self._gql(json)
+
+    def subreddit_posts(self, name: str, sort: str = Sort.New, **kwargs) -> dict:
+        """
+        Get a page of a subreddit's posts
+
+        @param name: name of the subreddit.
+        @param sort: sort type. See `Sort` for options.
+        @param kwargs: optional keyword arguments, e.g. `after` for the cursor of the page.
+        @return: dict containing the posts.
+        """
+        json = {
+            'id': Operation.SubredditPosts,
+            'variables': {'subredditName': name, 'sort': sort, **kwargs},
+        }
+        return self._gql(json)
 
     def homepage(self) -> dict:
         """
@@ -304,81 +325,717 @@ class Scraper:
 
         @return: dict containing the homepage data.
         """
-        r = self.session.get("https://www.reddit.com/")
-        if self.debug: log(self.logger, self.debug, r)
-        script = LexborHTMLParser(r.text).css_first("script#data")
-        return extract_json(script.text())
+        return self._page("https://www.reddit.com/")
+
+    def batch(self, operations: list[dict | tuple], size: int = 25, concurrency: int = 16) -> list[dict]:
+        """
+        Execute many GraphQL operations in as few round trips as possible.
+
+        Operations are sent as array-batched bodies of up to `size` operations when the server accepts them,
+        otherwise one request per operation over the shared pool. Cached operations are not sent at all.
+
+        @param operations: list of `{'id': Operation.X, 'variables': {...}}` dicts or `(Operation.X, variables)` tuples.
+        @param size: maximum number of operations per request.
+        @param concurrency: maximum number of requests in flight.
+        @return: list of responses in the same order as `operations`. Failed items contain an `errors` list.
+        """
+        ops, results, todo = self._batch_plan(operations)
+        if self._batching is None and len(todo) > 1:
+            # probe whether the server accepts array bodies
+            chunk, todo = todo[:size], todo[size:]
+            self._batch_fill(results, chunk, self._gql_batch([ops[i] for i in chunk]))
+        chunks = self._batch_chunks(todo, size)
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for chunk, res in zip(chunks, pool.map(lambda c: self._gql_batch([ops[i] for i in c]), chunks)):
+                self._batch_fill(results, chunk, res)
+        return results
+
+    def iter_search(self, query: str, kind: str = 'posts', limit: int = None, pages: int = None,
+                    model: type = None, fields: set[str] = None, sink: Sink | bool = None,
+                    **kwargs) -> Iterator[dict]:
+        """
+        Lazily iterate over search results, following the `pageInfo` cursors automatically.
+
+        @param query: the search term.
+        @param kind: result type to page through: 'posts', 'communities', 'authors' or 'comments'.
+        @param limit: maximum number of items to yield.
+        @param pages: maximum number of pages to fetch.
+        @param model: optional record type to parse nodes into, e.g. `models.Post`.
+        @param fields: fields to keep when parsing into `model`, None for all.
+        @param sink: sink to also write each item to, True for gzipped NDJSON under `out_path / "search"`.
+        @param kwargs: optional search parameters, see `search`.
+        @return: iterator over result nodes.
+        """
+        kwargs.setdefault(f'include{kind.capitalize()}', True)
+        return self._paginate(lambda after: self.search(query, **kwargs, **{f'{kind}After': after}),
+                              kind, limit, pages, model, fields, sink, 'search')
+
+    def iter_popular(self, region: str = Location.All, sort: str = Sort.Hot, range: str = Range.All,
+                     limit: int = None, pages: int = None, model: type = None, fields: set[str] = None,
+                     sink: Sink | bool = None, **kwargs) -> Iterator[dict]:
+        """
+        Lazily iterate over popular posts, following the `pageInfo` cursors automatically.
+
+        @param region: location to get popular posts from. See `Location` for options.
+        @param sort: sort type. See `Sort` for options.
+        @param range: time range. See `Range` for options.
+        @param limit: maximum number of items to yield.
+        @param pages: maximum number of pages to fetch.
+        @param model: optional record type to parse elements into, e.g. `models.Post`.
+        @param fields: fields to keep when parsing into `model`, None for all.
+        @param sink: sink to also write each item to, True for gzipped NDJSON under `out_path / "popular"`.
+        @param kwargs: optional keyword arguments, see `popular`.
+        @return: iterator over feed elements.
+        """
+        return self._paginate(lambda after: self.popular(region, sort, range, **kwargs, after=after),
+                              None, limit, pages, model, fields, sink, 'popular')
+
+    def iter_front_page(self, sort: str = Sort.New, limit: int = None, pages: int = None,
+                        model: type = None, fields: set[str] = None, sink: Sink | bool = None,
+                        **kwargs) -> Iterator[dict]:
+        """
+        Lazily iterate over the front page, following the `pageInfo` cursors automatically.
 
-    def posts(self, mapping: dict) -> list[dict]:
+        @param sort: sort type. See `Sort` for options.
+        @param limit: maximum number of items to yield.
+        @param pages: maximum number of pages to fetch.
+        @param model: optional record type to parse elements into, e.g. `models.Post`.
+        @param fields: fields to keep when parsing into `model`, None for all.
+        @param sink: sink to also write each item to, True for gzipped NDJSON under `out_path / "front_page"`.
+        @param kwargs: optional keyword arguments, see `front_page`.
+        @return: iterator over feed elements.
+        """
+        return self._paginate(lambda after: self.front_page(sort, **kwargs, after=after), None, limit, pages,
+                              model, fields, sink, 'front_page')
+
+    def posts(self, mapping: dict, concurrency: int = 100, retries: int = 3, sink: Sink | bool = None) -> list[dict]:
         """
         Get posts from subreddits
 
+        Each post is retried individually with backoff. Posts that still fail are left out of the result
+        and recorded in `self.failures` instead of raising, so one bad page does not discard the rest.
+
         @param mapping: a dict representing a mapping of subreddit names to post ids.
+        @param concurrency: maximum number of posts fetched at once.
+        @param retries: number of retries per post.
+        @param sink: sink to also write each post to, True for gzipped NDJSON under `out_path / "posts"`.
         @return: a list of dicts containing the post data.
         """
+        from tqdm import tqdm
 
-        async def get(session: AsyncClient, post_id: str, url: str):
-            r = await session.get(url)
-            script = LexborHTMLParser(r.text).css_first("script#data")
-            return {post_id: extract_json(script.text())}
+        self.failures = {}
+        urls = list(self._post_urls(mapping))
+        with self._sink(sink, 'posts') as sink, ThreadPoolExecutor(max_workers=concurrency) as pool:
+            res = tqdm(pool.map(lambda x: self._get_post(*x, retries), urls), total=len(urls), desc="Getting posts")
+            return [self._emit(sink, r) for r in res if r is not None]
 
-        async def process():
-            urls = []
-            for k, v in mapping.items():
-                if isinstance(v, list):
-                    urls.extend((vv, f'https://www.reddit.com/r/{k}/comments/{vv}') for vv in v)
-                else:
-                    urls.append((v, f'https://www.reddit.com/r/{k}/comments/{v}'))
+    def iter_posts(self, mapping: dict, concurrency: int = 16, retries: int = 3,
+                   sink: Sink | bool = None) -> Iterator[dict]:
+        """
+        Stream posts from subreddits as they complete.
 
-            limits = Limits(max_connections=100)
-            headers, cookies = self.session.headers, self.session.cookies
-            async with AsyncClient(limits=limits, headers=headers, cookies=cookies, timeout=20,
-                                   follow_redirects=True) as c:
-                return await tqdm_asyncio.gather(*(get(c, _id, url) for _id, url in urls), desc="Getting posts")
+        At most `concurrency` posts are in flight, and new ones are only started as results are consumed,
+        so memory stays constant regardless of the number of posts. Failed posts are retried individually.
 
-        return asyncio.run(process())
+        @param mapping: a dict representing a mapping of subreddit names to post ids.
+        @param concurrency: maximum number of posts fetched at once.
+        @param retries: number of retries per post.
+        @param sink: sink to also write each post to, True for gzipped NDJSON under `out_path / "posts"`.
+        @return: iterator over `{post_id: data}` dicts, in completion order.
+        """
+        self.failures = {}
+        urls = self._post_urls(mapping)
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+        pending = set()
+        try:
+            with self._sink(sink, 'posts') as sink:
+                while True:
+                    for post_id, url in islice(urls, concurrency - len(pending)):
+                        pending.add(pool.submit(self._get_post, post_id, url, retries))
+                    if not pending:
+                        return
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        if (res := f.result()) is not None:
+                            yield self._emit(sink, res)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
 
-    def live_comments(self, mapping: dict):
+    def comment_tree(self, post_id: str, subreddit: str = None, expand: bool = True, concurrency: int = 8,
+                     fields: set[str] = None) -> Iterator[Comment]:
         """
-        Log live comments from subreddits
+        Stream the full comment tree of a post as flat, parent-linked records.
+
+        Comments embedded in the post page are yielded first, then collapsed "more comments" subtrees
+        are expanded concurrently through the morechildren endpoint and yielded as they resolve.
+
+        @param post_id: the post id.
+        @param subreddit: the subreddit of the post, optional.
+        @param expand: whether to load collapsed subtrees.
+        @param concurrency: maximum number of morechildren requests in flight.
+        @param fields: fields to keep per comment, None for all.
+        @return: iterator over `Comment` records, each comment is yielded once.
+        """
+        seen, requested = set(), set()
+        comments, todo = self._tree_page(self._page(self._post_url(post_id, subreddit)), fields)
+        yield from self._unseen(comments, seen)
+        if not expand:
+            return
+        link_id = f't3_{post_id}'
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+        pending = set()
+        try:
+            while todo or pending:
+                while todo and len(pending) < concurrency:
+                    if ids := self._take(todo, seen, requested):
+                        pending.add(pool.submit(self._more_children, link_id, ids, fields))
+                if not pending:
+                    continue
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    comments, more = f.result()
+                    todo.extend(more)
+                    yield from self._unseen(comments, seen)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def live_comments(self, mapping: dict, callback: Callable[[dict], None] = None, sink: Sink | bool = None,
+                      **kwargs):
+        """
+        Follow live comments from posts. Runs until interrupted.
 
         @param mapping: a dict representing a mapping of subreddit names to post ids.
+        @param callback: called with each comment record, defaults to printing it unless a sink is given.
+        @param sink: sink to write each comment to, True for gzipped NDJSON under `out_path / "live"`.
+            Writes happen on a background thread, see `sink.AsyncSink`.
+        @param kwargs: optional stream parameters, see `live.stream`.
         @return None
         """
 
-        async def listener(uri: str):
-            async with websockets.connect(uri) as ws:
-                while True:
-                    msg = await ws.recv()
-                    try:
-                        data = orjson.loads(msg)
-                        payload = data.get("payload", {})
-                        author_id = payload.get("author_id")
-                        # subreddit = payload.get("subreddit")
-                        author = payload.get("author")
-                        context = payload.get("context")
-                        full_date = payload.get("full_date")
-                        body = payload.get("body") or " ".join(find_key(payload, "t"))
-                        link = f"https://reddit.com{context}"
-
-                        print(f"{full_date}\n{GREEN}{author}{RESET}({author_id})\n{body}\n{link}\n")
-
-                    except Exception as e:
-                        print(e)
-
-        async def process(posts: list[dict]):
-            ws_uris = []
-            for post in posts:
-                k, v = tuple(post.items())[0]
-                if uri := v['posts']['models'].get(f't3_{k}', {}).get('liveCommentsWebsocket'):
-                    ws_uris.append(uri)
-            await asyncio.gather(*(listener(uri) for uri in ws_uris))
+        from . import live
+
+        async def process(sockets: list[tuple[str, str]]):
+            async with self._asink(sink, 'live') as out:
+                async for comment in live.stream(sockets, self.live_stats, **kwargs):
+                    if out: await out.awrite(comment)
+                    if callback or not out: (callback or self._print_comment)(comment)
 
         posts = self.posts(mapping)
-        return asyncio.run(process(posts))
+        return loop.run(process(self._ws_uris(posts)))
+
+    @staticmethod
+    def _print_comment(c: dict):
+        print(f"{c['full_date']}\n{GREEN}{c['author']}{RESET}({c['author_id']})\n{c['body']}\n{c['link']}\n")
+
+    @contextmanager
+    def _sink(self, sink: Sink | AsyncSink | bool | None, name: str):
+        """
+        Resolve the `sink` argument of a streaming method.
+
+        True creates a gzipped NDJSON sink under `out_path / name`, which is closed when the method finishes.
+        Sinks passed in are only flushed, they stay open for the caller to reuse.
+        """
+        sink, owned = self._open_sink(sink, name)
+        try:
+            yield sink
+        finally:
+            if owned:
+                sink.close()
+            elif sink:
+                sink.flush()
+
+    @asynccontextmanager
+    async def _asink(self, sink: Sink | AsyncSink | bool | None, name: str):
+        """
+        `_sink` for async methods. A created sink runs on a background thread, and flushing or closing
+        waits for it off the event loop.
+        """
+        sink, owned = self._open_sink(sink, name, threaded=True)
+        try:
+            yield sink
+        finally:
+            if owned:
+                await sink.aclose()
+            elif sink:
+                await sink.aflush()
+
+    def _open_sink(self, sink: Sink | AsyncSink | bool | None, name: str,
+                   threaded: bool = False) -> tuple[Sink | AsyncSink | None, bool]:
+        """
+        @param threaded: whether to run a created sink on a background thread
+        @return: the sink to write to, and whether it was created here and must be closed
+        """
+        if sink is not True:
+            return sink or None, False
+        from .sink import AsyncSink, NDJSONSink
+
+        sink = NDJSONSink(self.out_path / name)
+        return AsyncSink(sink) if threaded else sink, True
+
+    @staticmethod
+    def _emit(sink: Sink | AsyncSink | None, record: any) -> any:
+        if sink: sink.write(record)
+        return record
+
+    @staticmethod
+    def _post_url(post_id: str, subreddit: str = None) -> str:
+        if subreddit:
+            return f'https://www.reddit.com/r/{subreddit}/comments/{post_id}'
+        return f'https://www.reddit.com/comments/{post_id}'
+
+    @staticmethod
+    def _unseen(comments: list[Comment], seen: set) -> Iterator[Comment]:
+        for c in comments:
+            if c.id not in seen:
+                seen.add(c.id)
+                yield c
+
+    @staticmethod
+    def _more_ids(children: list[str]) -> list[str]:
+        return [c if c.startswith('t1_') else f't1_{c}' for c in children if c and c != '_']
+
+    @staticmethod
+    def _take(todo: list[str], seen: set, requested: set, size: int = 100) -> list[str]:
+        """
+        Pop up to `size` collapsed comment ids that have not been loaded or requested yet.
+        """
+        ids = []
+        while todo and len(ids) < size:
+            if (i := todo.pop()) not in seen and i not in requested:
+                requested.add(i)
+                ids.append(i)
+        return ids
+
+    @classmethod
+    def _tree_page(cls, data: dict, fields: set[str] = None) -> tuple[list[Comment], list[str]]:
+        """
+        @return: comments embedded in a post page, and the ids of collapsed comments
+        """
+        from .models import Comment, parse_page
+
+        _, comments = parse_page(data, {Comment: fields | {'id'} if fields else None})
+        todo = []
+        for m in ((data.get('moreComments') or {}).get('models') or {}).values():
+            todo.extend(cls._more_ids(m.get('children') or []))
+        return comments, todo
+
+    @classmethod
+    def _tree_more(cls, res: dict, fields: set[str] = None) -> tuple[list[Comment], list[str]]:
+        """
+        @return: comments in a morechildren response, and the ids of collapsed comments still to load
+        """
+        from .models import Comment
+
+        comments, todo = [], []
+        for thing in ((res.get('json') or {}).get('data') or {}).get('things') or []:
+            data = thing.get('data') or {}
+            if thing.get('kind') == 't1':
+                comments.append(Comment.parse(data | {'id': data.get('name')}, fields | {'id'} if fields else None))
+            elif thing.get('kind') == 'more':
+                todo.extend(cls._more_ids(data.get('children') or []))
+        return comments, todo
+
+    @staticmethod
+    def _more_params(link_id: str, ids: list[str]) -> dict:
+        return {
+            'api_type': 'json',
+            'link_id': link_id,
+            'children': ','.join(i.removeprefix('t1_') for i in ids),
+            'raw_json': '1',
+        }
+
+    def _more_children(self, link_id: str, ids: list[str], fields: set[str] = None,
+                       retries: int = 3) -> tuple[list[Comment], list[str]]:
+        for attempt in range(retries + 1):
+            try:
+                r = self._fetch('GET', 'https://oauth.reddit.com/api/morechildren.json',
+                                params=self._more_params(link_id, ids))
+                r.raise_for_status()
+                return self._timed(r, lambda: self._tree_more(decode(r), fields))
+            except Exception as e:
+                if attempt == retries or not retryable(e):
+                    self.logger.error(f'[{RED}error{RESET}] failed to expand {len(ids)} comments of {link_id}: {e}')
+                    return [], []
+                if self.metrics: self.metrics.on_retry('morechildren', e)
+                time.sleep(backoff(attempt, getattr(e, 'response', None)))
+
+    @staticmethod
+    def _post_urls(mapping: dict) -> Iterator[tuple[str, str]]:
+        for k, v in mapping.items():
+            for post_id in (v if isinstance(v, list) else [v]):
+                yield post_id, f'https://www.reddit.com/r/{k}/comments/{post_id}'
+
+    def _get_post(self, post_id: str, url: str, retries: int) -> dict | None:
+        for attempt in range(retries + 1):
+            try:
+                return {post_id: self._page(url)}
+            except Exception as e:
+                if attempt == retries or not retryable(e):
+                    return self._fail(post_id, e)
+                if self.metrics: self.metrics.on_retry('post', e)
+                time.sleep(backoff(attempt, getattr(e, 'response', None)))
+
+    def _fail(self, post_id: str, e: Exception):
+        msg = str(e).splitlines()[0] if str(e) else ''
+        self.failures[post_id] = f'{type(e).__name__}: {msg}'
+        self.logger.error(f'[{RED}error{RESET}] failed to get post {post_id}: {self.failures[post_id]}')
+
+    @staticmethod
+    def _ws_uris(posts: list[dict]) -> list[tuple[str, str]]:
+        ws_uris = []
+        for post in posts:
+            k, v = tuple(post.items())[0]
+            if uri := v['posts']['models'].get(f't3_{k}', {}).get('liveCommentsWebsocket'):
+                ws_uris.append((k, uri))
+        return ws_uris
+
+    def _paginate(self, fetch: Callable[[str | None], dict], kind: str | None, limit: int | None,
+                  pages: int | None, model: type = None, fields: set[str] = None, sink: Sink | bool = None,
+                  name: str = None) -> Iterator[dict]:
+        """
+        Yield the nodes of a paged connection one at a time, fetching the next page in the
+        background while the current one is being consumed.
+
+        @param fetch: function taking a cursor (None for the first page) and returning the response
+        @param kind: key the connection is stored under, None for the first connection found
+        @param limit: maximum number of items to yield
+        @param pages: maximum number of pages to fetch
+        @param model: optional record type to parse nodes into
+        @param fields: fields to keep when parsing into `model`
+        @param sink: sink to also write each item to
+        @param name: directory under `out_path` for a sink created with sink=True
+        """
+        pool = ThreadPoolExecutor(max_workers=1)
+        future = pool.submit(fetch, None)
+        n = page = 0
+        try:
+            with self._sink(sink, name) as sink:
+                while future:
+                    edges, cursor = self._next_page(future.result(), kind)
+                    page += 1
+                    more = (cursor and edges and (pages is None or page < pages)
+                            and (limit is None or n + len(edges) < limit))
+                    future = pool.submit(fetch, cursor) if more else None
+                    for edge in edges:
+                        if limit is not None and n >= limit:
+                            return
+                        n += 1
+                        node = edge.get('node', edge)
+                        yield self._emit(sink, node if model is None else model.parse(node, fields))
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _next_page(self, data: dict, kind: str | None) -> tuple[list, str | None]:
+        """
+        @return: edges of the page and the cursor of the next page, None if it is the last page
+        """
+        if not (conn := find_connection(data.get('data'), kind)):
+            if data.get('errors'):
+                self.logger.error(f'[{RED}error{RESET}] {data["errors"]}')
+            return [], None
+        info = conn.get('pageInfo') or {}
+        return conn.get('edges') or [], info.get('endCursor') if info.get('hasNextPage') else None
+
+    def _client(self) -> Client:
+        return Client(follow_redirects=True, headers={'user-agent': USER_AGENT})
+
+    @property
+    def _identity(self) -> str:
+        return self.identity or self._credentials[0] or 'guest'
+
+    @property
+    def _cache_scope(self) -> str:
+        # guest responses are the same for every guest, a logged-in session's are only served to that account
+        return 'guest' if self.guest else self._identity
+
+    @property
+    def _refreshable(self) -> bool:
+        # authenticated sessions passed in by the caller cannot be re-bootstrapped
+        username, password, session = self._credentials
+        return session is None or not all(session.cookies.get(c) for c in {'USER', 'csrf_token'})
+
+    def _expired(self) -> bool:
+        return self._refreshable and self.expires is not None and time.time() >= self.expires - self.refresh_skew
+
+    def _restore(self) -> Client | AsyncClient | None:
+        """
+        Reload a persisted session from the token store instead of bootstrapping a new one.
+        """
+        if not self.token_store or not self._refreshable:
+            return
+        if not (entry := self.token_store.load(self._identity)):
+            return
+        self.guest, self.expires = entry['guest'], entry['expires']
+        return self.token_store.restore(entry, self._client())
+
+    def _persist(self, client: Client | AsyncClient) -> Client | AsyncClient:
+        if self.token_store and self._refreshable:
+            self.token_store.save(self._identity, client, self.expires, self.guest)
+        return client
+
+    def _bootstrap(self) -> Client:
+        return self._persist(self._init_session(*self._credentials))
+
+    def refresh(self, stale: Client = None) -> Client:
+        """
+        Re-bootstrap the session, e.g. after the bearer token expired.
+
+        @param stale: the session that was found to be invalid. Skips the refresh if another thread already replaced it.
+        @return: the new session
+        """
+        with self._refresh_lock:
+            if stale is None or self.session is stale:
+                old, self.session = self.session, self._bootstrap()
+                if old is not None and old is not self.session and self._replaced(old): old.close()
+        return self.session
+
+    def _hold(self, session: Client | AsyncClient):
+        with self._session_lock:
+            self._session_uses[session] = self._session_uses.get(session, 0) + 1
+
+    def _unhold(self, session: Client | AsyncClient) -> bool:
+        """
+        @return: whether the session was replaced and this was its last request in flight, so it can be closed
+        """
+        with self._session_lock:
+            if n := self._session_uses[session] - 1:
+                self._session_uses[session] = n
+                return False
+            del self._session_uses[session]
+            if session in self._stale_sessions:
+                self._stale_sessions.remove(session)
+                return True
+            return False
+
+    def _replaced(self, session: Client | AsyncClient) -> bool:
+        """
+        @return: whether the replaced session is idle and can be closed now, otherwise its last request closes it
+        """
+        with self._session_lock:
+            if session in self._session_uses:
+                self._stale_sessions.add(session)
+                return False
+            return True
+
+    def _batch_plan(self, operations: list[dict | tuple]) -> tuple[list[dict], list, list[int]]:
+        """
+        @return: normalised operations, results pre-filled from the cache, and indices still to be fetched
+        """
+        ops = [o if isinstance(o, dict) else {'id': o[0], 'variables': o[1] if len(o) > 1 else {}} for o in operations]
+        results, todo = [None] * len(ops), []
+        for i, json in enumerate(ops):
+            if self.cache and (hit := self._cached(json)) is not None:
+                results[i] = orjson.loads(hit)
+            else:
+                todo.append(i)
+        return ops, results, todo
+
+    def _batch_chunks(self, todo: list[int], size: int) -> list[list[int]]:
+        size = size if self._batching else 1
+        return [todo[i:i + size] for i in range(0, len(todo), size)]
+
+    @staticmethod
+    def _batch_fill(results: list, chunk: list[int], res: list[dict]):
+        for i, r in zip(chunk, res):
+            results[i] = r
+
+    def _batch_response(self, jsons: list[dict], r: Response) -> list[dict] | None:
+        """
+        @return: per-operation responses, or None if the server did not answer the array body with an array
+        """
+        if r.status_code in RETRY_STATUS:
+            # transient, says nothing about array support
+            return
+        try:
+            data = decode(r)
+        except ValueError:
+            data = None
+        if not isinstance(data, list) or len(data) != len(jsons):
+            self._batching = False
+            return
+        self._batching = True
+        for json, d in zip(jsons, data):
+            if self.cache and isinstance(d, dict) and not d.get('errors'):
+                self.cache.set(json, orjson.dumps(d), self._cache_scope)
+        return data
+
+    @staticmethod
+    def _batch_error(e: Exception) -> dict:
+        return {'errors': [{'message': f'{type(e).__name__}: {e}'}]}
+
+    def _gql_batch(self, jsons: list[dict]) -> list[dict]:
+        if len(jsons) > 1 and self._batching is not False:
+            try:
+                if (res := self._batch_response(jsons, self._fetch('POST', self.gql, json=jsons))) is not None:
+                    return res
+            except Exception as e:
+                self.logger.debug(f'array batch failed, falling back to single operations: {e}')
+        res = []
+        for json in jsons:
+            try:
+                res.append(self._gql(json))
+            except Exception as e:
+                res.append(self._batch_error(e))
+        return res
+
+    def _fetch(self, method: str, url: str, **kwargs) -> Response:
+        """
+        Send a request on the shared session. Every endpoint goes through here.
+
+        @param method: HTTP method
+        @param url: request url
+        @param kwargs: keyword arguments passed to `httpx.Client.request`
+        @return: response object
+        """
+        host = URL(url).host
+        if self._expired(): self.refresh(self.session)
+        session = self.session
+        if self.limiter: self.limiter.acquire(host)
+        r = self._send(session, method, url, **kwargs)
+        if self.limiter: self.limiter.update(host, r)
+        if r.status_code == 401 and self._refreshable:
+            # token revoked or expired early, refresh once and retry
+            if self.token_store: self.token_store.delete(self._identity)
+            if self.metrics: self.metrics.on_retry(self._operation(url, kwargs.get('json')), '401 Unauthorized')
+            r = self._send(self.refresh(session), method, url, **kwargs)
+        if self.debug: log(self.logger, self.debug, r)
+        return r
+
+    def _send(self, session: Client, method: str, url: str, **kwargs) -> Response:
+        """
+        Send one request, recording its latency, status and size when metrics are enabled.
+
+        The operation label is attached to the request's extensions, so parse steps can be attributed to it.
+        """
+        self._hold(session)
+        try:
+            if not self.metrics:
+                return session.request(method, url, **kwargs)
+            op = self._operation(url, kwargs.get('json'))
+            t = time.perf_counter()
+            try:
+                r = session.request(method, url, extensions={'operation': op}, **kwargs)
+            except Exception as e:
+                self.metrics.on_error(op, e)
+                raise
+            self.metrics.on_request(op, r, time.perf_counter() - t)
+            return r
+        finally:
+            if self._unhold(session): session.close()
+
+    def _timed(self, r: Response, parse: Callable[[], any]) -> any:
+        """
+        Run a parse step for a response, timing it when metrics are enabled.
+        """
+        if not self.metrics:
+            return parse()
+        t = time.perf_counter()
+        try:
+            return parse()
+        finally:
+            self.metrics.on_parse(r.request.extensions.get('operation', 'unknown'), time.perf_counter() - t)
+
+    def _cached(self, json: dict) -> bytes | None:
+        hit = self.cache.get(json, self._cache_scope)
+        if self.metrics: self.metrics.on_cache(self._operation(self.gql, json), hit is not None)
+        return hit
+
+    @staticmethod
+    def _operation(url: str, json: dict | list = None) -> str:
+        from .metrics import operation
+
+        return operation(url, json)
+
+    def rate_limits(self) -> dict:
+        """
+        Get the rate limiter state.
+
+        @return: per-host bucket stats, e.g. remaining budget, requests, time spent waiting
+        """
+        return self.limiter.stats() if self.limiter else {}
+
+    def _json(self, method: str, url: str, **kwargs) -> dict:
+        r = self._fetch(method, url, **kwargs)
+        return self._timed(r, lambda: decode(r))
+
+    def _gql(self, json: dict) -> dict:
+        if self.cache and (hit := self._cached(json)) is not None:
+            return orjson.loads(hit)
+        return self._cache_response(json, self._fetch('POST', self.gql, json=json))
+
+    def _cache_response(self, json: dict, r: Response) -> dict:
+        data = self._timed(r, lambda: decode(r))
+        if self.cache and r.status_code == 200 and not data.get('errors'):
+            self.cache.set(json, r.content, self._cache_scope)
+        return data
+
+    def _page(self, url: str) -> dict:
+        r = self._fetch('GET', url).raise_for_status()
+        return self._timed(r, lambda: self._parse_page(r.content))
+
+    @staticmethod
+    def _parse_page(html: str | bytes) -> dict:
+        # the data script is found in the raw page, the DOM is only built if that fails
+        if (data := find_script_data(html)) is not None:
+            return data
+        from selectolax.lexbor import LexborHTMLParser
+
+        if not (script := LexborHTMLParser(html).css_first('script#data')):
+            raise PageError('page has no script#data', truncated=not page_complete(html))
+        if (data := extract_json(script.text())) is None:
+            raise PageError('script#data has no JSON object', truncated=not page_complete(html))
+        return data
+
+    @classmethod
+    def _parse_session(cls, html: str | bytes) -> tuple[str, float]:
+        """
+        @return: bearer token and the unix time it expires at
+        """
+        session = cls._parse_page(html)['user']['session']
+        try:
+            expires = datetime.fromisoformat(session['expires'].replace('Z', '+00:00')).timestamp()
+        except (KeyError, AttributeError, ValueError):
+            expires = time.time() + 3600
+        return session['accessToken'], expires
+
+    @staticmethod
+    def _parse_csrf(html: str | bytes) -> str:
+        if csrf := find_input_value(html, 'csrf_token'):
+            return csrf
+        from selectolax.lexbor import LexborHTMLParser
+
+        return LexborHTMLParser(html).css_first('input[name=csrf_token]').attributes['value']
+
+    @staticmethod
+    def _login_form(username: str, password: str, csrf: str) -> dict:
+        return {
+            'csrf_token': csrf,
+            'otp': '',
+            'password': password,
+            'dest': 'https://www.reddit.com',
+            'username': username,
+        }
+
+    @staticmethod
+    def _auth_headers(client: Client | AsyncClient, token: str) -> dict:
+        return {
+            'authorization': f'Bearer {token}',
+            'x-reddit-compression': '1',
+            'x-reddit-loid': client.cookies.get('loid', ''),
+            'x-reddit-session': client.cookies.get('session', ''),
+        }
+
+    @classmethod
+    def _guest_headers(cls, client: Client | AsyncClient, token: str) -> dict:
+        return {
+            'authority': 'gql.reddit.com',
+            'accept-language': 'en-GB,en;q=0.9',
+        } | cls._auth_headers(client, token)
 
     @staticmethod
     def _init_logger(cfg: dict) -> Logger:
+        import logging.config
+
         if cfg:
             logging.config.dictConfig(cfg)
         else:
@@ -393,3 +1050,366 @@ class Scraper:
                 logging.getLogger(name).setLevel(logging.ERROR)
 
         return logging.getLogger(logger_name)
+
+
+class AsyncScraper(Scraper):
+    """
+    Asynchronous Scraper. Every endpoint is a coroutine, and all requests share one
+    long-lived HTTP/2 connection pool for the lifetime of the scraper.
+
+    async with AsyncScraper() as reddit:
+        popular, pics = await asyncio.gather(reddit.popular(), reddit.subreddit('pics'))
+    """
+
+    def __init__(self, username: str = None, password: str = None, session: AsyncClient = None, **kwargs):
+        self._configure(**kwargs)
+        self.http2 = kwargs.get('http2', True)
+        self.limits = kwargs.get('limits', Limits(max_connections=100, max_keepalive_connections=20))
+        self.timeout = kwargs.get('timeout', 20)
+        self.session = None
+        self._credentials = username, password, session
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+    async def start(self) -> AsyncClient:
+        """
+        Bootstrap the session. Called lazily by the first request if not awaited explicitly.
+
+        @return: the shared session
+        """
+        async with self._lock:
+            if self.session is None:
+                self.session = self._restore() or await self._bootstrap()
+        return self.session
+
+    async def aclose(self):
+        if self.session is not None:
+            await self.session.aclose()
+            self.session = None
+
+    def _client(self) -> AsyncClient:
+        return AsyncClient(
+            http2=self.http2,
+            limits=self.limits,
+            timeout=self.timeout,
+            follow_redirects=True,
+            headers={'user-agent': USER_AGENT},
+        )
+
+    async def _bootstrap(self) -> AsyncClient:
+        return self._persist(await self._init_session(*self._credentials))
+
+    async def refresh(self, stale: AsyncClient = None) -> AsyncClient:
+        async with self._lock:
+            if stale is None or self.session is stale:
+                old, self.session = self.session, await self._bootstrap()
+                if old is not None and old is not self.session and self._replaced(old): await old.aclose()
+        return self.session
+
+    async def _init_session(self, *args, **kwargs) -> AsyncClient:
+        username, password, session = args
+        if session and all(session.cookies.get(c) for c in {'USER', 'csrf_token'}):
+            # authenticated session provided
+            return session
+        if not session and not self.guest:
+            # no session provided, log-in to authenticate
+            return await self.login(username, password)
+
+        self.guest = True
+        client = self._client()
+        # generate bearer token
+        r = await client.get('https://www.reddit.com')
+        bearer_token, self.expires = self._parse_session(r.content)
+        # generate csrf token
+        r = await client.get('https://www.reddit.com/account/sso/one_tap/')
+        csrf = self._parse_csrf(r.content)
+        client.cookies.set('csrf_token', csrf)
+        client.headers.update(self._guest_headers(client, bearer_token))
+        return client
+
+    async def login(self, username: str, password: str) -> AsyncClient:
+        client = self._client()
+        # generate csrf token
+        r = await client.get('https://www.reddit.com/account/sso/one_tap/')
+        csrf = self._parse_csrf(r.content)
+        client.cookies.delete('USER')
+        client.cookies.delete('csrf_token')
+        client.cookies = dict(client.cookies) | {'csrf_token': csrf, 'USER': ''}
+        await client.post('https://www.reddit.com/login', data=urlencode(self._login_form(username, password, csrf)))
+        r = await client.get('https://www.reddit.com')
+        token, self.expires = self._parse_session(r.content)
+        client.cookies.delete('loid')
+        client.cookies.delete('session')
+        client.headers = dict(client.headers) | self._auth_headers(client, token)
+        return client
+
+    async def posts(self, mapping: dict, concurrency: int = 100, retries: int = 3,
+                    sink: Sink | AsyncSink | bool = None) -> list[dict]:
+        from tqdm.asyncio import tqdm_asyncio
+
+        self.failures = {}
+        sem = asyncio.Semaphore(concurrency)
+
+        async with self._asink(sink, 'posts') as sink:
+            async def get(post_id: str, url: str):
+                async with sem:
+                    res = await self._get_post(post_id, url, retries)
+                if sink and res is not None: await sink.awrite(res)
+                return res
+
+            res = await tqdm_asyncio.gather(*(get(_id, url) for _id, url in self._post_urls(mapping)),
+                                            desc="Getting posts")
+        return [r for r in res if r is not None]
+
+    async def iter_posts(self, mapping: dict, concurrency: int = 16, retries: int = 3,
+                         sink: Sink | AsyncSink | bool = None) -> AsyncIterator[dict]:
+        self.failures = {}
+        urls = self._post_urls(mapping)
+        pending = set()
+        try:
+            async with self._asink(sink, 'posts') as sink:
+                while True:
+                    for post_id, url in islice(urls, concurrency - len(pending)):
+                        pending.add(asyncio.ensure_future(self._get_post(post_id, url, retries)))
+                    if not pending:
+                        return
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for t in done:
+                        if (res := t.result()) is not None:
+                            if sink: await sink.awrite(res)
+                            yield res
+        finally:
+            for t in pending: t.cancel()
+
+    async def _get_post(self, post_id: str, url: str, retries: int) -> dict | None:
+        for attempt in range(retries + 1):
+            try:
+                return {post_id: await self._page(url)}
+            except Exception as e:
+                if attempt == retries or not retryable(e):
+                    return self._fail(post_id, e)
+                if self.metrics: self.metrics.on_retry('post', e)
+                await asyncio.sleep(backoff(attempt, getattr(e, 'response', None)))
+
+    async def stream_comments(self, mapping: dict, sink: Sink | AsyncSink | bool = None,
+                              **kwargs) -> AsyncIterator[dict]:
+        """
+        Stream live comments from posts as parsed records.
+
+        All sockets feed one bounded queue, dropped sockets are reconnected with backoff,
+        and per-socket lag and throughput counters are kept in `self.live_stats`.
+
+        @param mapping: a dict representing a mapping of subreddit names to post ids.
+        @param sink: sink to also write each comment to, True for gzipped NDJSON under `out_path / "live"`.
+            Pass an `AsyncSink` to keep a custom sink's writes off the event loop.
+        @param kwargs: optional stream parameters, see `live.stream`.
+        @return: async iterator over comment records.
+        """
+        from . import live
+
+        posts = await self.posts(mapping)
+        async with self._asink(sink, 'live') as sink:
+            async for comment in live.stream(self._ws_uris(posts), self.live_stats, **kwargs):
+                if sink: await sink.awrite(comment)
+                yield comment
+
+    async def watch(self, subreddits: list[str] = (), front_page: bool = False, sort: str = Sort.New,
+                    state: Path | str | bool = None, save_interval: float = 60, max_seen: int = 200_000,
+                    model: type = None, fields: set[str] = None, sink: Sink | AsyncSink | bool = None,
+                    **kwargs) -> AsyncIterator[tuple[str, dict]]:
+        """
+        Watch subreddits and the front page for new posts.
+
+        Each feed is polled on its own schedule, adapted to how often it gets new posts, and each poll stops
+        paginating once it reaches posts older than the newest one seen before. Posts are emitted once,
+        even when listed by several feeds. Per-feed state is kept in `self.watch_stats`.
+
+        @param subreddits: names of the subreddits to watch.
+        @param front_page: whether to also watch the front page.
+        @param sort: sort type of the feeds. See `Sort` for options, only `Sort.New` lists every new post.
+        @param state: json file to persist the seen ids and feed schedules to, so a restarted watch resumes
+            where it stopped. True for `out_path / "watch.json"`.
+        @param save_interval: minimum seconds between writes of `state`, it is always written on exit.
+        @param max_seen: maximum number of post ids remembered for deduplication.
+        @param model: optional record type to parse nodes into, e.g. `models.Post`.
+        @param fields: fields to keep when parsing into `model`, None for all.
+        @param sink: sink to also write each post to, True for gzipped NDJSON under `out_path / "watch"`.
+        @param kwargs: optional watch parameters, see `watch.watch`.
+        @return: async iterator over (feed, post) pairs, the feed being "r/{name}" or "front_page".
+        """
+        from . import watch
+
+        if state is True:
+            state = self.out_path / 'watch.json'
+        seen, persisted = watch.load(state, max_seen) if state else (watch.SeenSet(max_seen), {})
+        feeds = {f'r/{name}': (lambda after, name=name: self.subreddit_posts(name, sort, after=after))
+                 for name in subreddits}
+        if front_page:
+            feeds['front_page'] = lambda after: self.front_page(sort, after=after)
+        min_interval = kwargs.get('min_interval', 30)
+        self.watch_stats = {k: watch.FeedState(k, **({'interval': min_interval} | persisted[k]))
+                            for k in feeds if k in persisted}
+        saved = time.time()
+        try:
+            posts = watch.watch(feeds, seen, self.watch_stats, lambda data: self._next_page(data, None), **kwargs)
+            async with self._asink(sink, 'watch') as sink, aclosing(posts):
+                async for feed, node in posts:
+                    item = node if model is None else model.parse(node, fields)
+                    if sink: await sink.awrite(item)
+                    yield feed, item
+                    if state and time.time() - saved > save_interval:
+                        watch.save(state, seen, self.watch_stats)
+                        saved = time.time()
+        finally:
+            if state: watch.save(state, seen, self.watch_stats)
+
+    async def comment_tree(self, post_id: str, subreddit: str = None, expand: bool = True, concurrency: int = 8,
+                           fields: set[str] = None) -> AsyncIterator[Comment]:
+        seen, requested = set(), set()
+        comments, todo = self._tree_page(await self._page(self._post_url(post_id, subreddit)), fields)
+        for c in self._unseen(comments, seen):
+            yield c
+        if not expand:
+            return
+        link_id = f't3_{post_id}'
+        pending = set()
+        try:
+            while todo or pending:
+                while todo and len(pending) < concurrency:
+                    if ids := self._take(todo, seen, requested):
+                        pending.add(asyncio.ensure_future(self._more_children(link_id, ids, fields)))
+                if not pending:
+                    continue
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    comments, more = t.result()
+                    todo.extend(more)
+                    for c in self._unseen(comments, seen):
+                        yield c
+        finally:
+            for t in pending: t.cancel()
+
+    async def _more_children(self, link_id: str, ids: list[str], fields: set[str] = None,
+                             retries: int = 3) -> tuple[list[Comment], list[str]]:
+        for attempt in range(retries + 1):
+            try:
+                r = await self._fetch('GET', 'https://oauth.reddit.com/api/morechildren.json',
+                                      params=self._more_params(link_id, ids))
+                r.raise_for_status()
+                return self._timed(r, lambda: self._tree_more(decode(r), fields))
+            except Exception as e:
+                if attempt == retries or not retryable(e):
+                    self.logger.error(f'[{RED}error{RESET}] failed to expand {len(ids)} comments of {link_id}: {e}')
+                    return [], []
+                if self.metrics: self.metrics.on_retry('morechildren', e)
+                await asyncio.sleep(backoff(attempt, getattr(e, 'response', None)))
+
+    async def live_comments(self, mapping: dict, callback: Callable[[dict], None] = None,
+                            sink: Sink | AsyncSink | bool = None, **kwargs):
+        async for comment in self.stream_comments(mapping, sink, **kwargs):
+            if callback or not sink: (callback or self._print_comment)(comment)
+
+    async def batch(self, operations: list[dict | tuple], size: int = 25, concurrency: int = 16) -> list[dict]:
+        ops, results, todo = self._batch_plan(operations)
+        if self._batching is None and len(todo) > 1:
+            chunk, todo = todo[:size], todo[size:]
+            self._batch_fill(results, chunk, await self._gql_batch([ops[i] for i in chunk]))
+        sem = asyncio.Semaphore(concurrency)
+
+        async def run(chunk: list[int]):
+            async with sem:
+                self._batch_fill(results, chunk, await self._gql_batch([ops[i] for i in chunk]))
+
+        await asyncio.gather(*(run(c) for c in self._batch_chunks(todo, size)))
+        return results
+
+    async def _gql_batch(self, jsons: list[dict]) -> list[dict]:
+        if len(jsons) > 1 and self._batching is not False:
+            try:
+                if (res := self._batch_response(jsons, await self._fetch('POST', self.gql, json=jsons))) is not None:
+                    return res
+            except Exception as e:
+                self.logger.debug(f'array batch failed, falling back to single operations: {e}')
+
+        async def one(json: dict) -> dict:
+            try:
+                return await self._gql(json)
+            except Exception as e:
+                return self._batch_error(e)
+
+        return list(await asyncio.gather(*(one(json) for json in jsons)))
+
+    async def _paginate(self, fetch: Callable[[str | None], Awaitable[dict]], kind: str | None,
+                        limit: int | None, pages: int | None, model: type = None, fields: set[str] = None,
+                        sink: Sink | AsyncSink | bool = None, name: str = None) -> AsyncIterator[dict]:
+        task = asyncio.ensure_future(fetch(None))
+        n = page = 0
+        try:
+            async with self._asink(sink, name) as sink:
+                while task:
+                    edges, cursor = self._next_page(await task, kind)
+                    page += 1
+                    more = (cursor and edges and (pages is None or page < pages)
+                            and (limit is None or n + len(edges) < limit))
+                    task = asyncio.ensure_future(fetch(cursor)) if more else None
+                    for edge in edges:
+                        if limit is not None and n >= limit:
+                            return
+                        n += 1
+                        node = edge.get('node', edge)
+                        item = node if model is None else model.parse(node, fields)
+                        if sink: await sink.awrite(item)
+                        yield item
+        finally:
+            if task: task.cancel()
+
+    async def _fetch(self, method: str, url: str, **kwargs) -> Response:
+        session = self.session if self.session is not None else await self.start()
+        host = URL(url).host
+        if self._expired(): session = await self.refresh(session)
+        if self.limiter: await self.limiter.aacquire(host)
+        r = await self._send(session, method, url, **kwargs)
+        if self.limiter: self.limiter.update(host, r)
+        if r.status_code == 401 and self._refreshable:
+            # token revoked or expired early, refresh once and retry
+            if self.token_store: self.token_store.delete(self._identity)
+            if self.metrics: self.metrics.on_retry(self._operation(url, kwargs.get('json')), '401 Unauthorized')
+            r = await self._send(await self.refresh(session), method, url, **kwargs)
+        if self.debug: log(self.logger, self.debug, r)
+        return r
+
+    async def _send(self, session: AsyncClient, method: str, url: str, **kwargs) -> Response:
+        self._hold(session)
+        try:
+            if not self.metrics:
+                return await session.request(method, url, **kwargs)
+            op = self._operation(url, kwargs.get('json'))
+            t = time.perf_counter()
+            try:
+                r = await session.request(method, url, extensions={'operation': op}, **kwargs)
+            except Exception as e:
+                self.metrics.on_error(op, e)
+                raise
+            self.metrics.on_request(op, r, time.perf_counter() - t)
+            return r
+        finally:
+            if self._unhold(session): await session.aclose()
+
+    async def _json(self, method: str, url: str, **kwargs) -> dict:
+        r = await self._fetch(method, url, **kwargs)
+        return self._timed(r, lambda: decode(r))
+
+    async def _gql(self, json: dict) -> dict:
+        if self.cache and (hit := self._cached(json)) is not None:
+            return orjson.loads(hit)
+        return self._cache_response(json, await self._fetch('POST', self.gql, json=json))
+
+    async def _page(self, url: str) -> dict:
+        r = (await self._fetch('GET', url)).raise_for_status()
+        return self._timed(r, lambda: self._parse_page(r.content))
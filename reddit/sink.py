@@ -0,0 +1,304 @@
+import asyncio
+import gzip
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+import orjson
+
+_STOP = object()
+
+
+class Sink:
+    """
+    Base for append-only sinks that stream records to rotating files in a directory.
+
+    Records are dicts or `models` records. A file is rotated once it reaches `max_bytes` on disk or is
+    older than `max_age` seconds. Files are written under a ".partial" suffix and renamed when complete,
+    so anything picking up finished files never sees a half-written one.
+    """
+    suffix = ''
+
+    def __init__(self, path: Path | str, prefix: str = 'part', max_bytes: int = 256 * 2 ** 20,
+                 max_age: float = None):
+        """
+        @param path: directory to write files to
+        @param prefix: file name prefix, files are named "{prefix}-{time_ns}{suffix}"
+        @param max_bytes: rotate once the current file reaches this size, None to disable
+        @param max_age: rotate once the current file is this many seconds old, None to disable
+        """
+        self.path = Path(path)
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.records = 0
+        self.files = []  # completed files, in order
+        self._file = None
+        self._raw = None
+        self._opened = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, record: dict):
+        with self._lock:
+            if self._raw is None or self._due():
+                self._rotate()
+            self._write(record)
+            self.records += 1
+
+    def write_many(self, records):
+        for r in records:
+            self.write(r)
+
+    async def awrite(self, record: dict):
+        self.write(record)
+
+    def flush(self):
+        with self._lock:
+            if self._raw is not None:
+                self._flush()
+
+    def close(self):
+        with self._lock:
+            self._finish()
+
+    async def aflush(self):
+        await asyncio.to_thread(self.flush)
+
+    async def aclose(self):
+        await asyncio.to_thread(self.close)
+
+    def _due(self) -> bool:
+        return bool((self.max_bytes and self._raw.tell() >= self.max_bytes) or
+                    (self.max_age and time.time() - self._opened >= self.max_age))
+
+    def _rotate(self):
+        self._finish()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._file = self.path / f'{self.prefix}-{time.time_ns()}{self.suffix}'
+        self._raw = open(self._file.with_name(self._file.name + '.partial'), 'wb')
+        self._opened = time.time()
+        self._open()
+
+    def _finish(self):
+        if self._raw is None:
+            return
+        self._close()
+        if not self._raw.closed:
+            self._raw.close()
+        os.replace(self._raw.name, self._file)
+        self.files.append(self._file)
+        self._raw = None
+
+    def _open(self):
+        ...
+
+    def _write(self, record: dict):
+        raise NotImplementedError
+
+    def _flush(self):
+        ...
+
+    def _close(self):
+        ...
+
+
+class NDJSONSink(Sink):
+    """
+    Newline-delimited JSON, optionally gzip or zstd compressed.
+    """
+
+    def __init__(self, path: Path | str, prefix: str = 'part', compression: str | None = 'gzip', level: int = None,
+                 **kwargs):
+        """
+        @param path: directory to write files to
+        @param prefix: file name prefix
+        @param compression: 'gzip', 'zstd' (requires `zstandard`) or None
+        @param level: compression level, None for the codec default
+        @param kwargs: rotation parameters, see `Sink`
+        """
+        super().__init__(path, prefix, **kwargs)
+        if compression not in {None, 'gzip', 'zstd'}:
+            raise ValueError(f'unsupported compression: {compression}')
+        if compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError as e:
+                raise ImportError('zstd compression requires zstandard: pip install zstandard') from e
+            self._zstd = zstandard.ZstdCompressor(level=level or 3)
+        self.compression = compression
+        self.level = level
+        self.suffix = '.ndjson' + {None: '', 'gzip': '.gz', 'zstd': '.zst'}[compression]
+        self._fp = None
+
+    def _open(self):
+        if self.compression == 'gzip':
+            self._fp = gzip.GzipFile(fileobj=self._raw, mode='wb', compresslevel=self.level or 6)
+        elif self.compression == 'zstd':
+            self._fp = self._zstd.stream_writer(self._raw)
+        else:
+            self._fp = self._raw
+
+    def _write(self, record: dict):
+        self._fp.write(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE))
+
+    def _flush(self):
+        self._fp.flush()
+        self._raw.flush()
+
+    def _close(self):
+        self._fp.close()
+
+
+class ParquetSink(Sink):
+    """
+    Columnar Parquet files, requires `pyarrow`.
+
+    Rows are buffered and written as row groups. The schema is inferred from the first row group of each
+    file, so records should be flat and uniform, e.g. `models` records rather than raw responses.
+    """
+    suffix = '.parquet'
+
+    def __init__(self, path: Path | str, prefix: str = 'part', compression: str = 'zstd',
+                 row_group_size: int = 10_000, **kwargs):
+        """
+        @param path: directory to write files to
+        @param prefix: file name prefix
+        @param compression: parquet codec, e.g. 'zstd', 'snappy', 'gzip' or 'none'
+        @param row_group_size: number of rows buffered per row group
+        @param kwargs: rotation parameters, see `Sink`
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError('ParquetSink requires pyarrow: pip install pyarrow') from e
+        super().__init__(path, prefix, **kwargs)
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self._rows = []
+        self._writer = None
+
+    def _write(self, record: dict):
+        self._rows.append(record if isinstance(record, dict) else record.asdict())
+        if len(self._rows) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        table = self._pa.Table.from_pylist(self._rows, schema=self._writer.schema if self._writer else None)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self._raw, table.schema, compression=self.compression)
+        self._writer.write_table(table)
+        self._rows = []
+
+    def _close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class AsyncSink:
+    """
+    Runs another sink on a background thread, so compression and disk writes never block the caller.
+
+    Records go through a bounded queue. `write` only blocks, and `awrite` only yields to a thread,
+    when the writer has fallen `maxsize` records behind.
+    """
+
+    def __init__(self, sink: Sink, maxsize: int = 10_000):
+        """
+        @param sink: sink to write to
+        @param maxsize: maximum number of records queued before writers wait
+        """
+        self.sink = sink
+        self.error = None
+        self._queue = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._run, name=f'sink-{sink.prefix}', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def files(self) -> list[Path]:
+        return self.sink.files
+
+    @property
+    def records(self) -> int:
+        return self.sink.records
+
+    def write(self, record: dict):
+        self._check()
+        self._queue.put(record)
+
+    def write_many(self, records):
+        for r in records:
+            self.write(r)
+
+    async def awrite(self, record: dict):
+        self._check()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            await asyncio.to_thread(self._queue.put, record)
+
+    def flush(self):
+        """
+        Wait for queued records to be written, then flush the underlying sink.
+        """
+        self._queue.join()
+        self._check()
+        self.sink.flush()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self.sink.close()
+        self._check()
+
+    async def aflush(self):
+        """
+        `flush` for async callers, waits for the queue to drain without blocking the event loop.
+        """
+        await asyncio.to_thread(self.flush)
+
+    async def aclose(self):
+        """
+        `close` for async callers, waits for the writer thread without blocking the event loop.
+        """
+        await asyncio.to_thread(self.close)
+
+    def _check(self):
+        if self.error is not None:
+            e, self.error = self.error, None
+            raise e
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            try:
+                if record is _STOP:
+                    return
+                if self.error is None:
+                    self.sink.write(record)
+            except Exception as e:
+                # surfaced to the caller on its next write, records queued meanwhile are dropped
+                self.error = e
+            finally:
+                self._queue.task_done()
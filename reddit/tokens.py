@@ -0,0 +1,121 @@
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import orjson
+from httpx import AsyncClient, Client
+
+try:
+    import fcntl
+except ImportError:
+    # no advisory locks on Windows, only stores in the same process are serialised
+    fcntl = None
+
+# one lock per file, shared by every store on it, e.g. the members of a `ScraperPool`
+_locks: dict[Path, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+class TokenStore:
+    """
+    Local store for bootstrapped sessions: bearer token, csrf, cookies and expiry.
+
+    Entries are keyed by identity (the username, or "guest") so short-lived workers can
+    reload a session instead of repeating the bootstrap page fetches.
+    """
+
+    def __init__(self, path: Path | str, skew: float = 60):
+        """
+        @param path: json file to persist sessions to
+        @param skew: seconds before expiry at which an entry is considered stale
+        """
+        self.path = Path(path)
+        self.skew = skew
+        with _locks_lock:
+            self._lock = _locks.setdefault(self.path.resolve(), threading.Lock())
+
+    @contextmanager
+    def _locked(self):
+        """
+        Serialise read-modify-writes of the file across threads, and across processes where flock is available.
+        """
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path.with_name(f'{self.path.name}.lock'), 'a') as fp:
+                fcntl.flock(fp, fcntl.LOCK_EX)
+                yield
+
+    def _read(self) -> dict:
+        try:
+            return orjson.loads(self.path.read_bytes())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            return {}
+
+    def _write(self, data: dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # unique per write, and created with mode 0600 since it holds credentials
+        with tempfile.NamedTemporaryFile(dir=self.path.parent, prefix=f'{self.path.name}.', suffix='.tmp',
+                                         delete=False) as fp:
+            fp.write(orjson.dumps(data))
+        try:
+            os.replace(fp.name, self.path)
+        except OSError:
+            os.unlink(fp.name)
+            raise
+
+    def load(self, key: str) -> dict | None:
+        """
+        @param key: identity
+        @return: the stored entry, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._read().get(key)
+        if entry and entry.get('expires', 0) - self.skew > time.time():
+            return entry
+
+    def save(self, key: str, client: Client | AsyncClient, expires: float, guest: bool):
+        """
+        @param key: identity
+        @param client: bootstrapped session
+        @param expires: unix time at which the bearer token expires
+        @param guest: whether the session is a guest session
+        """
+        entry = {
+            'headers': dict(client.headers),
+            # the jar keeps cookies of the same name set by different domains apart
+            'cookies': [[c.name, c.value, c.domain, c.path] for c in client.cookies.jar],
+            'expires': expires,
+            'guest': guest,
+        }
+        with self._locked():
+            data = self._read()
+            data[key] = entry
+            self._write(data)
+
+    @staticmethod
+    def restore(entry: dict, client: Client | AsyncClient) -> Client | AsyncClient:
+        """
+        @param entry: entry returned by `load`
+        @param client: fresh session to apply the entry's headers and cookies to
+        @return: the session
+        """
+        client.headers.update(entry['headers'])
+        if isinstance(cookies := entry['cookies'], dict):
+            # written before cookies kept their domain
+            client.cookies.update(cookies)
+        else:
+            for name, value, domain, path in cookies:
+                client.cookies.set(name, value, domain, path)
+        return client
+
+    def delete(self, key: str):
+        with self._locked():
+            data = self._read()
+            if data.pop(key, None) is not None:
+                self._write(data)
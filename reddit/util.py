@@ -1,9 +1,17 @@
+from __future__ import annotations
+
+import random
+import re
 import time
-from logging import Logger
+from logging import DEBUG, Logger
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator
 
 import orjson
-from httpx import Response
+
+# httpx is only needed once a request is made, keeps `constants`, `models` and `util` cheap to import
+if TYPE_CHECKING:
+    from httpx import Response
 
 BLACK = "\x1b[30m"
 RED = "\x1b[31m"
@@ -57,6 +65,75 @@ def get_rate_limits(r: Response) -> dict:
     }
 
 
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class PageError(ValueError):
+    """
+    A page was fetched but holds no data. Removed, quarantined and login-walled posts answer with a complete
+    page like that, so only pages that were cut off are worth fetching again.
+    """
+
+    def __init__(self, msg: str, truncated: bool = False):
+        super().__init__(msg)
+        self.truncated = truncated
+
+
+def page_complete(html: str | bytes) -> bool:
+    """
+    @return: whether the page ends with its closing html tag, i.e. was not cut off
+    """
+    return bool((_HTML_END_B if isinstance(html, bytes) else _HTML_END).search(html[-1024:]))
+
+
+def retryable(e: Exception) -> bool:
+    """
+    Whether a failed request is worth retrying: network errors, throttling, server errors, truncated pages
+    and unparseable responses
+
+    @param e: the exception raised by the request
+    @return: True if the request should be retried
+    """
+    from httpx import HTTPStatusError, TransportError
+
+    if isinstance(e, HTTPStatusError):
+        return e.response.status_code in RETRY_STATUS
+    if isinstance(e, PageError):
+        return e.truncated
+    return isinstance(e, (TransportError, ValueError))
+
+
+def backoff(attempt: int, r: Response = None, base: float = .5, cap: float = 60) -> float:
+    """
+    Delay before the next retry. Honours `Retry-After` and an exhausted `x-ratelimit-*` budget,
+    otherwise uses exponential backoff with full jitter.
+
+    @param attempt: number of attempts made so far, starting at 0
+    @param r: the failed response, if any
+    @param base: base delay in seconds
+    @param cap: maximum delay in seconds
+    @return: delay in seconds
+    """
+    if r is not None:
+        if retry_after := r.headers.get('retry-after'):
+            try:
+                return min(max(float(retry_after), 0), cap)
+            except ValueError:
+                from email.utils import parsedate_to_datetime
+
+                try:
+                    return min(max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0), cap)
+                except (TypeError, ValueError):
+                    ...
+        limits = get_rate_limits(r)
+        try:
+            if float(limits.get('x-ratelimit-remaining', 1)) < 1 and 'x-ratelimit-reset' in limits:
+                return min(float(limits['x-ratelimit-reset']), cap)
+        except ValueError:
+            ...
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
 def find_key(obj: any, key: str) -> list:
     """
     Find all values of a given key within a nested dict or list of dicts
@@ -65,46 +142,248 @@ def find_key(obj: any, key: str) -> list:
     @param key: key to search for
     @return: list of values
     """
+    res = []
+    if type(obj) is dict:
+        if v := obj.get(key):
+            res.append(v)
+        stack = [iter(obj.values())]
+    elif type(obj) is list:
+        stack = [iter(obj)]
+    else:
+        return res
+    # iterative walk over a stack of iterators, no intermediate lists
+    append, pop, push = res.append, stack.pop, stack.append
+    while stack:
+        for o in stack[-1]:
+            if type(o) is dict:
+                if v := o.get(key):
+                    append(v)
+                push(iter(o.values()))
+                break
+            if type(o) is list:
+                push(iter(o))
+                break
+        else:
+            pop()
+    return res
+
+
+def iter_keys(obj: any, keys: str | Iterable[str], paths: bool = False) -> Iterator[tuple]:
+    """
+    Lazily find all values of several keys within decoded JSON (nested dicts and lists), in a single pass
+
+    Walks the document with a stack of iterators, so no intermediate lists are built.
+    Values are yielded in document order, empty values are skipped.
+
+    @param obj: dictionary or list of dictionaries
+    @param keys: key or keys to search for, pass a tuple to reuse it across calls
+    @param paths: yield the JSON path of each value instead of its key
+    @return: iterator over (key, value) pairs, or (path, value) pairs where path is a tuple of keys and indices
+    """
+    keys = (keys,) if isinstance(keys, str) else tuple(keys)
+    if paths:
+        yield from _iter_paths(obj, keys)
+        return
+    if type(obj) is dict:
+        for k in keys:
+            if v := obj.get(k):
+                yield k, v
+        stack = [iter(obj.values())]
+    elif type(obj) is list:
+        stack = [iter(obj)]
+    else:
+        return
+    pop, push = stack.pop, stack.append
+    while stack:
+        for o in stack[-1]:
+            if type(o) is dict:
+                for k in keys:
+                    if v := o.get(k):
+                        yield k, v
+                push(iter(o.values()))
+                break
+            if type(o) is list:
+                push(iter(o))
+                break
+        else:
+            pop()
+
+
+def _iter_paths(obj: any, keys: tuple) -> Iterator[tuple]:
+    if type(obj) is dict:
+        for k in keys:
+            if v := obj.get(k):
+                yield (k,), v
+        stack = [((), iter(obj.items()))]
+    elif type(obj) is list:
+        stack = [((), enumerate(obj))]
+    else:
+        return
+    pop, push = stack.pop, stack.append
+    while stack:
+        path, it = stack[-1]
+        for i, o in it:
+            if type(o) is dict:
+                p = (*path, i)
+                for k in keys:
+                    if v := o.get(k):
+                        yield (*p, k), v
+                push((p, iter(o.items())))
+                break
+            if type(o) is list:
+                push(((*path, i), enumerate(o)))
+                break
+        else:
+            pop()
+
+
+def find_connection(obj: any, key: str = None) -> dict | None:
+    """
+    Find the first GraphQL connection (a dict with `edges` and `pageInfo`) within a nested dict or list of dicts
+
+    @param obj: dictionary or list of dictionaries
+    @param key: only match connections stored under this key, e.g. "posts"
+    @return: the connection, or None if not found
+    """
+    stack = [(None, obj)]
+    while stack:
+        k, o = stack.pop()
+        if isinstance(o, dict):
+            if 'edges' in o and 'pageInfo' in o and (key is None or k == key):
+                return o
+            stack.extend(reversed(o.items()))
+        elif isinstance(o, list):
+            stack.extend((None, e) for e in reversed(o))
 
-    def helper(obj: any, key: str, L: list) -> list:
-        if not obj:
-            return L
 
-        if isinstance(obj, list):
-            for e in obj:
-                L.extend(helper(e, key, []))
-            return L
+_JSON_TOKENS = re.compile(r'"(?:[^"\\]|\\.)*"|[{}]', re.S)
+_JSON_TOKENS_B = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}]', re.S)
 
-        if isinstance(obj, dict) and obj.get(key):
-            L.append(obj[key])
 
-        if isinstance(obj, dict) and obj:
-            for k in obj:
-                L.extend(helper(obj[k], key, []))
-        return L
+def extract_json(text: str | bytes) -> dict | None:
+    """
+    Extract the first JSON object embedded in a string, e.g. `window.___r = {...};`
 
-    return helper(obj, key, [])
+    Tries the whole `{...}` span in a single decode first. If that fails, falls back to
+    matching braces with a regex (strings are skipped whole), so no per-character Python work is done.
 
+    @param text: text or bytes containing a JSON object
+    @return: the decoded object, or None if no valid object was found
+    """
+    lb, rb = ('{', '}') if isinstance(text, str) else (b'{', b'}')
+    start, end = text.find(lb), text.rfind(rb)
+    if start == -1 or end < start:
+        return
+    try:
+        return orjson.loads(text[start:end + 1])
+    except orjson.JSONDecodeError:
+        ...
 
-def extract_json(text: str) -> dict | None:
-    count = 0
-    chars = []
-    for c in text:
-        if c == "{":
-            count += 1
-        if count > 0:
-            chars.append(c)
-        if c == "}":
-            count -= 1
-            if count == 0:
+    tokens = _JSON_TOKENS if isinstance(text, str) else _JSON_TOKENS_B
+    depth = 0
+    for m in tokens.finditer(text, start):
+        tok = m.group()
+        if tok == lb:
+            if depth == 0:
+                start = m.start()
+            depth += 1
+        elif tok == rb and depth:
+            depth -= 1
+            if depth == 0:
                 try:
-                    return orjson.loads("".join(chars))
+                    return orjson.loads(text[start:m.end()])
                 except orjson.JSONDecodeError:
                     ...
 
 
-def log(logger: Logger, level: int, r: Response):
-    def stat(r, txt, data):
+# opening tag of `script#data`, the id may be quoted or not and come after other attributes
+_DATA_SCRIPT = re.compile(r'<script\b[^>]*?\sid\s*=\s*["\']?data(?=["\'\s/>])[^>]*>', re.I)
+_DATA_SCRIPT_B = re.compile(rb'<script\b[^>]*?\sid\s*=\s*["\']?data(?=["\'\s/>])[^>]*>', re.I)
+_SCRIPT_END = re.compile(r'</script', re.I)
+_SCRIPT_END_B = re.compile(rb'</script', re.I)
+_HTML_END = re.compile(r'</html\s*>', re.I)
+_HTML_END_B = re.compile(rb'</html\s*>', re.I)
+_VALUE = re.compile(r'\svalue\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.I)
+_VALUE_B = re.compile(rb'\svalue\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.I)
+
+
+def find_script_data(html: str | bytes) -> dict | None:
+    """
+    Decode the JSON object of the `script#data` element straight from the raw page, without building a DOM.
+
+    Script content ends at the first `</script`, so the element is found with two searches and the JSON
+    is decoded from the slice. Pass the raw response bytes to skip decoding the whole page.
+
+    @param html: page text or bytes
+    @return: the decoded object, or None if the element or its object was not found
+    """
+    if isinstance(html, str):
+        m, end = _DATA_SCRIPT.search(html), _SCRIPT_END
+    else:
+        m, end = _DATA_SCRIPT_B.search(html), _SCRIPT_END_B
+    if not m or not (stop := end.search(html, m.end())):
+        return
+    return extract_json(html[m.end():stop.start()])
+
+
+def find_input_value(html: str | bytes, name: str) -> str | None:
+    """
+    Get the value of the first `input[name=...]` element straight from the raw page, without building a DOM.
+
+    @param html: page text or bytes
+    @param name: name attribute of the input
+    @return: the value, or None if the input or its value was not found
+    """
+    b = isinstance(html, bytes)
+    name = re.escape(name.encode() if b else name)
+    tag = re.compile((rb'<input\b[^>]*?\sname\s*=\s*["\']?%s(?=["\'\s/>])[^>]*>' if b else
+                      r'<input\b[^>]*?\sname\s*=\s*["\']?%s(?=["\'\s/>])[^>]*>') % name, re.I)
+    if not (m := tag.search(html)) or not (v := (_VALUE_B if b else _VALUE).search(m.group())):
+        return
+    value = next(g for g in v.groups() if g is not None)
+    value = value.decode() if b else value
+    if '&' in value:
+        from html import unescape
+
+        value = unescape(value)
+    return value
+
+
+def decode(r: Response) -> any:
+    """
+    Decode a JSON response once. The result is kept on the response, so logging and the
+    endpoint returning it share one parse instead of each calling `r.json()`.
+    """
+    try:
+        return r._decoded
+    except AttributeError:
+        r._decoded = orjson.loads(r.content)
+        return r._decoded
+
+
+class _Truncated:
+    """
+    Defers formatting a response body until a handler actually emits the record.
+    """
+    __slots__ = ('r', 'limit', 'json')
+
+    def __init__(self, r: Response, limit: int | None, json: bool = False):
+        self.r, self.limit, self.json = r, limit, json
+
+    def __str__(self) -> str:
+        body = self.r.content
+        if self.limit is not None and len(body) > self.limit:
+            # the body is already JSON text, slicing it avoids formatting the whole decoded object
+            return f'{body[:self.limit].decode(errors="replace")}... ({len(body)} bytes)'
+        return str(decode(self.r)) if self.json else body.decode(errors='replace')
+
+
+# max characters of a response body logged at debug levels 6 and 7, None to log bodies in full
+LOG_BODY_LIMIT = 2048
+
+
+def log(logger: Logger, level: int, r: Response, limit: int | None = LOG_BODY_LIMIT):
+    def stat(r, is_json):
         if level >= 1:
             logger.debug(f'{r.url.path}')
         if level >= 2:
@@ -116,23 +395,18 @@ def log(logger: Logger, level: int, r: Response):
         if level >= 5:
             logger.debug(f'(Response) cookies = {dict(r.cookies)}')
         if level >= 6:
-            logger.debug(f'(Response) text = {txt}')
-        if level >= 7:
-            logger.debug(f'(Response) json = {data}')
+            logger.debug('(Response) text = %s', _Truncated(r, limit))
+        if level >= 7 and is_json:
+            logger.debug('(Response) json = %s', _Truncated(r, limit, json=True))
 
     try:
         status = r.status_code
-        txt = r.text
-        if 'json' in r.headers.get('content-type', ''):
-            data = r.json()
-            if data.get('errors') or data.get('error'):
-                logger.error(f'[{RED}error{RESET}] {status} {data}')
-            else:
-                logger.debug(fmt_status(status))
-                stat(r, txt, data)
-        else:
+        is_json = 'json' in r.headers.get('content-type', '')
+        if is_json and isinstance(data := decode(r), dict) and (data.get('errors') or data.get('error')):
+            logger.error(f'[{RED}error{RESET}] {status} {data}')
+        elif logger.isEnabledFor(DEBUG):
             logger.debug(fmt_status(status))
-            stat(r, txt, {})
+            stat(r, is_json)
     except Exception as e:
         logger.error(f'Failed to log: {e}')
 
@@ -150,5 +424,5 @@ def fmt_status(status: int) -> str:
 
 def save(r: Response, fname: str = f'{time.time_ns()}') -> int:
     if 'json' in r.headers.get('content-type', ''):
-        return Path(fname).with_suffix('.json').write_bytes(orjson.dumps(r.json()))
+        return Path(fname).with_suffix('.json').write_bytes(r.content)
     return Path(fname).with_suffix('.txt').write_text(r.text)
@@ -0,0 +1,334 @@
+import asyncio
+import hashlib
+import os
+import random
+import sys
+import time
+from array import array
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Iterable
+
+import orjson
+
+from .models import _timestamp
+from .util import backoff
+
+
+class SeenSet:
+    """
+    Bounded set of post ids, evicting the oldest ids first.
+
+    Ids are stored as 64-bit integers (base36 ids decoded, anything else hashed), in a hash set for
+    lookups and a ring buffer for eviction order, which is also the on-disk format: 8 bytes per id.
+    """
+    __slots__ = ('maxsize', '_set', '_ring', '_head')
+
+    def __init__(self, maxsize: int = 200_000, keys: Iterable[int] = ()):
+        """
+        @param maxsize: maximum number of ids remembered
+        @param keys: integer keys to start with, oldest first
+        """
+        self.maxsize = maxsize
+        self._set = set()
+        self._ring = array('Q')
+        self._head = 0
+        for k in keys:
+            self._add(k)
+
+    @staticmethod
+    def key(post_id: str) -> int:
+        """
+        @param post_id: post id, with or without the "t3_" prefix
+        @return: integer key of the id
+        """
+        s = post_id.rpartition('_')[2]
+        # 12 base36 digits stay below 2**63, hashed ids get the top bit so the two can't collide
+        if len(s) <= 12:
+            try:
+                return int(s, 36)
+            except ValueError:
+                ...
+        return int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), 'little') | 1 << 63
+
+    def _add(self, k: int):
+        if len(self._ring) < self.maxsize:
+            self._ring.append(k)
+        else:
+            self._set.discard(self._ring[self._head])
+            self._ring[self._head] = k
+            self._head = (self._head + 1) % self.maxsize
+        self._set.add(k)
+
+    def add(self, post_id: str) -> bool:
+        """
+        @return: whether the id was new
+        """
+        if (k := self.key(post_id)) in self._set:
+            return False
+        self._add(k)
+        return True
+
+    def __contains__(self, post_id: str) -> bool:
+        return self.key(post_id) in self._set
+
+    def __len__(self) -> int:
+        return len(self._set)
+
+    def to_bytes(self) -> bytes:
+        """
+        @return: keys oldest first, as little-endian uint64
+        """
+        a = self._ring[self._head:] + self._ring[:self._head]
+        if sys.byteorder == 'big': a.byteswap()
+        return a.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, maxsize: int = 200_000) -> 'SeenSet':
+        a = array('Q')
+        a.frombytes(data)
+        if sys.byteorder == 'big': a.byteswap()
+        return cls(maxsize, a[-maxsize:])
+
+
+class FeedState:
+    """
+    Watermark, schedule and counters for one watched feed.
+    """
+    __slots__ = ('feed', 'last_id', 'last_created', 'rate', 'page_size', 'interval', 'last_poll', 'next_poll',
+                 'polls', 'pages', 'items', 'errors', 'last_error', 'pending')
+    # persisted across runs, the rest are counters for this run
+    _persist = ('last_id', 'last_created', 'rate', 'page_size', 'interval', 'last_poll')
+
+    def __init__(self, feed: str, interval: float, **kwargs):
+        self.feed = feed
+        self.last_id = None  # newest post id seen
+        self.last_created = None  # creation time of the newest post seen, the pagination stop point
+        self.rate = None  # posts per second, smoothed
+        self.page_size = None
+        self.interval = interval  # seconds until the next poll
+        self.last_poll = None
+        self.polls = 0
+        self.pages = 0
+        self.items = 0
+        self.errors = 0
+        self.last_error = None
+        self.pending = {}  # creation time by id of the posts found but not emitted yet
+        for k in self._persist:
+            if kwargs.get(k) is not None:
+                setattr(self, k, kwargs[k])
+        self.next_poll = (self.last_poll or 0) + self.interval
+
+    @staticmethod
+    def _smooth(old: float | None, new: float, alpha: float = .3) -> float:
+        return new if old is None else old + alpha * (new - old)
+
+    def schedule(self, new: int, now: float, min_interval: float, max_interval: float, overflow: bool):
+        """
+        Adapt the poll interval to the feed's posting rate, aiming for half a page of new posts per poll,
+        so most polls need a single request.
+
+        @param new: number of new posts found by the poll
+        @param now: time of the poll
+        @param overflow: whether the poll ran out of pages before reaching known posts
+        """
+        if self.last_poll:
+            self.rate = self._smooth(self.rate, new / max(now - self.last_poll, 1e-9))
+        if overflow:
+            interval = min_interval
+        elif self.rate:
+            interval = (self.page_size or 25) / 2 / self.rate
+        else:
+            interval = self.interval * 2
+        self.interval = min(max(interval, min_interval), max_interval)
+        self.last_poll = now
+        # jitter keeps feeds added together from polling in lockstep
+        self.next_poll = now + self.interval * random.uniform(.9, 1.1)
+
+    def persisted(self) -> dict:
+        """
+        @return: the fields kept across runs, with the watermark moved back to the oldest post not emitted yet,
+            so the next run fetches it again
+        """
+        data = {k: getattr(self, k) for k in self._persist}
+        if times := [t for t in self.pending.values() if t is not None]:
+            data['last_created'] = min(times if self.last_created is None else [self.last_created, *times])
+        return data
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__} | {'pending': len(self.pending)}
+
+
+def _created(node: dict) -> float | None:
+    return _timestamp(node.get('createdAt') or node.get('created'))
+
+
+def _stickied(node: dict) -> bool:
+    return bool(node.get('isStickied') or node.get('stickied'))
+
+
+async def poll(fetch: Callable[[str | None], Awaitable[dict]], state: FeedState, seen: SeenSet,
+               next_page: Callable[[dict], tuple[list, str | None]], max_pages: int = 10) -> tuple[list[dict], bool]:
+    """
+    Fetch a newest-first feed until it reaches posts older than the feed's watermark.
+
+    Every page is scanned in full, so posts that show up out of order are still caught, but no further
+    page is requested once the watermark (or a known post, for nodes without a timestamp) is reached.
+    Stickied posts are ignored for the stop check, they sit on top of the feed regardless of age.
+
+    @param fetch: function taking a cursor (None for the first page) and returning the response
+    @param state: state of the feed, its watermark is advanced and the new posts are added to its `pending`
+    @param seen: ids already emitted by any feed
+    @param next_page: function returning the edges and next cursor of a response
+    @param max_pages: maximum number of pages to fetch
+    @return: new nodes newest first, and whether `max_pages` ran out before the watermark was reached
+    """
+    new, cursor, page = [], None, 0
+    newest = state.last_created
+    first = state.last_created is None and state.last_id is None
+    while True:
+        edges, cursor = next_page(await fetch(cursor))
+        page += 1
+        if page == 1 and edges:
+            state.page_size = len(edges)
+        reached = False
+        times = []
+        for edge in edges:
+            node = edge.get('node', edge)
+            if not (post_id := node.get('id')):
+                continue
+            created = _created(node)
+            if not _stickied(node):
+                if created is not None:
+                    times.append(created)
+                    reached |= state.last_created is not None and created <= state.last_created
+                else:
+                    reached |= post_id in seen or post_id in state.pending
+                if created is not None and (newest is None or created > newest):
+                    newest, state.last_id = created, post_id
+            if post_id not in seen and post_id not in state.pending:
+                state.pending[post_id] = created
+                new.append(node)
+        if first and len(times) > 1 and (span := max(times) - min(times)) > 0:
+            # seed the posting rate from the first page instead of waiting for a second poll
+            state.rate = (len(times) - 1) / span
+        state.pages += 1
+        if first or reached or not cursor or not edges:
+            break
+        if page >= max_pages:
+            state.last_created = newest
+            return new, True
+    state.last_created = newest
+    return new, False
+
+
+def load(path: Path | str, maxsize: int = 200_000) -> tuple[SeenSet, dict[str, dict]]:
+    """
+    @param path: json file with the feed states, the seen ids are kept next to it with a ".seen" suffix
+    @param maxsize: maximum number of ids remembered
+    @return: seen ids and persisted feed states keyed by feed
+    """
+    path = Path(path)
+    try:
+        seen = SeenSet.from_bytes(path.with_suffix('.seen').read_bytes(), maxsize)
+    except FileNotFoundError:
+        seen = SeenSet(maxsize)
+    try:
+        feeds = orjson.loads(path.read_bytes())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        feeds = {}
+    return seen, feeds
+
+
+def save(path: Path | str, seen: SeenSet, stats: dict[str, FeedState]):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        path.with_suffix('.seen'): seen.to_bytes(),
+        path: orjson.dumps({k: s.persisted() for k, s in stats.items()}),
+    }
+    for p, b in data.items():
+        tmp = p.with_name(f'{p.name}.tmp')
+        tmp.write_bytes(b)
+        os.replace(tmp, p)
+
+
+async def follow(feed: str, fetch: Callable[[str | None], Awaitable[dict]], state: FeedState, seen: SeenSet,
+                 next_page: Callable[[dict], tuple[list, str | None]], queue: asyncio.Queue, sem: asyncio.Semaphore,
+                 min_interval: float, max_interval: float, max_pages: int, backfill: bool):
+    """
+    Poll one feed on its adaptive schedule, putting new nodes on the queue oldest first.
+
+    Nodes stay in the feed's `pending` until `watch` emits them, so the seen ids never include posts that
+    were found but not emitted when the watch stops.
+    """
+    attempt = 0
+    while True:
+        await asyncio.sleep(max(state.next_poll - time.time(), 0))
+        first = state.last_created is None and state.last_id is None
+        async with sem:
+            try:
+                new, overflow = await poll(fetch, state, seen, next_page, max_pages)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                state.errors += 1
+                state.last_error = f'{type(e).__name__}: {e}'
+                state.next_poll = time.time() + backoff(attempt, getattr(e, 'response', None), cap=max_interval)
+                attempt += 1
+                continue
+        attempt = 0
+        state.polls += 1
+        state.schedule(len(new), time.time(), min_interval, max_interval, overflow)
+        if first and not backfill:
+            for node in new:
+                seen.add(node['id'])
+                del state.pending[node['id']]
+            continue
+        for node in reversed(new):
+            state.items += 1
+            await queue.put((feed, node))
+
+
+async def watch(feeds: dict[str, Callable[[str | None], Awaitable[dict]]], seen: SeenSet,
+                stats: dict[str, FeedState], next_page: Callable[[dict], tuple[list, str | None]],
+                min_interval: float = 30, max_interval: float = 900, max_pages: int = 10, backfill: bool = False,
+                concurrency: int = 16, maxsize: int = 1000) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Merge many polled feeds into one stream of new posts through a single bounded queue.
+
+    @param feeds: functions taking a cursor and returning a page of a newest-first feed, keyed by feed name
+    @param seen: ids already emitted, shared by all feeds so a post listed by several is only emitted once
+    @param stats: feed states keyed by feed name, missing entries are created
+    @param next_page: function returning the edges and next cursor of a response
+    @param min_interval: minimum seconds between polls of a feed
+    @param max_interval: maximum seconds between polls of a feed
+    @param max_pages: maximum number of pages fetched per poll
+    @param backfill: emit the posts found by the first poll of a new feed, instead of only marking them as seen
+    @param concurrency: maximum number of polls in flight
+    @param maxsize: maximum number of posts buffered before polling is paused
+    @return: async iterator over (feed, node) pairs
+    """
+    queue = asyncio.Queue(maxsize)
+    sem = asyncio.Semaphore(concurrency)
+    tasks = []
+    for feed, fetch in feeds.items():
+        state = stats.setdefault(feed, FeedState(feed, min_interval))
+        tasks.append(asyncio.ensure_future(follow(feed, fetch, state, seen, next_page, queue, sem, min_interval,
+                                                  max_interval, max_pages, backfill)))
+    done = asyncio.ensure_future(asyncio.gather(*tasks, return_exceptions=True))
+    try:
+        while not (done.done() and queue.empty()):
+            get = asyncio.ensure_future(queue.get())
+            await asyncio.wait({get, done}, return_when=asyncio.FIRST_COMPLETED)
+            if not get.done():
+                get.cancel()
+                continue
+            feed, node = get.result()
+            # a post listed by several feeds is queued by each, only the first is emitted
+            del stats[feed].pending[node['id']]
+            if seen.add(node['id']):
+                yield feed, node
+    finally:
+        # cancelling the gather cancels the feeds with it, it then holds a CancelledError nobody awaits
+        done.add_done_callback(lambda f: f.cancelled() or f.exception())
+        done.cancel()
@@ -0,0 +1,144 @@
+"""
+Generate the operation registry from `operations.json` (see `update.get_operations`).
+
+Writes two files, each only when its content changes:
+    reddit/operations.json  compact registry: name -> [hash, type]
+    reddit/constants.py     the `Operation` class, so `Operation.X` stays a plain attribute lookup
+
+Operations missing from the extraction are kept, a bundle that failed to download or decode drops its
+operations too. `--prune` drops them, except the ones used in `reddit/`, which `--force` drops as well.
+
+python scripts/codegen.py [operations.json] [--prune] [--force]
+"""
+import keyword
+import re
+import sys
+from pathlib import Path
+
+import orjson
+
+ROOT = Path(__file__).parent.parent
+REGISTRY = ROOT / "reddit" / "operations.json"
+CONSTANTS = ROOT / "reddit" / "constants.py"
+
+# bundles usually only carry the persisted query id, then the type is guessed from the leading verb
+MUTATION_VERBS = {
+    "Add", "Block", "Cancel", "Change", "Claim", "Complete", "Confirm", "Create", "Decline", "Delete",
+    "Destroy", "Disable", "Dismiss", "Enable", "End", "Give", "Gild", "Hide", "Leave", "Perform",
+    "Prepare", "Purchase", "Record", "Register", "Remove", "Resolve", "Set", "Start", "Store",
+    "Submit", "Update", "Upload", "Verify", "Vote",
+}
+CONSTANT = re.compile(r"^    (\w+) = '([^']*)'$", re.M)
+USAGE = re.compile(r"\bOperation\.([A-Za-z]\w*)")
+DOCUMENT = re.compile(r"^\s*(query|mutation|subscription)\b")
+
+
+def operation_type(name: str, op: dict) -> str:
+    """
+    @return: "query", "mutation" or "subscription"
+    """
+    if t := op.get("operationType") or op.get("type"):
+        return t.lower()
+    if (doc := op.get("query") or op.get("text")) and (m := DOCUMENT.match(doc)):
+        return m[1]
+    verb = re.match(r"[A-Z][a-z]*", name)
+    return "mutation" if verb and verb[0] in MUTATION_VERBS else "query"
+
+
+def registry(operations: dict) -> dict:
+    """
+    @param operations: operations by name, as extracted from the bundles
+    @return: registry entries by name, for operations with a hash and a valid attribute name
+    """
+    out = {}
+    for name in sorted(operations):
+        op = operations[name]
+        if not (op_id := op.get("id") or op.get("hash")):
+            print(f"skipping {name}: no id")
+            continue
+        if not name.isidentifier() or keyword.iskeyword(name):
+            print(f"skipping {name}: not a valid attribute name")
+            continue
+        out[name] = [op_id, operation_type(name, op)]
+    return out
+
+
+def operation_class(entries: dict) -> str:
+    return "class Operation:\n" + "".join(f"    {k} = '{v[0]}'\n" for k, v in entries.items())
+
+
+def current() -> dict:
+    """
+    @return: registry entries by name, of the registry and the `Operation` class as they are now
+    """
+    entries = orjson.loads(REGISTRY.read_bytes())["operations"] if REGISTRY.exists() else {}
+    # registries written before the variables list was dropped have a third element
+    entries = {k: v[:2] for k, v in entries.items()}
+    src = CONSTANTS.read_text()
+    start = src.index("class Operation:\n")
+    for name, op_id in CONSTANT.findall(src, start, src.index("\n\n\n", start)):
+        if name not in entries:
+            entries[name] = [op_id, operation_type(name, {})]
+    return entries
+
+
+def used() -> set[str]:
+    """
+    @return: names of the operations referenced as `Operation.X` in `reddit/`
+    """
+    return {m for p in (ROOT / "reddit").rglob("*.py") for m in USAGE.findall(p.read_text())}
+
+
+def write(path: Path, data: bytes) -> bool:
+    if path.exists() and path.read_bytes() == data:
+        return False
+    tmp = path.with_name(f"{path.name}.tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+    print(f"wrote {path.relative_to(ROOT)}")
+    return True
+
+
+def generate(operations: dict, prune: bool = False, force: bool = False) -> dict:
+    """
+    Write the registry and the `Operation` class, merged with the current ones.
+
+    The registry is replaced atomically, so processes watching it (see `reddit.registry`) never read
+    a partial file.
+
+    @param operations: operations by name, as extracted from the bundles
+    @param prune: drop the current operations missing from `operations`, unless they are used in `reddit/`
+    @param force: with `prune`, also drop the ones used in `reddit/`
+    @return: registry entries by name
+    """
+    entries, old, refs = registry(operations), current(), used()
+    missing = sorted(old.keys() - entries.keys())
+    for name in missing:
+        if prune and (force or name not in refs):
+            print(f"removed {name}")
+        else:
+            entries[name] = old[name]
+    if kept := [k for k in missing if k in entries]:
+        print(f"kept {len(kept)} operations not found in the bundles: {', '.join(kept)}")
+    entries = dict(sorted(entries.items()))
+    write(REGISTRY, orjson.dumps({"operations": entries}))
+    src = CONSTANTS.read_text()
+    start = src.index("class Operation:\n")
+    end = src.index("\n\n\n", start)
+    write(CONSTANTS, (src[:start] + operation_class(entries).rstrip("\n") + src[end:]).encode())
+    return entries
+
+
+def main(argv: list[str]) -> int:
+    args = [a for a in argv if not a.startswith("--")]
+    src = Path(args[0] if args else "operations.json")
+    entries = generate(orjson.loads(src.read_bytes()), "--prune" in argv, "--force" in argv)
+    types = {}
+    for _, t in entries.values():
+        types[t] = types.get(t, 0) + 1
+    print(f"{len(entries)} operations: {types}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main(sys.argv[1:]))
@@ -1,22 +1,46 @@
 import asyncio
+import hashlib
+import os
 import re
+import shutil
 import subprocess
-from concurrent.futures import ThreadPoolExecutor
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
+from urllib.parse import urljoin
 
 import aiofiles
 import orjson
-from httpx import URL, AsyncClient, Client
+from httpx import URL, AsyncClient, Client, Limits
 from selectolax.lexbor import LexborHTMLParser
 from tqdm import tqdm
 from tqdm.asyncio import tqdm_asyncio
 
+import codegen
+
 base = "https://www.redditstatic.com/desktop2x"
 
 
-def get_js_mappings() -> set:
-    client = init_client()
-    r = client.get(f"{base}/runtime~Reddit.bd4ca1f008dbfcfcf4f4.js")  # todo: dynamic
+# the webpack runtime, which maps every chunk to its content-hashed file name
+RUNTIME = re.compile(r"(?:https?:)?[\w/.:\-]*runtime~Reddit\.\w+\.js")
+# bundles are stored once by content hash, `js/{name}` are hardlinks into the store
+STORE = Path("js/.store")
+INDEX = Path("js/.index.json")
+
+
+def find_runtime(html: str) -> str:
+    """
+    @param html: the homepage
+    @return: url of the webpack runtime bundle it loads
+    """
+    if not (m := RUNTIME.search(html)):
+        raise ValueError("runtime bundle not found on the homepage")
+    return urljoin(f"{base}/", m[0])
+
+
+def get_js_mappings(client: Client, runtime: str) -> set:
+    r = client.get(runtime)
     op_key_map = re.search(
         '\[\w\]\|\|\w\)\+"\."\+([^\[]*)\[\w\]\+"\.js"', r.text
     ).group(1)
@@ -28,69 +52,350 @@ def get_js_mappings() -> set:
         data.append(y)
     runtime_map = orjson.loads(f"{{{','.join(data)}}}")
     write_json("runtime_map.json", runtime_map)
-    return {f"{base}/{k}.{v}.js" for k, v in runtime_map.items()}
+    return {runtime} | {f"{base}/{k}.{v}.js" for k, v in runtime_map.items()}
+
 
+def link(blob: Path, dst: Path):
+    """
+    Point `dst` at a stored bundle. An existing link is left alone, so its mtime stays stable
+    for the cache in `get_operations`.
+    """
+    if dst.exists():
+        if dst.samefile(blob):
+            return
+        dst.unlink()
+    try:
+        os.link(blob, dst)
+    except OSError:
+        shutil.copy2(blob, dst)
+
+
+def get_js(concurrency: int = 16):
+    """
+    Download the bundles the homepage and the webpack runtime refer to.
+
+    Bundles already in the store are revalidated with If-None-Match / If-Modified-Since, so a refresh
+    only downloads the ones that changed. Bundles that are no longer referenced are removed.
+
+    @param concurrency: maximum number of requests in flight
+    """
+    try:
+        index = orjson.loads(INDEX.read_bytes())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        index = {}
+    counts = {"downloaded": 0, "not modified": 0, "failed": 0}
+    received = 0
 
-def get_js():
-    async def get(c: AsyncClient, url: str) -> None:
+    async def get(c: AsyncClient, sem: asyncio.Semaphore, url: str) -> None:
+        nonlocal received
+        fname = out / URL(url).path.split("/")[-1]
+        entry = index.get(url) or {}
+        blob = STORE / entry.get("hash", "-")
+        headers = {}
+        # only revalidate what is still in the store
+        if blob.exists():
+            if etag := entry.get("etag"):
+                headers["if-none-match"] = etag
+            if modified := entry.get("last_modified"):
+                headers["if-modified-since"] = modified
         try:
-            fname = out / URL(url).path.split("/")[-1]
-            r = await c.get(url)
-            async with aiofiles.open(fname, "wb") as fp:
-                await fp.write(r.content)
+            async with sem:
+                r = await c.get(url, headers=headers)
+            if r.status_code == 304:
+                link(blob, fname)
+                counts["not modified"] += 1
+                return
+            r.raise_for_status()
+            digest = hashlib.blake2b(r.content, digest_size=16).hexdigest()
+            blob = STORE / digest
+            if not blob.exists():
+                tmp = blob.with_suffix(".tmp")
+                async with aiofiles.open(tmp, "wb") as fp:
+                    await fp.write(r.content)
+                tmp.replace(blob)
+            index[url] = {
+                "hash": digest,
+                "etag": r.headers.get("etag"),
+                "last_modified": r.headers.get("last-modified"),
+                "size": len(r.content),
+            }
+            link(blob, fname)
+            counts["downloaded"] += 1
+            received += len(r.content)
         except Exception as e:
-            print(f"failed\n{e}")
+            counts["failed"] += 1
+            print(f"failed {url}\n{e}")
 
-    async def process():
+    async def process() -> set:
         client = init_client()
         r = client.get("https://www.reddit.com/")
         html = LexborHTMLParser(r.text)
         urls = {
-            x.attrs.get("key")
-            for s in html.css("link")
-            if (x := s).attrs.get("as") == "script"
-        }
-        urls |= get_js_mappings()
-        client = init_client()
-        async with AsyncClient(headers=client.headers, cookies=client.cookies) as c:
-            return await tqdm_asyncio.gather(
-                *(get(c, url) for url in urls), desc="downloading js files"
+            x.attrs.get("href") or x.attrs.get("key")
+            for x in html.css("link")
+            if x.attrs.get("as") == "script"
+        } - {None}
+        urls |= get_js_mappings(client, find_runtime(r.text))
+        sem = asyncio.Semaphore(concurrency)
+        limits = Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with AsyncClient(headers=client.headers, cookies=client.cookies, limits=limits) as c:
+            await tqdm_asyncio.gather(
+                *(get(c, sem, url) for url in urls), desc="downloading js files"
             )
+        return urls
 
     out = Path("js")
-    out.mkdir(exist_ok=True, parents=True)
-    asyncio.run(process())
+    STORE.mkdir(exist_ok=True, parents=True)
+    urls = asyncio.run(process())
 
+    # drop what the current deploy no longer refers to
+    index = {k: v for k, v in index.items() if k in urls}
+    names = {URL(u).path.split("/")[-1] for u in urls}
+    for p in out.glob("*.js"):
+        if p.name not in names:
+            p.unlink()
+    hashes = {v["hash"] for v in index.values()}
+    for p in STORE.iterdir():
+        if p.name not in hashes:
+            p.unlink()
+    write_json(INDEX, index)
+    print(
+        f"{len(urls)} bundles: {counts['downloaded']} downloaded ({received / 1e6:.1f} MB), "
+        f"{counts['not modified']} not modified, {counts['failed']} failed"
+    )
 
-def get_operations():
-    operations = {}
-    for p in tqdm(list(Path("js").iterdir()), desc="Getting GraphQL operations"):
-        try:
-            expr = "\"\.\/src\/redditGQL\/operations\/(\w+)\.json\":function\(\w\)\{\w\.exports=JSON\.parse\('(.*)'\)}"
-            operations |= {
-                x: orjson.loads(y)
-                for x, y in filter(
-                    len,
-                    (y for x in p.read_text().split(",") for y in re.findall(expr, x)),
-                )
+
+# operations are embedded as `"./src/redditGQL/operations/X.json":function(e){e.exports=JSON.parse('{...}')}`
+OPERATION = re.compile(
+    rb"\"\./src/redditGQL/operations/(\w+)\.json\":function\(\w\)\{\w\.exports=JSON\.parse\('((?:[^'\\]|\\.)*)'\)\}"
+)
+# symbols indexed for endpoint discovery, the flag pattern is a heuristic over the usual accessor names
+SYMBOLS = {
+    "url": re.compile(rb"https?://[\w.\-]+(?:/[\w.\-~%/{}:]*)?"),
+    "endpoint": re.compile(rb"[\"'`](/(?:api|svc|r2|gql|graphql|oauth)/[\w.\-/{}:]*)[\"'`?]"),
+    "flag": re.compile(
+        rb"(?:feature|flag|experiment)\w*[\"']?\s*[:(,]\s*[\"']([\w.\-]{3,})[\"']", re.I
+    ),
+}
+# escape sequences of a JS string literal, see `js_string`
+JS_ESCAPE = re.compile(r"\\(u\{[0-9a-fA-F]+\}|u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|\r\n|[\s\S])")
+JS_ESCAPES = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v", "0": "\0"}
+JS_ESCAPES |= dict.fromkeys(["\n", "\r", "\r\n", "\u2028", "\u2029"], "")  # line continuations
+OPERATIONS_CACHE = Path("operations.cache.json")
+SYMBOLS_INDEX = Path("symbols.json")
+
+
+def js_string(raw: bytes) -> str:
+    """
+    @param raw: body of a JS string literal, without the quotes
+    @return: the string's value
+    """
+
+    def unescape(m: re.Match) -> str:
+        e = m[1]
+        if e[0] in "ux" and len(e) > 1:
+            return chr(int(e[2:-1] if e[1] == "{" else e[1:], 16))
+        return JS_ESCAPES.get(e, e)
+
+    s = JS_ESCAPE.sub(unescape, raw.decode())
+    # `\uXXXX` escapes of a surrogate pair decode to two code points, join them into one
+    return s.encode("utf-16", "surrogatepass").decode("utf-16")
+
+
+def scan_bundle(path: Path, known: str = None) -> tuple[str, dict | None]:
+    """
+    Extract the GraphQL operations and the indexed symbols from one JS bundle, in a single pass over
+    its bytes per pattern. Runs in a worker process.
+
+    @param path: bundle to scan
+    @param known: content hash of the bundle when it was last scanned
+    @return: content hash, and {"operations": ..., "symbols": {kind: [...]}, "errors": [...]}, or None if the
+        content is unchanged. An operation that fails to decode is left out and reported in "errors".
+    """
+    data = path.read_bytes()
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if digest == known:
+        return digest, None
+    operations, errors = {}, []
+    if b"redditGQL/operations/" in data:
+        for m in OPERATION.finditer(data):
+            name = m[1].decode()
+            try:
+                operations[name] = orjson.loads(js_string(m[2]))
+            except (ValueError, OverflowError) as e:
+                errors.append(f"{name}: {e}")
+    symbols = {
+        kind: sorted({m.decode(errors="replace") for m in expr.findall(data)})
+        for kind, expr in SYMBOLS.items()
+    }
+    return digest, {"operations": operations, "symbols": symbols, "errors": errors}
+
+
+def get_operations(max_workers: int = None, checkpoint: float = 2) -> dict:
+    """
+    Extract GraphQL operations from the bundles in `js/`, reusing the results of unchanged bundles.
+    The symbols found along the way are written to `symbols.json`, see `search`.
+
+    Bundles are matched to the cache by size and mtime first, so unchanged ones are not even read:
+    `get_js()` links them from its store and leaves existing links alone, which keeps their mtime stable.
+    A bundle whose size or mtime changed is hashed, and only scanned if its content changed too, e.g. a
+    bundle copied where hardlinks are not supported, or touched, keeps its results. Changed bundles are
+    scanned in a process pool and the cache is checkpointed while they are, so an interrupted run resumes
+    where it stopped.
+
+    @param max_workers: number of worker processes, defaults to the number of CPUs
+    @param checkpoint: seconds between writes of the cache
+    @return: operations by name
+    """
+    try:
+        cache = orjson.loads(OPERATIONS_CACHE.read_bytes())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        cache = {}
+    # entries from before symbols were indexed are rescanned
+    cache = {k: v for k, v in cache.items() if "symbols" in v}
+    files = sorted(p for p in Path("js").iterdir() if p.suffix == ".js")
+    entries, todo = {}, []
+    for p in files:
+        st = p.stat()
+        entry = cache.get(p.name)
+        if entry and (entry["size"], entry["mtime"]) == (st.st_size, st.st_mtime_ns):
+            entries[p.name] = entry
+        else:
+            todo.append(p)
+
+    if todo:
+        saved = time.time()
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(scan_bundle, p, (cache.get(p.name) or {}).get("hash")): p
+                for p in todo
             }
-        except Exception as e:
-            print(e)
-    write_json("operations.json", operations)
+            for future in tqdm(
+                as_completed(futures), total=len(futures), desc="Getting GraphQL operations"
+            ):
+                p = futures[future]
+                try:
+                    digest, found = future.result()
+                except Exception as e:
+                    print(f"{p.name}: {e}")
+                    continue
+                for e in found.pop("errors") if found else ():
+                    print(f"{p.name}: {e}")
+                st = p.stat()
+                if found is None:
+                    found = {k: cache[p.name][k] for k in ("operations", "symbols")}
+                entries[p.name] = {
+                    "size": st.st_size,
+                    "mtime": st.st_mtime_ns,
+                    "hash": digest,
+                    **found,
+                }
+                if time.time() - saved > checkpoint:
+                    write_json(OPERATIONS_CACHE, entries)
+                    saved = time.time()
+    # bundles that are gone drop out of the cache along with their operations
+    write_json(OPERATIONS_CACHE, entries)
+
+    operations = {}
+    for name in sorted(entries):
+        operations |= entries[name]["operations"]
+    out = Path("operations.json")
+    if not out.exists() or orjson.loads(out.read_bytes()) != operations:
+        write_json(out, operations)
+    write_symbols(entries)
+    print(f"{len(operations)} operations from {len(files)} bundles, {len(todo)} rescanned")
     return operations
 
 
-def fmt_js(max_workers=16):
+def write_symbols(entries: dict, path: Path = SYMBOLS_INDEX):
+    """
+    Write the symbol index: kind -> symbol -> names of the bundles it appears in.
+    """
+    index = {"operation": {}} | {kind: {} for kind in SYMBOLS}
+    for name in sorted(entries):
+        entry = entries[name]
+        for op in entry["operations"]:
+            index["operation"].setdefault(op, []).append(name)
+        for kind, symbols in entry["symbols"].items():
+            for sym in symbols:
+                index[kind].setdefault(sym, []).append(name)
+    write_json(path, index)
+
+
+def search(term: str, kinds: set[str] = None, path: Path = SYMBOLS_INDEX) -> dict:
+    """
+    Search the symbol index written by `get_operations`.
+
+    @param term: case-insensitive substring, or a regex if it starts with "re:"
+    @param kinds: kinds to search, e.g. {"endpoint", "flag"}, None for all
+    @return: kind -> matching symbol -> names of the bundles it appears in
+    """
+    if term.startswith("re:"):
+        match = re.compile(term[3:], re.I).search
+    else:
+        match = lambda s, t=term.lower(): t in s.lower()
+    index = orjson.loads(path.read_bytes())
+    return {
+        kind: hits
+        for kind, symbols in index.items()
+        if (kinds is None or kind in kinds)
+        and (hits := {s: names for s, names in symbols.items() if match(s)})
+    }
+
+
+# prettier reports each file it could not format as `[error] path: message`
+PRETTIER_ERROR = re.compile(r"^\[error\] (\S+?): (.*)$", re.M)
+
+
+def fmt_js(max_workers: int = 4, out: Path = Path("js_fmt")) -> dict[str, str]:
     """
-    Do not run before get_operations(). the regex relies on un-formatted code.
+    Write prettier-formatted copies of the bundles to `out`, for reading.
+
+    The bundles in `js/` stay unformatted, they are hardlinks into the store and `get_operations()` relies on
+    the minified code. Bundles whose formatted copy is up to date are skipped, the rest are split between at
+    most `max_workers` prettier processes that each format their share in one run, so node starts once per worker.
+
+    @param max_workers: maximum number of prettier processes
+    @param out: directory for the formatted copies
+    @return: error message by name of each bundle that failed to format
     """
-    n = max_workers
-    files = list(Path("js").iterdir())
-    batches = [files[i: i + n] for i in range(0, len(files), n)]
-    print(f"batches: {len(batches)}")
+    out.mkdir(exist_ok=True, parents=True)
+    bundles = {p.name: p for p in Path("js").glob("*.js")}
+    for p in out.glob("*.js"):
+        if p.name not in bundles:
+            p.unlink()
+    todo = []
+    for name, p in sorted(bundles.items()):
+        dst = out / name
+        if not dst.exists() or dst.stat().st_mtime_ns < p.stat().st_mtime_ns:
+            shutil.copyfile(p, dst)
+            todo.append(dst)
+    if not todo:
+        return {}
+
+    def run(group: list[Path]) -> dict[str, str]:
+        try:
+            r = subprocess.run(["npx", "prettier", "--write", *map(str, group)], capture_output=True, text=True)
+        except OSError as e:
+            return {p.name: str(e) for p in group}
+        errors = {Path(f).name: msg for f, msg in PRETTIER_ERROR.findall(r.stderr)}
+        if r.returncode and not errors:
+            # prettier itself failed, e.g. not installed
+            msg = (r.stderr or r.stdout).strip().splitlines()[:1] or [f"exit status {r.returncode}"]
+            errors = {p.name: msg[0] for p in group}
+        return errors
+
+    n = min(max_workers, len(todo))
+    failed = {}
     with ThreadPoolExecutor(max_workers=n) as executor:
-        for batch in batches:
-            executor.submit(subprocess.run, ["npx", "prettier", "--write"] + batch)
+        for errors in tqdm(executor.map(run, [todo[i::n] for i in range(n)]), total=n, desc="formatting js files"):
+            failed |= errors
+    for name, msg in failed.items():
+        # an unformatted copy would look up to date on the next run
+        (out / name).unlink(missing_ok=True)
+        print(f"failed to format {name}: {msg}")
+    print(f"{len(todo) - len(failed)} formatted, {len(failed)} failed")
+    return failed
 
 
 def init_client():
@@ -112,16 +417,27 @@ def init_client():
     return client
 
 
-def write_json(fname: str, data: dict | list):
+def write_json(fname: str | Path, data: dict | list):
     Path(fname).write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
 
 
-def main() -> int:
+def main(argv: list[str]) -> int:
+    # python scripts/update.py [--fmt]
+    # python scripts/update.py search <term>
+    if argv[:1] == ["search"]:
+        for kind, hits in search(" ".join(argv[1:])).items():
+            print(f"{kind}:")
+            for sym, names in hits.items():
+                print(f"    {sym}  ({', '.join(names)})")
+        return 0
     get_js()
-    get_operations()
-    # fmt_js()
+    # also writes the symbol index used by `search`
+    codegen.generate(get_operations())
+    if "--fmt" in argv:
+        # readable copies of the bundles in js_fmt/, needs node and prettier
+        fmt_js()
     return 0
 
 
 if __name__ == "__main__":
-    exit(main())
+    exit(main(sys.argv[1:]))
@@ -6,7 +6,7 @@ install_requires = [
     'aiofiles',
     'websockets',
     'nest_asyncio',
-    'httpx',
+    'httpx[http2]',
     'tqdm',
     'orjson',
     'selectolax',
@@ -61,6 +61,18 @@ setup(
         },
         sort='NEW',  # {'RELEVANCE', 'HOT', 'TOP', 'NEW', 'COMMENTS'}
     )
+    
+    # lazily page through results, the next page is prefetched while the current one is consumed
+    for post in reddit.iter_search('api blackout', kind='posts', limit=1000):
+        ...
+    
+    for post in reddit.iter_popular(pages=10):
+        ...
+    
+    # many GraphQL operations in as few round trips as possible, results are returned in order
+    from reddit.constants import Operation
+    
+    subreddits = reddit.batch([(Operation.SubredditPageExtra, {'subredditName': name}) for name in ['pics', 'funny']])
     ```
     
     #### Auth Endpoints
@@ -80,13 +92,136 @@ setup(
     reddit.comment('146zsax', 'test 123')
     ```
     
+    #### Export
+    ```python
+    from reddit.scraper import Scraper
+    from reddit.sink import AsyncSink, NDJSONSink, ParquetSink
+    from reddit.models import Post
+    
+    reddit = Scraper()
+    
+    # sink=True streams results to gzipped NDJSON files under `reddit.out_path`, e.g. data/search/part-*.ndjson.gz
+    for post in reddit.iter_search('api blackout', sink=True):
+        ...
+    
+    # zstd compressed, rotated every 64 MB or hour, writes run on a background thread
+    with AsyncSink(NDJSONSink('data/posts', compression='zstd', max_bytes=64 * 2 ** 20, max_age=3600)) as sink:
+        reddit.posts({'pics': ['147p5ql', '146zsax']}, sink=sink)
+    
+    # columnar output for flat records
+    with ParquetSink('data/popular') as sink:
+        for post in reddit.iter_popular(pages=10, model=Post, sink=sink):
+            ...
+    ```
+    
+    #### Metrics
+    ```python
+    from reddit.scraper import Scraper
+    
+    reddit = Scraper(metrics=True)
+    posts = list(reddit.iter_search('api blackout', limit=1000))
+    
+    # p50/p90/p99 latency and parse time, statuses, bytes, retries and cache hits per operation
+    reddit.metrics.snapshot()
+    
+    # Prometheus text format, or pass `Metrics(callback=...)` to receive every event
+    print(reddit.metrics.prometheus())
+    ```
+    
+    #### Session Pool
+    ```python
+    from reddit.pool import ScraperPool
+    
+    # requests are spread across sessions by remaining rate budget, same methods as `Scraper`
+    reddit = ScraperPool(accounts=[(username, password), ...], guests=4)
+    
+    posts = reddit.posts({'pics': ['147p5ql', '146zsax']})
+    ```
+    
+    #### Operation Registry
+    ```python
+    from reddit.registry import registry
+    from reddit.scraper import Scraper
+    
+    # hash and type of every GraphQL operation, loaded on first use
+    info = registry['GeneralSearch']  # OperationInfo(name='GeneralSearch', id='8e8ea0cefd5f', type='query')
+    
+    # long-lived processes pick up a regenerated registry without a restart, checked every 60 seconds
+    reddit = Scraper(reload_operations=60)
+    ```
+    
+    ```bash
+    # refresh the bundles, then regenerate reddit/operations.json and the Operation class
+    python scripts/update.py
+    # also write prettier-formatted copies of the bundles to js_fmt/, needs node
+    python scripts/update.py --fmt
+    # or regenerate from an existing operations.json only
+    python scripts/codegen.py operations.json
+    ```
+    
+    #### Event Loop
+    ```python
+    from reddit import loop
+    
+    # nothing is patched on import, opt in to uvloop for the scraper's internal loops,
+    # and to nest_asyncio when calling the synchronous scraper from a Jupyter notebook
+    loop.configure(uvloop=True, nested=None)  # nested=None: only inside Jupyter
+    ```
+    
+    #### Async
+    ```python
+    import asyncio
+    
+    from reddit.scraper import AsyncScraper
+    
+    
+    async def main():
+        # all requests share one long-lived HTTP/2 connection pool
+        async with AsyncScraper() as reddit:
+            popular, subreddit = await asyncio.gather(
+                reddit.popular(),
+                reddit.subreddit('pics'),
+            )
+            posts = await reddit.posts({'pics': ['147p5ql', '146zsax']})
+    
+            # live comments from every post's websocket, merged into one stream
+            async for comment in reddit.stream_comments({'pics': ['147p5ql', '146zsax']}):
+                print(comment['author'], comment['body'])
+    
+    
+    asyncio.run(main())
+    ```
+    
+    #### Watch
+    ```python
+    import asyncio
+    
+    from reddit.scraper import AsyncScraper
+    
+    
+    async def main():
+        async with AsyncScraper() as reddit:
+            # new posts only, each feed is polled as often as it gets new posts
+            # state=True keeps the seen ids under data/ so a restarted watch picks up where it stopped
+            async for feed, post in reddit.watch(['pics', 'aww'], front_page=True, state=True):
+                print(feed, post['id'], post['title'])
+    
+    
+    asyncio.run(main())
+    ```
+    
     '''),
     long_description_content_type='text/markdown',
     author="Trevor Hobenshield",
     author_email="trevorhobenshield@gmail.com",
     url="https://github.com/trevorhobenshield/reddit-api-client",
     install_requires=install_requires,
+    extras_require={
+        'zstd': ['zstandard'],
+        'parquet': ['pyarrow'],
+    },
     keywords="reddit api client async search automation bot scrape",
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     include_package_data=True,
+    package_data={'reddit': ['operations.json']},
 )
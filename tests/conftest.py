@@ -0,0 +1,82 @@
+import httpx
+import orjson
+import pytest
+
+from reddit.constants import Operation
+from reddit.scraper import AsyncScraper, Scraper
+
+# bootstrap page: the csrf input and the bearer token in `script#data`
+PAGE = ('<html><body><input name="csrf_token" value="csrf"><script id="data">window.___r = '
+        '{"user":{"session":{"accessToken":"%s","expires":"2099-01-01T00:00:00.000Z"}}};</script></body></html>')
+
+
+class Server:
+    """
+    Mock Reddit. Each bootstrap of the homepage hands out a new bearer token, GraphQL requests with an unknown
+    token get a 401, and GraphQL bodies are answered by `gql`.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.tokens = 0
+        self.valid = set()
+        # status of array-batched bodies, 200 answers them with an array, the real endpoint may not accept them
+        self.array_status = 200
+        self.gql = lambda body: {'data': {'echo': body.get('variables')}}
+
+    def __call__(self, req: httpx.Request) -> httpx.Response:
+        self.requests.append(req)
+        if req.url.host == 'gql.reddit.com':
+            if req.headers.get('authorization', '').removeprefix('Bearer ') not in self.valid:
+                return httpx.Response(401, json={'errors': [{'message': 'unauthorized'}]})
+            body = orjson.loads(req.content)
+            if isinstance(body, list):
+                if self.array_status != 200:
+                    return httpx.Response(self.array_status, json={'errors': [{'message': 'not supported'}]})
+                return httpx.Response(200, json=[self.gql(b) for b in body])
+            res = self.gql(body)
+            return res if isinstance(res, httpx.Response) else httpx.Response(200, json=res)
+        if req.url.path == '/':
+            self.tokens += 1
+            self.valid.add(token := f'token{self.tokens}')
+            return httpx.Response(200, text=PAGE % token)
+        return httpx.Response(200, text=PAGE % 'unused')
+
+    @property
+    def gql_requests(self) -> list[httpx.Request]:
+        return [r for r in self.requests if r.url.host == 'gql.reddit.com']
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # scrapers log to reddit.log and write under data/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def server(monkeypatch) -> Server:
+    server = Server()
+
+    async def handle(req: httpx.Request) -> httpx.Response:
+        return server(req)
+
+    transport, atransport = httpx.MockTransport(server), httpx.MockTransport(handle)
+    monkeypatch.setattr(Scraper, '_client', lambda self: httpx.Client(transport=transport, follow_redirects=True))
+    monkeypatch.setattr(AsyncScraper, '_client',
+                        lambda self: httpx.AsyncClient(transport=atransport, follow_redirects=True))
+    return server
+
+
+@pytest.fixture
+def operations():
+    """
+    Restore the `Operation` class after a test that reloads the registry.
+    """
+    saved = dict(vars(Operation))
+    yield Operation
+    for k in set(vars(Operation)) - set(saved):
+        delattr(Operation, k)
+    for k, v in saved.items():
+        if not k.startswith('__'):
+            setattr(Operation, k, v)
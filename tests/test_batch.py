@@ -0,0 +1,66 @@
+import asyncio
+
+import httpx
+import orjson
+
+from reddit.constants import Operation
+from reddit.scraper import AsyncScraper, Scraper
+
+OPS = [(Operation.SubredditPageExtra, {'subredditName': f'sub{i}'}) for i in range(5)]
+
+
+def _echo(results: list[dict]) -> list[str]:
+    return [r['data']['echo']['subredditName'] for r in results]
+
+
+def test_array_batches(server):
+    reddit = Scraper(guest=True)
+    assert _echo(reddit.batch(OPS)) == [f'sub{i}' for i in range(5)]
+    assert len(server.gql_requests) == 1
+    assert reddit._batching is True
+
+
+def test_falls_back_to_single_operations(server):
+    server.array_status = 400
+    reddit = Scraper(guest=True)
+    assert _echo(reddit.batch(OPS)) == [f'sub{i}' for i in range(5)]
+    assert reddit._batching is False
+    # the probe, then one request per operation
+    assert len(server.gql_requests) == 1 + len(OPS)
+
+    # later batches skip the probe
+    reddit.batch(OPS)
+    assert len(server.gql_requests) == 1 + 2 * len(OPS)
+    assert all(isinstance(orjson.loads(r.content), dict) for r in server.gql_requests[1:])
+
+
+def test_transient_errors_do_not_decide_array_support(server):
+    server.array_status = 503
+    reddit = Scraper(guest=True)
+    assert _echo(reddit.batch(OPS)) == [f'sub{i}' for i in range(5)]
+    assert reddit._batching is None
+
+
+def test_failed_operations_get_an_error(server):
+    def gql(body: dict):
+        if body['variables']['subredditName'] == 'sub2':
+            raise httpx.ConnectError('connection refused')
+        return {'data': {'echo': body['variables']}}
+
+    server.gql = gql
+    server.array_status = 400
+    results = Scraper(guest=True).batch(OPS)
+    assert 'ConnectError' in results[2]['errors'][0]['message']
+    assert _echo(results[:2] + results[3:]) == ['sub0', 'sub1', 'sub3', 'sub4']
+
+
+def test_async_falls_back_to_single_operations(server):
+    server.array_status = 400
+
+    async def main():
+        async with AsyncScraper(guest=True) as reddit:
+            return await reddit.batch(OPS), reddit._batching
+
+    results, batching = asyncio.run(main())
+    assert _echo(results) == [f'sub{i}' for i in range(5)]
+    assert batching is False
@@ -0,0 +1,71 @@
+import httpx
+
+from reddit.cache import Cache
+from reddit.constants import Operation
+from reddit.registry import registry
+from reddit.scraper import Scraper
+
+MUTATION = next(o.id for o in registry.operations.values() if o.type == 'mutation')
+
+
+def test_mutations_are_never_cached():
+    assert Cache().ttl_for(MUTATION) == 0
+    # not even when listed with a ttl
+    assert Cache(ttls={MUTATION: 60}).ttl_for(MUTATION) == 0
+
+
+def test_mutations_reach_the_server_every_time(server):
+    reddit = Scraper(guest=True, cache=Cache())
+    for _ in range(2):
+        reddit.batch([(MUTATION, {'id': 't3_x'})])
+    assert len(server.gql_requests) == 2
+
+
+def test_queries_are_served_from_the_cache(server):
+    reddit = Scraper(guest=True, cache=Cache())
+    first = reddit.batch([(Operation.SubredditPageExtra, {'subredditName': 'pics'})])
+    second = reddit.batch([(Operation.SubredditPageExtra, {'subredditName': 'pics'})])
+    assert first == second
+    assert len(server.gql_requests) == 1
+    assert reddit.cache.stats()['hits'] == 1
+
+
+def test_polled_feeds_are_not_cached_by_default(server):
+    reddit = Scraper(guest=True, cache=Cache())
+    reddit.subreddit_posts('pics')
+    reddit.subreddit_posts('pics')
+    assert len(server.gql_requests) == 2
+
+    reddit = Scraper(guest=True, cache=Cache(ttls={Operation.SubredditPosts: 60}))
+    reddit.subreddit_posts('pics')
+    reddit.subreddit_posts('pics')
+    assert len(server.gql_requests) == 3
+
+
+def test_unknown_operations_are_only_cached_when_listed():
+    assert Cache().ttl_for('0123456789ab') == 0
+    assert Cache(ttls={'0123456789ab': 60}).ttl_for('0123456789ab') == 60
+
+
+def test_entries_are_scoped_by_identity(server, workdir):
+    def account(name: str) -> Scraper:
+        # an authenticated session is used as is, without a bootstrap
+        server.valid.add(name)
+        session = httpx.Client(transport=httpx.MockTransport(server), cookies={'USER': name, 'csrf_token': 'x'},
+                               headers={'authorization': f'Bearer {name}'})
+        return Scraper(session=session, identity=name, cache=Cache(workdir / 'cache.sqlite'))
+
+    op = (Operation.SubredditPageExtra, {'subredditName': 'pics'})
+    account('alice').batch([op])
+    account('alice').batch([op])
+    assert len(server.gql_requests) == 1
+    account('bob').batch([op])
+    assert len(server.gql_requests) == 2
+
+
+def test_guests_share_entries(server):
+    cache = Cache()
+    op = (Operation.SubredditPageExtra, {'subredditName': 'pics'})
+    Scraper(guest=True, identity='guest-0', cache=cache).batch([op])
+    Scraper(guest=True, identity='guest-1', cache=cache).batch([op])
+    assert len(server.gql_requests) == 1
@@ -0,0 +1,74 @@
+import os
+import threading
+
+import orjson
+
+from reddit.registry import Registry
+
+
+def _write(path, ops: dict, mtime: int):
+    path.write_bytes(orjson.dumps({'operations': ops}))
+    # the registry notices changes by mtime, set it explicitly rather than waiting for the clock to tick
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_reload_applies_the_diff(workdir, operations):
+    path = workdir / 'operations.json'
+    _write(path, {'SubredditPosts': ['aaaaaaaaaaaa', 'query'], 'TestGone': ['bbbbbbbbbbbb', 'query']}, 1)
+    reg = Registry(path)
+    assert reg['SubredditPosts'].id == 'aaaaaaaaaaaa'
+
+    _write(path, {'SubredditPosts': ['cccccccccccc', 'query'], 'TestAdded': ['dddddddddddd', 'mutation']}, 2)
+    version = getattr(operations, '_version', 0)
+    assert reg.reload() == {'added': ['TestAdded'], 'removed': ['TestGone'], 'changed': ['SubredditPosts']}
+    assert operations.SubredditPosts == 'cccccccccccc'
+    assert operations.TestAdded == 'dddddddddddd'
+    assert operations._version == version + 1
+    assert reg.by_id('dddddddddddd').type == 'mutation'
+    assert 'TestGone' not in reg and reg.by_id('bbbbbbbbbbbb') is None
+
+
+def test_reload_skips_an_unchanged_file(workdir, operations):
+    path = workdir / 'operations.json'
+    _write(path, {'SubredditPosts': ['aaaaaaaaaaaa', 'query']}, 1)
+    reg = Registry(path)
+    reg.operations
+    assert reg.reload() is None
+    assert reg.reload(force=True) == {'added': [], 'removed': [], 'changed': []}
+
+
+def test_removed_operations_keep_their_hash(workdir, operations):
+    path = workdir / 'operations.json'
+    _write(path, {'TestGone': ['bbbbbbbbbbbb', 'query']}, 1)
+    reg = Registry(path)
+    reg.reload(force=True)
+    _write(path, {}, 2)
+    assert reg.reload()['removed'] == ['TestGone']
+    assert operations.TestGone == 'bbbbbbbbbbbb'
+
+
+def test_reads_entries_with_variables(workdir):
+    # registries written before the variables list was dropped
+    path = workdir / 'operations.json'
+    _write(path, {'SubredditPosts': ['aaaaaaaaaaaa', 'query', []]}, 1)
+    assert Registry(path)['SubredditPosts'].type == 'query'
+
+
+def test_watchers_share_a_thread_and_cancel_independently(workdir, operations):
+    path = workdir / 'operations.json'
+    _write(path, {'SubredditPosts': ['aaaaaaaaaaaa', 'query']}, 1)
+    reg = Registry(path)
+    a, b = threading.Event(), threading.Event()
+    threads = threading.active_count()
+    sub_a = reg.watch(.01, lambda diff: a.set())
+    sub_b = reg.watch(.01, lambda diff: b.set())
+    assert threading.active_count() == threads + 1
+    try:
+        sub_a.cancel()
+        _write(path, {'SubredditPosts': ['cccccccccccc', 'query']}, 2)
+        assert b.wait(5)
+        assert not a.is_set()
+        assert operations.SubredditPosts == 'cccccccccccc'
+    finally:
+        sub_b.cancel()
+    assert reg._stop is None
@@ -0,0 +1,91 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import orjson
+
+from reddit.scraper import AsyncScraper, Scraper
+from reddit.tokens import TokenStore
+
+
+def _client() -> httpx.Client:
+    client = httpx.Client(headers={'authorization': 'Bearer t'})
+    # the same cookie name set by two domains, which a flat dict cannot hold
+    client.cookies.set('loid', 'a', 'reddit.com')
+    client.cookies.set('loid', 'b', 'www.reddit.com')
+    return client
+
+
+def test_save_and_restore(workdir):
+    store = TokenStore(workdir / 'tokens.json')
+    store.save('guest', _client(), time.time() + 3600, True)
+    entry = store.load('guest')
+    assert entry['guest']
+    client = store.restore(entry, httpx.Client())
+    assert client.headers['authorization'] == 'Bearer t'
+    assert sorted((c.domain, c.value) for c in client.cookies.jar) == [('reddit.com', 'a'), ('www.reddit.com', 'b')]
+    assert (workdir / 'tokens.json').stat().st_mode & 0o777 == 0o600
+
+
+def test_restore_flat_cookies(workdir):
+    # entries written before cookies kept their domain
+    client = TokenStore.restore({'headers': {}, 'cookies': {'csrf_token': 'x'}}, httpx.Client())
+    assert client.cookies['csrf_token'] == 'x'
+
+
+def test_entries_close_to_expiry_are_stale(workdir):
+    store = TokenStore(workdir / 'tokens.json', skew=60)
+    store.save('guest', _client(), time.time() + 30, True)
+    assert store.load('guest') is None
+
+
+def test_concurrent_saves_keep_every_entry(workdir):
+    client = _client()
+
+    def save(i: int):
+        # a store per thread, as each pool member creates its own
+        TokenStore(workdir / 'tokens.json').save(f'guest-{i}', client, time.time() + 3600, True)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(save, range(64)))
+    assert len(orjson.loads((workdir / 'tokens.json').read_bytes())) == 64
+    assert not list(workdir.glob('*.tmp'))
+
+
+def test_scraper_restores_the_session(server):
+    Scraper(guest=True, token_store=True)
+    reddit = Scraper(guest=True, token_store=True)
+    assert server.tokens == 1
+    assert reddit.subreddit_posts('pics') == {'data': {'echo': {'subredditName': 'pics', 'sort': 'NEW'}}}
+
+
+def test_unauthorized_refreshes_once_and_replaces_the_entry(server):
+    reddit = Scraper(guest=True, token_store=True)
+    stale = reddit.session
+    server.valid.clear()
+    assert 'data' in reddit.subreddit_posts('pics')
+    assert server.tokens == 2
+    assert stale.is_closed
+    assert reddit.token_store.load('guest')['headers']['authorization'] == 'Bearer token2'
+
+
+def test_refresh_before_expiry(server):
+    reddit = Scraper(guest=True)
+    reddit.expires = time.time() + reddit.refresh_skew / 2
+    reddit.subreddit_posts('pics')
+    assert server.tokens == 2
+    assert len(server.gql_requests) == 1
+
+
+def test_async_refresh_closes_the_stale_session(server):
+    async def main():
+        async with AsyncScraper(guest=True) as reddit:
+            stale = reddit.session
+            server.valid.clear()
+            await asyncio.gather(reddit.subreddit_posts('pics'), reddit.subreddit_posts('aww'))
+            return stale, reddit.session
+
+    stale, session = asyncio.run(main())
+    assert server.tokens == 2
+    assert stale.is_closed
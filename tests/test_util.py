@@ -0,0 +1,70 @@
+import pytest
+from selectolax.lexbor import LexborHTMLParser
+
+from benchmarks.bench_extract_json import extract_json_legacy
+from benchmarks.bench_find_key import find_key_legacy
+from benchmarks.bench_parse_page import parse_dom, parse_raw
+from benchmarks.fixtures import post_data, post_page
+from reddit.util import PageError, extract_json, find_input_value, find_key, page_complete, retryable
+
+PAGES = [post_page(50, seed=i, markup=100) for i in range(3)]
+
+
+@pytest.mark.parametrize('key', ['id', 'body', 'author', 'score', 'replies', 'missing'])
+def test_find_key_matches_the_recursive_implementation(key):
+    data = post_data(200)
+    assert find_key(data, key) == find_key_legacy(data, key)
+    assert find_key(data['comments'], key) == find_key_legacy(data['comments'], key)
+
+
+@pytest.mark.parametrize('obj', [None, 0, 'id', [], {}, [{'id': 0}, {'id': 1}, [[{'id': 2}]]]])
+def test_find_key_edge_cases(obj):
+    assert find_key(obj, 'id') == find_key_legacy(obj, 'id')
+
+
+@pytest.mark.parametrize('text', [
+    'window.___r = {"a": {"b": [1, 2]}};',
+    'x = {"a": 1}; y = {"b": 2};',
+    'no object here',
+    'only } a { brace',
+])
+def test_extract_json_matches_the_character_loop(text):
+    assert extract_json(text) == extract_json_legacy(text)
+    assert extract_json(text.encode()) == extract_json_legacy(text)
+
+
+def test_extract_json_handles_braces_in_strings():
+    # the character loop counts these braces, the regex fallback skips strings whole
+    assert extract_json('x = {"a": "{"}; y = {}') == {'a': '{'}
+    assert extract_json(b'{"a": "}"} trailing }') == {'a': '}'}
+
+
+@pytest.mark.parametrize('html', PAGES)
+def test_extract_json_matches_on_pages(html):
+    text = LexborHTMLParser(html).css_first('script#data').text()
+    assert extract_json(text) == extract_json_legacy(text)
+
+
+@pytest.mark.parametrize('html', PAGES)
+def test_raw_page_parse_matches_the_dom(html):
+    assert parse_raw(html.encode()) == parse_dom(html.encode())
+    assert parse_raw(html.encode()) == parse_raw(html)
+
+
+@pytest.mark.parametrize('tag, value', [
+    ('<input name="csrf_token" value="a">', 'a'),
+    ("<input type=hidden name='csrf_token' value='a&amp;b'>", 'a&b'),
+    ('<input name=csrf_token value=a>', 'a'),
+    ('<input name="csrf_token_2" value="a">', None),
+])
+def test_find_input_value(tag, value):
+    html = f'<html><body><form>{tag}</form></body></html>'
+    assert find_input_value(html, 'csrf_token') == find_input_value(html.encode(), 'csrf_token') == value
+
+
+def test_only_truncated_pages_are_retried():
+    html = PAGES[0]
+    assert page_complete(html) and page_complete(html.encode())
+    assert not page_complete(html[:len(html) // 2])
+    assert not retryable(PageError('no script#data', truncated=False))
+    assert retryable(PageError('no script#data', truncated=True))
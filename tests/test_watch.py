@@ -0,0 +1,143 @@
+import asyncio
+
+from reddit import watch as w
+from reddit.watch import FeedState, SeenSet, poll
+
+
+def _posts(n: int, base: int = 1000) -> list[dict]:
+    # newest first, as the feeds list them
+    return [{'node': {'id': f't3_{i:x}', 'createdAt': base + i}} for i in range(n, 0, -1)]
+
+
+def _pages(*pages: list[dict]):
+    """
+    @return: fetch function serving the pages in order, and the list of cursors it was called with
+    """
+    calls = []
+
+    async def fetch(cursor: str | None) -> dict:
+        calls.append(cursor)
+        i = int(cursor or 0)
+        return {'edges': pages[i], 'cursor': str(i + 1) if i + 1 < len(pages) else None}
+
+    return fetch, calls
+
+
+def _next_page(data: dict) -> tuple[list, str | None]:
+    return data['edges'], data['cursor']
+
+
+def test_seen_set_evicts_the_oldest():
+    seen = SeenSet(maxsize=3)
+    assert seen.add('t3_a') and not seen.add('a')
+    for i in 'bcd':
+        seen.add(i)
+    assert len(seen) == 3
+    assert 'a' not in seen and 'd' in seen
+
+
+def test_seen_set_roundtrip():
+    seen = SeenSet(maxsize=4)
+    for i in 'abcdef':
+        seen.add(i)
+    loaded = SeenSet.from_bytes(seen.to_bytes(), maxsize=3)
+    assert [i in loaded for i in 'abcdef'] == [False] * 3 + [True] * 3
+    # the oldest is still evicted first
+    loaded.add('g')
+    assert 'd' not in loaded and 'e' in loaded
+
+
+def test_seen_set_keys():
+    assert SeenSet.key('t3_zz') == SeenSet.key('zz') == 36 ** 2 - 1
+    # ids that aren't base36 are hashed into the top half, away from decoded ids
+    assert SeenSet.key('not-base36') >= 1 << 63
+    assert SeenSet.key('x' * 13) != SeenSet.key('y' * 13)
+
+
+def test_poll_stops_at_the_watermark():
+    posts = _posts(30)
+    fetch, calls = _pages(posts[:10], posts[10:20], posts[20:])
+    state = FeedState('f', 30, last_created=1015, last_id='t3_f')
+    new, overflow = asyncio.run(poll(fetch, state, SeenSet(), _next_page))
+    # the second page reaches the watermark and is scanned in full
+    assert calls == [None, '1']
+    assert [n['id'] for n in new] == [p['node']['id'] for p in posts[:20]]
+    assert not overflow
+    assert state.last_created == 1030 and state.last_id == 't3_1e'
+    assert set(state.pending) == {n['id'] for n in new}
+
+
+def test_poll_ignores_stickied_posts():
+    old = {'node': {'id': 't3_old', 'createdAt': 1, 'isStickied': True}}
+    posts = _posts(20)
+    fetch, calls = _pages([old, *posts[:10]], posts[10:])
+    state = FeedState('f', 30, last_created=1005, last_id='t3_5')
+    asyncio.run(poll(fetch, state, SeenSet(), _next_page))
+    assert calls == [None, '1']
+    assert state.last_created == 1020
+
+
+def test_poll_skips_seen_and_pending_posts():
+    posts = _posts(5)
+    fetch, _ = _pages(posts)
+    seen = SeenSet()
+    seen.add('t3_5')
+    state = FeedState('f', 30, last_created=900, last_id='t3_0')
+    state.pending['t3_4'] = 1004
+    new, _ = asyncio.run(poll(fetch, state, seen, _next_page))
+    assert [n['id'] for n in new] == ['t3_3', 't3_2', 't3_1']
+
+
+def test_poll_reports_overflow():
+    posts = _posts(30)
+    fetch, calls = _pages(posts[:10], posts[10:20], posts[20:])
+    state = FeedState('f', 30, last_created=900, last_id='t3_0')
+    new, overflow = asyncio.run(poll(fetch, state, SeenSet(), _next_page, max_pages=2))
+    assert len(calls) == 2 and len(new) == 20
+    assert overflow
+
+
+def test_persisted_rolls_the_watermark_back():
+    state = FeedState('f', 30, last_created=100)
+    state.pending = {'a': 50, 'b': None}
+    assert state.persisted()['last_created'] == 50
+    state.pending = {}
+    assert state.persisted()['last_created'] == 100
+
+
+def _watch(feeds: dict, seen: SeenSet, stats: dict, limit: int) -> list[str]:
+    async def main():
+        out = []
+        gen = w.watch(feeds, seen, stats, _next_page, min_interval=.01, backfill=True, maxsize=3)
+        async for _, node in gen:
+            out.append(node['id'])
+            if len(out) >= limit:
+                break
+        await gen.aclose()
+        return out
+
+    return asyncio.run(main())
+
+
+def test_watch_dedups_across_feeds():
+    fetch, _ = _pages(_posts(8))
+    seen = SeenSet()
+    out = _watch({'a': fetch, 'b': fetch}, seen, {}, 8)
+    assert sorted(out) == sorted(f't3_{i:x}' for i in range(1, 9))
+    assert len(seen) == 8
+
+
+def test_watch_resumes_posts_not_emitted(workdir):
+    path = workdir / 'watch.json'
+    fetch, _ = _pages(_posts(8))
+    seen, stats = SeenSet(), {}
+    first = _watch({'a': fetch, 'b': fetch}, seen, stats, 2)
+    # only the emitted posts are seen, the rest are still pending when the watch stops
+    assert len(seen) == 2
+    w.save(path, seen, stats)
+
+    seen, persisted = w.load(path)
+    # poll again right away instead of on the persisted schedule
+    stats = {k: FeedState(k, **(v | {'interval': .01, 'last_poll': None})) for k, v in persisted.items()}
+    second = _watch({'a': fetch, 'b': fetch}, seen, stats, 6)
+    assert sorted(first + second) == sorted(f't3_{i:x}' for i in range(1, 9))